@@ -0,0 +1,153 @@
+"""Fixtures for benchmarking the hot path.
+
+Run with ``pytest benchmarks``. Pass ``--save-baseline`` to record the
+throughput of each benchmark, after which any benchmark whose
+throughput falls by more than ``--max-regression`` percent fails.
+
+"""
+import json
+import os
+import random
+from time import perf_counter
+
+import pytest
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+MATCHING = [
+    'waits at the window wearing the face that she keeps in a jar by the '
+    'door who is it for',
+    'eleanor rigby died in the church and was buried along with her name '
+    'nobody came',
+    'over wing exit leaving the plane as it falls like a stone from the sky '
+    'final goodbye',
+]
+
+NEAR_MISSES = [
+    'eleanor rigby picks up the rice in the church where a wedding has been '
+    'lives in a dream',
+    'concatenate banana terrible alpha bravo charlie delta echo foxtrot',
+    'father mckenzie wiping the dirt from his hands as he walks from the '
+    'grave no one was saved',
+]
+
+VOCABULARY = (
+    'the and you that was for are with his they this have from one had word '
+    'but what some can out other were all there when use your how said each '
+    'she which their time will way about many then them would write like so '
+    'these her long make thing see him two has look more day could come did '
+    'number sound most people over know water than call first who may down '
+    'side been now find any new work part take get place made live where '
+    'after back little only round man year came show every good give our '
+    'under name very through just form great think say help low line before '
+    'turn cause same mean differ move right boy old too does tell sentence '
+    'set three want air well also play small end put home read hand port '
+    'large spell add even land here must big high such follow act why ask'
+).split()
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        '--save-baseline',
+        action='store_true',
+        help='record benchmark throughput as the new baseline',
+    )
+    parser.addoption(
+        '--max-regression',
+        default=20.0,
+        help='percentage drop in throughput from the baseline that fails '
+             'a benchmark',
+        type=float,
+    )
+
+
+@pytest.fixture(scope='session')
+def corpus():
+    """A fixed synthetic corpus of tweet texts."""
+    return _tweets(300)
+
+
+@pytest.fixture(scope='session')
+def large_corpus():
+    """A larger corpus, for batches the size of an offline run."""
+    return _tweets(10000)
+
+
+def _tweets(count):
+    rng = random.Random(22)
+    tweets = []
+    for index in range(count):
+        kind = index % 3
+        if kind == 0:
+            words = [rng.choice(VOCABULARY) for _ in range(rng.randint(4, 24))]
+            tweets.append(' '.join(words))
+        elif kind == 1:
+            tweets.append(rng.choice(MATCHING + NEAR_MISSES).capitalize() + '!')
+        else:
+            tweets.append('@someone lol \U0001f602\U0001f602 #blessed '
+                          'https://t.co/{:x} xqzv {}'.format(index, index))
+    return tweets
+
+
+@pytest.fixture(scope='session')
+def _results(request):
+    results = {}
+    yield results
+    if request.config.getoption('--save-baseline'):
+        baseline = _load_baseline()
+        baseline.update(results)
+        with open(BASELINE_PATH, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+
+
+@pytest.fixture
+def benchmark(request, _results):
+    """Measure the throughput of a function against the baseline.
+
+    Returns a function taking the function to benchmark and its
+    arguments, which calls it repeatedly and returns the best number
+    of calls per second over several rounds.
+
+    """
+    max_regression = request.config.getoption('--max-regression')
+    baseline = _load_baseline().get(request.node.name)
+
+    def run(function, *args, rounds=5, min_time=0.1):
+        iterations = _calibrate(function, args, min_time)
+        best = float('inf')
+        for _ in range(rounds):
+            start = perf_counter()
+            for _ in range(iterations):
+                function(*args)
+            best = min(best, perf_counter() - start)
+        throughput = iterations / best
+        _results[request.node.name] = throughput
+        if baseline and not request.config.getoption('--save-baseline'):
+            floor = baseline * (1 - max_regression / 100)
+            if throughput < floor:
+                pytest.fail('{:.1f} calls/s is more than {}% below the '
+                            'baseline of {:.1f} calls/s'.format(
+                                throughput, max_regression, baseline))
+        return throughput
+
+    return run
+
+
+def _calibrate(function, args, min_time):
+    """Find how many calls take at least min_time seconds."""
+    iterations = 1
+    while True:
+        start = perf_counter()
+        for _ in range(iterations):
+            function(*args)
+        if perf_counter() - start >= min_time:
+            return iterations
+        iterations *= 2
+
+
+def _load_baseline():
+    try:
+        with open(BASELINE_PATH) as baseline_file:
+            return json.load(baseline_file)
+    except (OSError, ValueError):
+        return {}
@@ -0,0 +1,64 @@
+import pytest
+
+from eleanorrigbot import ELEANOR_RIGBY, PhraseMatcher, extract_phrase, extract_words
+from eleanorrigbot.extract import iter_words
+from eleanorrigbot.listen import RetweetListener
+from eleanorrigbot.replay import RecordingAPI
+from tweepy.models import Status
+
+from conftest import MATCHING, NEAR_MISSES
+
+
+def _each(function, inputs):
+    for input_ in inputs:
+        function(input_)
+
+
+def test_extract_phrase(benchmark, corpus):
+    benchmark(_each, extract_phrase, corpus)
+
+
+def test_extract_words(benchmark, corpus):
+    benchmark(_each, extract_words, corpus)
+
+
+@pytest.mark.parametrize('phrases', [
+    MATCHING,
+    NEAR_MISSES,
+    ['lol \U0001f602 xqzv', 'zzz', 'what even is this omg lolol'],
+], ids=['matching', 'near_miss', 'garbage'])
+def test_phrase_matcher(benchmark, phrases):
+    benchmark(_each, ELEANOR_RIGBY, phrases)
+
+
+def test_match_stream(benchmark, corpus):
+    def match(text):
+        ELEANOR_RIGBY.match_stream(iter_words(text))
+
+    benchmark(_each, match, corpus)
+
+
+@pytest.mark.parametrize('size', [20, 10000])
+def test_match_each(benchmark, large_corpus, size):
+    phrases = [extract_words(text) for text in large_corpus[:size]]
+    benchmark(_each, ELEANOR_RIGBY, phrases)
+
+
+@pytest.mark.parametrize('size', [20, 10000])
+def test_match_many(benchmark, large_corpus, size):
+    phrases = [extract_words(text) for text in large_corpus[:size]]
+    benchmark(ELEANOR_RIGBY.match_many, phrases)
+
+
+def test_rhyme_groups(benchmark):
+    rhyming = PhraseMatcher((3, 3, 3), (0, 0, 0))
+    benchmark(rhyming, 'all of these phrases please such a tease')
+
+
+def test_on_status(benchmark, corpus):
+    listener = RetweetListener(RecordingAPI(), extract_words, ELEANOR_RIGBY)
+    statuses = [
+        Status.parse(None, dict(id=index, text=text, user=dict(screen_name='x')))
+        for index, text in enumerate(corpus)
+    ]
+    benchmark(_each, listener.on_status, statuses)
@@ -4,14 +4,22 @@
 
 """
 import logging
+from threading import Thread
 
 from tweepy import API, Stream
 
 from .authenticate import get_authentication
-from .classify import PhraseMatcher
-from .extract import extract_phrase
-from .listen import RetweetListener
+from .classify import PhraseMatcher, SchemeSet, get_pronunciations
+from .dispatch import ProcessClassifier, RetweetDispatcher, WorkerPool
+from .extract import extract_phrase, extract_words
+from .listen import (
+    BatchRetweetListener,
+    RetweetListener,
+    count_locations,
+)
+from .metrics import register_pipeline
 from .parse_args import parse_args, __version__
+from .reconnect import ReconnectScheduler
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
@@ -35,17 +43,118 @@ The rules for the scheme are as follows:
 """
 
 
-def start_listening(location, filterer=ELEANOR_RIGBY):
-    """Start listening to the Twitter stream at the given location."""
+def start_listening(locations=None, filterer=ELEANOR_RIGBY, workers=0,
+                    processes=0, batch_size=20, location=None, **pool_args):
+    """Start listening to the Twitter stream at the given locations.
+
+    All of the locations are filtered on one connection (Twitter allows
+    up to 25 bounding boxes on a stream), and the listener counts the
+    statuses and matches in each of them. If the stream fails it is
+    reconnected after the delay chosen by a
+    :py:class:`~eleanorrigbot.reconnect.ReconnectScheduler`.
+
+    Arguments:
+      locations (:py:class:`list`): The bounding box to listen to, or a
+        list of them.
+      filterer (:py:class:`callable`, optional): Whether an extracted
+        phrase should be retweeted.
+      workers (:py:class:`int`, optional): The number of threads to
+        classify statuses on (``0`` to classify on the stream thread).
+        Retweets are always made by a
+        :py:class:`~eleanorrigbot.dispatch.RetweetDispatcher`, within
+        the API's rate limit.
+      processes (:py:class:`int`, optional): The number of processes to
+        classify statuses on in batches (``0`` to use threads as set by
+        ``workers``).
+      batch_size (:py:class:`int`, optional): The number of statuses
+        sent to a process at once.
+      location (:py:class:`list`, optional): Deprecated alias for
+        ``locations``.
+      **pool_args (:py:class:`dict`): Additional arguments for the
+        :py:class:`~eleanorrigbot.dispatch.WorkerPool` or
+        :py:class:`~eleanorrigbot.dispatch.ProcessClassifier` queues
+        (e.g. ``maxsize`` and ``drop_policy``).
+
+    Returns:
+      :py:class:`~eleanorrigbot.listen.RetweetListener`: The listener,
+        once the stream stops.
+
+    """
+    # pylint: disable=too-many-arguments
+    locations = count_locations(locations, location)
+    if not processes:
+        # the processes are forked once the index has loaded instead
+        Thread(target=get_pronunciations, name='preload', daemon=True).start()
     auth = get_authentication()
-
-    listener = RetweetListener(
-        api=API(auth),
-        extractor=extract_phrase,
-        filterer=filterer
+    listener, pools = _create_listener(
+        API(auth),
+        filterer,
+        locations,
+        workers=workers,
+        processes=processes,
+        batch_size=batch_size,
+        **pool_args
     )
 
+    register_pipeline(filterer, [listener], pools, listener.retweeter)
     stream = Stream(auth=auth, listener=listener)
-
-    logger.info('starting to listen to the stream at %r', location)
-    stream.filter(locations=location)
+    reconnects = listener.reconnects
+    boxes = [coordinate for box in locations.boxes for coordinate in box]
+
+    logger.info('starting to listen to the stream at %s',
+                ' and '.join(locations.names))
+    while True:
+        try:
+            stream.filter(locations=boxes)
+        except OSError as exc:
+            delay = reconnects.failed()
+            logger.error('stream failed (%s), reconnecting in %.1f seconds',
+                         exc, delay)
+        if not reconnects.disconnected or not reconnects.wait():
+            break
+        logger.info('reconnecting to the stream')
+    return listener
+
+
+def _create_listener(api, filterer, locations, workers=0, processes=0,
+                     batch_size=20, **pool_args):
+    """Create the listener, and the pools it hands work off to.
+
+    The arguments are as for :py:func:`start_listening`; retweets are
+    always made by a
+    :py:class:`~eleanorrigbot.dispatch.RetweetDispatcher`.
+
+    Returns:
+      :py:class:`tuple`: The listener, and the map of pool names to
+        pools.
+
+    """
+    # pylint: disable=too-many-arguments
+    retweeter = RetweetDispatcher().start()
+    if processes:
+        classifier = ProcessClassifier(
+            filterer,
+            processes=processes,
+            batch_size=batch_size,
+            **pool_args
+        ).start()
+        return BatchRetweetListener(
+            api=api,
+            extractor=extract_words,
+            classifier=classifier,
+            retweeter=retweeter,
+            locations=locations,
+        ), {classifier.name: classifier}
+    pools = {}
+    classifiers = None
+    if workers:
+        classifiers = WorkerPool(workers, name='classifier', **pool_args)
+        pools[classifiers.name] = classifiers.start()
+    return RetweetListener(
+        api=api,
+        extractor=extract_words,
+        filterer=filterer,
+        classifiers=classifiers,
+        retweeter=retweeter,
+        locations=locations,
+    ), pools
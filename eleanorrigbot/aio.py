@@ -0,0 +1,539 @@
+"""An asyncio version of the stream listener and retweet dispatcher.
+
+Rather than a thread per stream and per call, statuses are streamed and
+retweeted with :py:mod:`aiohttp` through one shared connection pool on
+the event loop; only the classification runs in an executor. Requires
+the ``async`` extra (``pip install eleanorrigbot[async]``).
+
+"""
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import json
+import logging
+from urllib.parse import urlencode
+
+import aiohttp
+from tweepy.models import Status
+
+from . import ELEANOR_RIGBY
+from .authenticate import get_authentication
+from .classify import get_pronunciations
+from .dispatch import (
+    DROP_POLICIES,
+    RETWEET_RATE,
+    RETWEET_TIME,
+    TokenBucket,
+    _classify_batch,
+    _initialise_worker,
+    _merge_metrics,
+    _schemes,
+    remember,
+    retry_delay,
+)
+from .extract import extract_words
+from .listen import (
+    EXTRACT_TIME,
+    MATCH_TIME,
+    RECEIVE_TIME,
+    count_locations,
+    status_text,
+)
+from .metrics import register_pipeline
+from .reconnect import ReconnectScheduler
+
+logger = logging.getLogger(__name__)
+
+STREAM_URL = 'https://stream.twitter.com/1.1/statuses/filter.json'
+
+RETWEET_URL = 'https://api.twitter.com/1.1/statuses/retweet/{}.json'
+
+
+class AsyncRetweeter:  # pylint: disable=too-many-instance-attributes
+    """Retweet statuses on the event loop, within the rate limit.
+
+    The asyncio counterpart of
+    :py:class:`~eleanorrigbot.dispatch.RetweetDispatcher`: duplicates
+    of recent statuses are dropped, retweets wait for a token from the
+    bucket and transient failures are retried after a jittered backoff.
+    Each retweet is a task, so any number can be in flight at once.
+
+    Arguments:
+      session (:py:class:`aiohttp.ClientSession`): The session to make
+        requests with.
+      auth (:py:class:`tweepy.OAuthHandler`): Signs the requests.
+      rate (:py:class:`float`, optional): The number of retweets
+        allowed per second (defaults to Twitter's limit).
+      burst (:py:class:`int`, optional): The most retweets allowed at
+        once.
+      dedup_size (:py:class:`int`, optional): The number of recent
+        statuses to remember.
+      max_retries (:py:class:`int`, optional): The most times to retry
+        a failed retweet.
+      backoff (:py:class:`float`, optional): The maximum delay before
+        the first retry, in seconds; it doubles for each retry.
+      url (:py:class:`str`, optional): The retweet endpoint, formatted
+        with the status ID.
+
+    """
+
+    def __init__(self, session, auth, rate=RETWEET_RATE, burst=10,
+                 dedup_size=10000, max_retries=5, backoff=1.0,
+                 url=RETWEET_URL):
+        # pylint: disable=too-many-arguments
+        self.session = session
+        self.auth = auth
+        self.bucket = TokenBucket(rate, burst)
+        self.dedup_size = dedup_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = 15 * 60
+        self.url = url
+        self._recent = OrderedDict()
+        self._tasks = {}
+        self._counts = dict(submitted=0, duplicates=0, made=0, retried=0,
+                            failed=0)
+
+    def submit(self, status_id):
+        """Schedule a retweet, unless the status was retweeted recently.
+
+        Returns:
+          :py:class:`bool`: Whether the retweet was scheduled.
+
+        """
+        self._counts['submitted'] += 1
+        if not remember(self._recent, status_id, self.dedup_size):
+            self._counts['duplicates'] += 1
+            logger.debug('dropped duplicate retweet of %r', status_id)
+            return False
+        _track(self._tasks, self.retweet(status_id))
+        return True
+
+    async def join(self):
+        """Wait for the scheduled retweets to finish."""
+        while self._tasks:
+            await asyncio.gather(*self._tasks)
+
+    async def retweet(self, status_id):
+        """Retweet the status, retrying transient failures."""
+        for attempt in range(self.max_retries + 1):
+            while not self.bucket.take():
+                await asyncio.sleep(self.bucket.wait_time())
+            try:
+                with RETWEET_TIME.time():
+                    await self._post(status_id)
+            except aiohttp.ClientResponseError as exc:
+                status_code, error = exc.status, exc
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                status_code, error = None, exc
+            else:
+                self._counts['made'] += 1
+                return
+            if status_code == 429:
+                self.bucket.empty()
+            delay = None
+            if attempt < self.max_retries:
+                delay = retry_delay(status_code, attempt, self.backoff,
+                                    self.max_backoff)
+            if delay is None:
+                break
+            logger.warning('retweeting %r failed (%s), retrying in %.1fs',
+                           status_id, error, delay)
+            self._counts['retried'] += 1
+            await asyncio.sleep(delay)
+        logger.error('retweeting %r failed: %s', status_id, error)
+        self._counts['failed'] += 1
+
+    def stats(self):
+        """The retweeter's metrics, as for ``RetweetDispatcher``."""
+        return dict(pending=len(self._tasks), **self._counts)
+
+    async def _post(self, status_id):
+        url, headers, body = _sign(self.auth, self.url.format(status_id))
+        async with self.session.post(url, headers=headers, data=body,
+                                     raise_for_status=True):
+            pass
+
+
+class AsyncProcessClassifier:
+    """Classify phrases in batches on a pool of processes.
+
+    The asyncio counterpart of
+    :py:class:`~eleanorrigbot.dispatch.ProcessClassifier`: the filterer
+    is sent to each process once, as it starts, and phrases are sent in
+    batches of ``batch_size`` (or once the first has waited for
+    ``max_delay``). The rejections and timings observed by the workers
+    are added to this process's metrics.
+
+    Arguments:
+      filterer (:py:class:`callable`): Whether a phrase should be
+        retweeted; must be picklable.
+      processes (:py:class:`int`, optional): The number of processes
+        (defaults to the number of CPUs).
+      batch_size (:py:class:`int`, optional): The number of phrases to
+        send to a process at once.
+      max_delay (:py:class:`float`, optional): The longest a phrase
+        waits for its batch to fill, in seconds.
+
+    """
+
+    def __init__(self, filterer, processes=None, batch_size=20,
+                 max_delay=0.5):
+        self.filterer = filterer
+        self.processes = processes
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._executor = None
+        self._batch = []
+        self._timer = None
+
+    def start(self):
+        """Start the worker processes.
+
+        The pronunciation index is loaded first, so the workers inherit
+        it rather than a lock held by another thread loading it.
+
+        """
+        get_pronunciations()
+        self._executor = ProcessPoolExecutor(
+            self.processes,
+            initializer=_initialise_worker,
+            initargs=(self.filterer,),
+        )
+        return self
+
+    def shutdown(self, wait=True):
+        """Stop the worker processes, abandoning any waiting phrases."""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._executor.shutdown(wait=wait)
+
+    def classify(self, phrase):
+        """Add the phrase to the current batch.
+
+        Returns:
+          :py:class:`asyncio.Future`: Whether the phrase matched, once
+            its batch has been classified.
+
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._batch.append((phrase, future))
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self.flush)
+        return future
+
+    def flush(self):
+        """Send the waiting phrases to the pool now."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._batch = self._batch, []
+        if batch:
+            asyncio.ensure_future(self._classify_batch(batch))
+
+    async def _classify_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            matches, metrics = await loop.run_in_executor(
+                self._executor,
+                _classify_batch,
+                [phrase for phrase, _ in batch],
+                _schemes(self.filterer),
+            )
+        except Exception as exc:  # pylint: disable=broad-except
+            matches, metrics = [exc] * len(batch), None
+        if metrics is not None:
+            _merge_metrics(self.filterer, metrics)
+        for (_, future), matched in zip(batch, matches):
+            if future.done():
+                continue  # dropped while waiting
+            if isinstance(matched, Exception):
+                future.set_exception(matched)
+            else:
+                future.set_result(matched)
+
+
+class AsyncRetweetListener:  # pylint: disable=too-many-instance-attributes
+    """Classify statuses in an executor and retweet the matches.
+
+    Arguments:
+      retweeter (:py:class:`AsyncRetweeter`): Makes the retweets.
+      extractor (:py:class:`callable`): Extracts the phrase from a
+        status's text.
+      filterer (:py:class:`callable`): Whether a phrase should be
+        retweeted.
+      executor (:py:class:`concurrent.futures.Executor`, optional): The
+        executor to classify phrases on (defaults to the event loop's),
+        or an :py:class:`AsyncProcessClassifier`.
+      name (:py:class:`str`, optional): The name of the stream, for
+        logging.
+      locations (:py:class:`~eleanorrigbot.listen.LocationCounts`,
+        optional): Counts the statuses and matches in each of the
+        locations the stream is filtered by.
+      maxsize (:py:class:`int`, optional): The most statuses being
+        classified at once (``0`` for no limit).
+      drop_policy (:py:class:`str`, optional): What to do with a status
+        once ``maxsize`` are being classified, as for
+        :py:class:`~eleanorrigbot.dispatch.WorkerPool`: ``'block'`` the
+        stream until there's space, drop the ``'newest'`` status (the
+        one received) or drop the ``'oldest'`` status being classified.
+
+    """
+
+    def __init__(self, retweeter, extractor, filterer, executor=None,
+                 name='stream', locations=None, maxsize=1000,
+                 drop_policy='newest'):
+        # pylint: disable=too-many-arguments
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError('unknown drop policy {!r}'.format(drop_policy))
+        self.retweeter = retweeter
+        self.extractor = extractor
+        self.filterer = filterer
+        self.executor = executor
+        self.name = name
+        self.locations = locations
+        self.maxsize = maxsize
+        self.drop_policy = drop_policy
+        self._tasks = {}
+        self._counts = dict(statuses=0, matches=0, dropped=0)
+
+    def stats(self):
+        """The number of statuses received, matched and dropped."""
+        return dict(self._counts)
+
+    async def space(self):
+        """Wait until a status can be classified without dropping one.
+
+        Only waits with the ``'block'`` drop policy; the stream awaits
+        this before passing on each status.
+
+        """
+        while self.drop_policy == 'block' and self._full():
+            await asyncio.wait(list(self._tasks),
+                               return_when=asyncio.FIRST_COMPLETED)
+
+    def on_status(self, status):
+        """Called when a new status is streamed."""
+        with RECEIVE_TIME.time():
+            self._counts['statuses'] += 1
+            if self.drop_policy != 'block' and self._full():
+                self._counts['dropped'] += 1
+                logger.debug('%s classifying %s statuses, %s dropped',
+                             self.name, len(self._tasks),
+                             self._counts['dropped'])
+                if self.drop_policy == 'newest':
+                    return
+                oldest = next(iter(self._tasks))
+                del self._tasks[oldest]
+                oldest.cancel()
+            text = status_text(status)
+            logger.debug(
+                'received %r from @%s: %r',
+                status.id,
+                status.author.screen_name,
+                text,
+            )
+            names = ()
+            if self.locations is not None:
+                names = self.locations.locate(status)
+                self.locations.count(names, 'statuses')
+            _track(self._tasks, self.classify(status.id, text, names))
+
+    async def classify(self, status_id, text, locations=()):
+        """Retweet the status if its text passes the filter."""
+        loop = asyncio.get_running_loop()
+        with EXTRACT_TIME.time():
+            phrase = self.extractor(text)
+        if isinstance(self.executor, AsyncProcessClassifier):
+            # timed in the worker, and merged with its metrics
+            matched = await self.executor.classify(phrase)
+        else:
+            with MATCH_TIME.time():
+                matched = await loop.run_in_executor(self.executor,
+                                                     self.filterer, phrase)
+        if matched:
+            self._counts['matches'] += 1
+            if self.locations is not None:
+                self.locations.count(locations, 'matches')
+            logger.info('%s retweeting %r %r', self.name, status_id, text)
+            self.retweeter.submit(status_id)
+
+    async def join(self):
+        """Wait for the statuses being classified."""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _full(self):
+        return 0 < self.maxsize <= len(self._tasks)
+
+
+class AsyncStream:
+    """Read statuses from a filtered stream, reconnecting on failure.
+
+    Arguments:
+      session (:py:class:`aiohttp.ClientSession`): The session to make
+        requests with.
+      auth (:py:class:`tweepy.OAuthHandler`): Signs the requests.
+      listener (:py:class:`AsyncRetweetListener`): Receives the
+        statuses.
+      reconnects (:py:class:`~.ReconnectScheduler`, optional): Decides
+        when to reconnect.
+      url (:py:class:`str`, optional): The stream endpoint.
+
+    """
+
+    def __init__(self, session, auth, listener, reconnects=None,
+                 url=STREAM_URL):
+        # pylint: disable=too-many-arguments
+        self.session = session
+        self.auth = auth
+        self.listener = listener
+        self.reconnects = reconnects or ReconnectScheduler()
+        self.url = url
+
+    @property
+    def name(self):
+        """The name of the stream."""
+        return self.listener.name
+
+    @property
+    def locations(self):
+        """The listener's counts of each location, if it has them."""
+        return self.listener.locations
+
+    def stats(self):
+        """The stream's metrics, as for ``RetweetListener``."""
+        return dict(self.listener.stats(), **self.reconnects.stats())
+
+    async def filter(self, locations):
+        """Stream the statuses at the locations until cancelled.
+
+        Arguments:
+          locations (:py:class:`list`): The coordinates of the bounding
+            boxes to listen to, one after another.
+
+        """
+        data = dict(locations=','.join(map(str, locations)))
+        while True:
+            try:
+                status_code = await self._read(data)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                logger.error('%s stream failed: %s', self.listener.name, exc)
+                status_code = None
+            delay = self.reconnects.failed(status_code)
+            logger.info('reconnecting in %.1f seconds', delay)
+            await asyncio.sleep(delay)
+
+    async def _read(self, data):
+        """Read from one connection; returns the error status code."""
+        url, headers, body = _sign(self.auth, self.url, data)
+        timeout = aiohttp.ClientTimeout(sock_read=90)
+        async with self.session.post(url, headers=headers, data=body,
+                                     timeout=timeout) as response:
+            if response.status != 200:
+                logger.error('%s streaming error %s', self.listener.name,
+                             response.status)
+                return response.status
+            self.reconnects.connected()
+            async for line in response.content:
+                if line.strip():
+                    await self.listener.space()
+                    self._on_data(json.loads(line))
+        logger.warning('%s stream closed', self.listener.name)
+        return None
+
+    def _on_data(self, data):
+        if 'id' in data and 'text' in data:
+            self.listener.on_status(Status.parse(None, data))
+        else:
+            logger.debug('stream message: %r', data)
+
+
+async def start_listening(locations=None, filterer=ELEANOR_RIGBY, workers=0,
+                          processes=0, batch_size=20, connections=100,
+                          location=None, **pool_args):
+    """Start listening to the Twitter stream at the given locations.
+
+    All of the locations are filtered on one connection, and the
+    listener counts the statuses and matches in each of them.
+
+    Arguments:
+      locations (:py:class:`list`): The bounding box to listen to, or a
+        list of them.
+      filterer (:py:class:`callable`, optional): Whether an extracted
+        phrase should be retweeted.
+      workers (:py:class:`int`, optional): The number of threads to
+        classify statuses on (``0`` for the event loop's default).
+      processes (:py:class:`int`, optional): The number of processes to
+        classify statuses on in batches (overrides ``workers``).
+      batch_size (:py:class:`int`, optional): The number of statuses
+        sent to a process at once.
+      connections (:py:class:`int`, optional): The size of the shared
+        connection pool.
+      location (:py:class:`list`, optional): Deprecated alias for
+        ``locations``.
+      **pool_args (:py:class:`dict`): Additional arguments for the
+        :py:class:`AsyncRetweetListener` limiting the statuses being
+        classified (``maxsize`` and ``drop_policy``).
+
+    """
+    # pylint: disable=too-many-arguments
+    locations = count_locations(locations, location)
+    auth = get_authentication()
+    executor = await _start_executor(filterer, workers, processes, batch_size)
+    connector = aiohttp.TCPConnector(limit=connections)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        retweeter = AsyncRetweeter(session, auth)
+        listener = AsyncRetweetListener(
+            retweeter,
+            extract_words,
+            filterer,
+            executor,
+            locations=locations,
+            **pool_args
+        )
+        stream = AsyncStream(session, auth, listener)
+        register_pipeline(filterer, [stream], retweeter=retweeter)
+        logger.info('starting to listen to the stream at %s',
+                    ' and '.join(locations.names))
+        try:
+            await stream.filter(
+                [coordinate for box in locations.boxes for coordinate in box],
+            )
+        finally:
+            executor.shutdown(wait=False)
+
+
+async def _start_executor(filterer, workers, processes, batch_size):
+    """Start the threads or processes to classify statuses on."""
+    loop = asyncio.get_running_loop()
+    if not processes:
+        loop.run_in_executor(None, get_pronunciations)
+        return ThreadPoolExecutor(workers or None)
+    classifier = AsyncProcessClassifier(filterer, processes, batch_size)
+    # the index is loaded (off the loop) before forking the workers
+    await loop.run_in_executor(None, classifier.start)
+    return classifier
+
+
+def _sign(auth, url, data=None):
+    """Sign a POST request with the OAuth credentials."""
+    body = urlencode(data or {})
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    return auth.apply_auth().client.sign(url, 'POST', body, headers)
+
+
+def _track(tasks, coroutine):
+    """Run the coroutine as a task, holding it until it's done.
+
+    The tasks are the keys of a :py:class:`dict`, so the oldest is
+    first.
+
+    """
+    task = asyncio.ensure_future(coroutine)
+    tasks[task] = None
+    task.add_done_callback(lambda done: tasks.pop(done, None))
+    return task
@@ -0,0 +1,210 @@
+"""Size-bounded memoization for word-level lookups."""
+from collections import OrderedDict, defaultdict
+from threading import Lock
+
+POLICIES = ('lru', 'lfu')
+
+
+class BoundedCache:  # pylint: disable=too-many-instance-attributes
+    """Memoize a single-argument function in a bounded cache.
+
+    Arguments:
+      function (:py:class:`callable`): The function to memoize.
+      maxsize (:py:class:`int`, optional): The maximum number of
+        results to keep.
+      policy (:py:class:`str`, optional): The eviction policy, either
+        ``'lru'`` (least recently used) or ``'lfu'`` (least frequently
+        used).
+
+    Attributes:
+      hits (:py:class:`int`): The number of lookups found in the cache.
+      misses (:py:class:`int`): The number of lookups computed.
+      evictions (:py:class:`int`): The number of results discarded to
+        stay within ``maxsize``.
+
+    """
+
+    def __init__(self, function, maxsize=4096, policy='lru'):
+        if policy not in POLICIES:
+            raise ValueError('unknown cache policy {!r}'.format(policy))
+        if maxsize < 1:
+            raise ValueError('cache size must be positive')
+        self.function = function
+        self.maxsize = maxsize
+        self.policy = policy
+        self.hits = self.misses = self.evictions = 0
+        self._lock = Lock()
+        self._store = _LFUStore() if policy == 'lfu' else _LRUStore()
+        self._looked_up = None
+
+    def __call__(self, key):
+        with self._lock:
+            if self._looked_up is not None:
+                self._looked_up.add(key)
+            try:
+                value = self._store.get(key)
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                return value
+        value = self.function(key)
+        self.put(key, value)
+        return value
+
+    def __len__(self):
+        return len(self._store)
+
+    def __repr__(self):
+        return '<{} {}>'.format(
+            type(self).__name__,
+            ' '.join('{}={!r}'.format(*item) for item in self.stats().items()),
+        )
+
+    def keys(self):
+        """The cached keys (least recently used first, for LRU)."""
+        with self._lock:
+            return list(self._store)
+
+    def track_lookups(self):
+        """Start recording the keys looked up, for :py:meth:`take_lookups`."""
+        with self._lock:
+            if self._looked_up is None:
+                self._looked_up = set()
+        return self
+
+    def take_lookups(self):
+        """The distinct keys looked up since this was last called.
+
+        Keys cached with :py:meth:`put` aren't included until they're
+        looked up, and nothing is recorded until
+        :py:meth:`track_lookups` is called (so the keys don't pile up
+        if nothing takes them).
+
+        """
+        with self._lock:
+            looked_up = self._looked_up
+            if looked_up is not None:
+                self._looked_up = set()
+        return looked_up or set()
+
+    def put(self, key, value):
+        """Cache a result without calling the function (e.g. to warm up).
+
+        The counters are not changed, and keys already cached are left
+        alone.
+
+        """
+        with self._lock:
+            if key not in self._store:
+                while len(self._store) >= self.maxsize:
+                    self._store.evict()
+                    self.evictions += 1
+                self._store.put(key, value)
+
+    def clear(self):
+        """Discard all cached results and reset the counters."""
+        with self._lock:
+            self._store = type(self._store)()
+            if self._looked_up is not None:
+                self._looked_up = set()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """The cache counters.
+
+        Returns:
+          :py:class:`dict`: The policy, size, capacity, hits, misses,
+            evictions and hit rate of the cache.
+
+        """
+        lookups = self.hits + self.misses
+        return dict(
+            policy=self.policy,
+            size=len(self._store),
+            maxsize=self.maxsize,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            hit_rate=self.hits / lookups if lookups else 0.0,
+        )
+
+
+class _LRUStore:
+    """Storage evicting the least recently used key."""
+
+    def __init__(self):
+        self._data = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        """The key's value, marking it as the most recently used."""
+        value = self._data[key]
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """Store a new key, as the most recently used."""
+        self._data[key] = value
+
+    def evict(self):
+        """Discard the least recently used key."""
+        self._data.popitem(last=False)
+
+
+class _LFUStore:
+    """Storage evicting the least frequently used key.
+
+    Keys are bucketed by use count so that lookups and evictions are
+    both constant time; ties are broken by least recent use.
+
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._buckets = defaultdict(OrderedDict)
+        self._min_count = 0
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        """The key's value, counting the use."""
+        value, count = self._data[key]
+        bucket = self._buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[count]
+            if self._min_count == count:
+                self._min_count = count + 1
+        self._buckets[count + 1][key] = None
+        self._data[key] = value, count + 1
+        return value
+
+    def put(self, key, value):
+        """Store a new key, used once."""
+        self._data[key] = value, 1
+        self._buckets[1][key] = None
+        self._min_count = 1
+
+    def evict(self):
+        """Discard the least frequently used key."""
+        bucket = self._buckets[self._min_count]
+        key, _ = bucket.popitem(last=False)
+        if not bucket:
+            del self._buckets[self._min_count]
+        del self._data[key]
@@ -1,15 +1,312 @@
 """Functionality for classifying phrases extracted from tweets."""
+import atexit
 import logging
+import math
 
-from collections import defaultdict
-from itertools import combinations
+from collections import Counter, defaultdict, namedtuple
+from itertools import accumulate
+from threading import Lock
 
-from pronouncing import phones_for_word, rhymes, syllable_count
+from .cache import BoundedCache
+from .estimate import Estimate, Estimator
+from .metrics import REGISTRY, StatsCollector
+from .pronunciations import load_index
+from .store import WordStore
+from .vectorised import BatchMatchingMixin
 
 logger = logging.getLogger(__name__)
 
+RHYME_CHECK_TIME = REGISTRY.histogram(
+    'rigbot_rhyme_check_seconds',
+    'Time spent splitting candidate phrases into lines and checking rhymes',
+)
 
-class PhraseMatcher:  # pylint: disable=too-few-public-methods
+ESTIMATE_POLICIES = (None, 'confident', 'all')
+"""Which estimated pronunciations a matcher uses: none, confident or all."""
+
+ESTIMATOR = None
+"""Estimates pronunciations of unknown words, if configured."""
+
+STORE = None
+"""Keeps the words looked up between restarts, if configured."""
+
+_PRONUNCIATIONS = None
+_PRONUNCIATIONS_LOCK = Lock()
+
+
+class Rejections(Counter):
+    """The number of phrases rejected at each stage.
+
+    A matcher can be shared by several threads, so counts are added
+    with :py:meth:`add` or :py:meth:`update` (rather than ``+=``, which
+    can lose updates) and read with :py:meth:`snapshot`.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._lock = Lock()
+        super().__init__(*args, **kwargs)
+
+    def add(self, stage, count=1):
+        """Add to the count for a stage."""
+        with self._lock:
+            self[stage] += count
+
+    def update(self, *args, **kwargs):  # pylint: disable=arguments-differ
+        """Add the counts, as :py:meth:`collections.Counter.update`."""
+        with self._lock:
+            super().update(*args, **kwargs)
+
+    def snapshot(self):
+        """A copy of the counts, as a :py:class:`dict`."""
+        with self._lock:
+            return dict(self)
+
+
+def get_pronunciations():
+    """The pronunciation index, loaded on first use.
+
+    The index is read from the prebuilt snapshot (see
+    :py:func:`~eleanorrigbot.pronunciations.load_index`), so importing
+    the package is cheap and the data is only loaded once, even if
+    several threads need it at the same time.
+
+    Returns:
+      :py:class:`~eleanorrigbot.pronunciations.PronunciationIndex`:
+        The index.
+
+    """
+    global _PRONUNCIATIONS  # pylint: disable=global-statement
+    if _PRONUNCIATIONS is None:
+        with _PRONUNCIATIONS_LOCK:
+            if _PRONUNCIATIONS is None:
+                _PRONUNCIATIONS = load_index()
+    return _PRONUNCIATIONS
+
+
+def lookup_pronunciations(word):
+    """The ``(syllables, rhyme_key)`` pronunciations of the word.
+
+    If the word isn't in the index and an estimator is configured (see
+    :py:func:`configure_estimator`), its pronunciations are estimated.
+    If a store is configured (see :py:func:`configure_store`), the
+    result is written to it.
+
+    """
+    pronunciations = get_pronunciations().pronunciations(word)
+    if not pronunciations and ESTIMATOR is not None:
+        pronunciations = ESTIMATOR(word)
+    if STORE is not None:
+        STORE.record(word, pronunciations)
+    return pronunciations
+
+
+WORD_CACHE = BoundedCache(lookup_pronunciations)
+"""The shared cache of word pronunciations used by all matchers."""
+
+
+REGISTRY.register(StatsCollector(
+    'rigbot_word_cache',
+    counters=('hits', 'misses', 'evictions'),
+).add(lambda: WORD_CACHE.stats()))  # pylint: disable=unnecessary-lambda
+
+
+def configure_cache(maxsize, policy='lru'):
+    """Replace the shared word cache with one of the given size.
+
+    Arguments:
+      maxsize (:py:class:`int`): The maximum number of words to cache.
+      policy (:py:class:`str`, optional): The eviction policy, ``'lru'``
+        or ``'lfu'``.
+
+    """
+    global WORD_CACHE  # pylint: disable=global-statement
+    WORD_CACHE = BoundedCache(lookup_pronunciations, maxsize, policy)
+    return WORD_CACHE
+
+
+def configure_estimator(path=None):
+    """Estimate the pronunciations of words that aren't in the index.
+
+    The word cache is cleared, so words already looked up are
+    estimated the next time they're seen.
+
+    Arguments:
+      path (:py:class:`str`, optional): The file to keep the estimates
+        in, so they persist between runs.
+
+    Returns:
+      :py:class:`~eleanorrigbot.estimate.Estimator`: The estimator.
+
+    """
+    global ESTIMATOR  # pylint: disable=global-statement
+    ESTIMATOR = Estimator(get_pronunciations, path)
+    WORD_CACHE.clear()
+    return ESTIMATOR
+
+
+REGISTRY.register(StatsCollector(
+    'rigbot_estimates',
+    counters=('estimated',),
+).add(lambda: ESTIMATOR.stats() if ESTIMATOR is not None else {}))
+
+
+def configure_store(path, warm=True):
+    """Share the words looked up through a store on disk.
+
+    Call this after :py:func:`configure_cache` and
+    :py:func:`configure_estimator` (if they're used), so that the cache
+    being warmed is the one the matchers use.
+
+    Arguments:
+      path (:py:class:`str`): The SQLite database to keep the words in
+        (created if it doesn't exist).
+      warm (:py:class:`bool`, optional): Whether to fill the word cache
+        from the store straight away.
+
+    Returns:
+      :py:class:`~eleanorrigbot.store.WordStore`: The store.
+
+    """
+    global STORE  # pylint: disable=global-statement
+    STORE = WordStore(path, get_pronunciations,
+                      WORD_CACHE.track_lookups().take_lookups)
+    atexit.register(STORE.close)
+    if warm:
+        warm_cache(STORE)
+    return STORE
+
+
+REGISTRY.register(StatsCollector(
+    'rigbot_word_store',
+    counters=('recorded', 'written', 'flushes', 'errors'),
+).add(lambda: STORE.stats() if STORE is not None else {}))
+
+
+def warm_cache(store):
+    """Fill the word cache with the most used words in the store.
+
+    Estimates are only used if an estimator is configured, and words
+    whose rhyming parts aren't in the index (e.g. because it was built
+    from a different dictionary) are skipped.
+
+    Arguments:
+      store (:py:class:`~eleanorrigbot.store.WordStore`): The store.
+
+    Returns:
+      :py:class:`int`: The number of words added to the cache.
+
+    """
+    index = get_pronunciations()
+    warmed = 0
+    # least used first, so that the most used are the most recent
+    for word, pronunciations, estimated, confident in reversed(
+            store.most_used(WORD_CACHE.maxsize)
+    ):
+        if estimated:
+            if ESTIMATOR is None:
+                continue
+            ESTIMATOR.remember(word, pronunciations, confident)
+            options = ESTIMATOR(word)
+        else:
+            options = tuple(
+                (syllables, index.rhyme_key_for(part))
+                for syllables, part in pronunciations
+            )
+            if any(key is None for _, key in options):
+                continue
+        WORD_CACHE.put(word, options)
+        warmed += 1
+    logger.info('warmed the word cache with %s words', warmed)
+    return warmed
+
+
+def trusted(options, estimates='confident'):
+    """The pronunciations of a word, if they can be used.
+
+    Arguments:
+      options (:py:class:`tuple`): The pronunciations of the word.
+      estimates (:py:class:`str`, optional): Which estimated
+        pronunciations can be used (see :py:data:`ESTIMATE_POLICIES`).
+
+    Returns:
+      :py:class:`tuple`: The pronunciations, or an empty tuple if they
+        are an estimate that can't be used.
+
+    """
+    if isinstance(options, Estimate) and not (
+            estimates == 'all'
+            or (estimates == 'confident' and options.confident)
+    ):
+        return ()
+    return options
+
+
+Analysis = namedtuple('Analysis', 'rejection words pronunciations')
+"""The words of a phrase and their pronunciations, or why it was rejected."""
+
+
+def analyse_phrase(phrase, min_words=1, max_syllables=None,
+                   estimates='confident'):
+    """Split a phrase into words and look up their pronunciations.
+
+    The cheapest checks come first: the phrase is rejected on its
+    length before it's split, and lookups stop at the first unknown
+    word or as soon as the phrase must have too many syllables.
+
+    Arguments:
+      phrase (:py:class:`str` or :py:class:`list`): The phrase to
+        analyse, or its words (e.g. from
+        :py:func:`~eleanorrigbot.extract.extract_words`).
+      min_words (:py:class:`int`, optional): The fewest words the
+        phrase can have.
+      max_syllables (:py:class:`int`, optional): The most syllables
+        the phrase can have.
+      estimates (:py:class:`str`, optional): Which estimated
+        pronunciations can be used; words with other estimates count as
+        unknown.
+
+    Returns:
+      :py:class:`Analysis`: The analysis, where ``rejection`` is
+        ``None`` or the name of the stage that rejected the phrase
+        (``'length'``, ``'unknown'`` or ``'syllables'``).
+
+    """
+    if isinstance(phrase, str):
+        if (len(phrase) < 2 * min_words - 1
+                or phrase.count(' ') + 1 < min_words):
+            return Analysis('length', None, None)
+        words = phrase.split()
+    else:
+        words = phrase
+    if not words or len(words) < min_words:
+        return Analysis('length', None, None)
+    pronunciations = []
+    fewest = 0
+    for word in words:
+        options = trusted(WORD_CACHE(word), estimates)
+        if not options:
+            return Analysis('unknown', words, None)
+        fewest += min(options)[0]
+        if max_syllables is not None and fewest > max_syllables:
+            return Analysis('syllables', words, None)
+        pronunciations.append(options)
+    return Analysis(None, words, pronunciations)
+
+
+def syllable_range(pronunciations):
+    """The fewest and most syllables the pronunciations can add up to."""
+    return (sum(min(options)[0] for options in pronunciations),
+            sum(max(options)[0] for options in pronunciations))
+
+
+def _check_estimates(estimates):
+    """Ensure that the estimate policy is valid."""
+    if estimates not in ESTIMATE_POLICIES:
+        raise ValueError('unknown estimate policy {!r}'.format(estimates))
+
+
+class PhraseMatcher(BatchMatchingMixin):  # pylint: disable=too-many-instance-attributes
     """Class to match phrases found in tweets.
 
     Arguments:
@@ -21,112 +318,327 @@ class PhraseMatcher:  # pylint: disable=too-few-public-methods
         be hashable (e.g. :py:class:`int` or :py:class:`str`). Note
         that the length of the ``rhyming_scheme`` must be the same as
         the ``syllable_pattern``.
+      estimates (:py:class:`str`, optional): Which estimated
+        pronunciations of unknown words to use: ``'confident'`` ones,
+        ``'all'`` of them or none (``None``). Words are only estimated
+        once :py:func:`configure_estimator` has been called.
 
     Attributes:
       total_syllables (:py:class:`int`): The total number of syllables
         in the phrase.
       rhyming_lines (:py:class:`dict`): The map of rhyming groups to
         line numbers.
+      rejections (:py:class:`Rejections`): The number of
+        phrases rejected at each stage (see :py:func:`analyse_phrase`,
+        plus ``'structure'`` for phrases that don't fit the scheme),
+        and the number ``'matched'``.
 
     """
 
-    def __init__(self, syllable_pattern, rhyming_scheme=None):
+    def __init__(self, syllable_pattern, rhyming_scheme=None,
+                 estimates='confident'):
         if (rhyming_scheme is not None
                 and len(syllable_pattern) != len(rhyming_scheme)):
             error = 'syllable pattern and rhyming scheme must have same length'
             raise ValueError(error)
+        _check_estimates(estimates)
         self.syllable_pattern = syllable_pattern
+        self.estimates = estimates
         self.total_syllables = sum(syllable_pattern)
         self.rhyming_lines = self._create_rhyming_lines(rhyming_scheme)
+        self._boundaries = tuple(accumulate(syllable_pattern))
+        self._line_groups = self._create_line_groups(self.rhyming_lines,
+                                                     len(syllable_pattern))
+        self._min_words = None
+        self.rejections = Rejections()
+
+    @property
+    def min_words(self):
+        """The fewest words that could contain ``total_syllables``."""
+        if self._min_words is None:
+            self._min_words = math.ceil(
+                self.total_syllables
+                / max(get_pronunciations().max_syllables(), 1)
+            )
+        return self._min_words
 
     def __call__(self, phrase):
         """Whether a phrase matches the scheme.
 
         Arguments:
-          phrase (:py:class:`str`): The phrase to test.
+          phrase (:py:class:`str` or :py:class:`list`): The phrase to
+            test, or its words (any other iterable of words is matched
+            with :py:meth:`match_stream`).
 
         Returns:
           :py:class:`bool`: Whether it matches the scheme.
 
         """
-        words_and_syllables = [(word, self._syllables_in_word(word))
-                               for word in phrase.split()]
-        total_syllables = self._calculate_total_syllables(words_and_syllables)
-        if total_syllables is None:
-            return False
-        logger.debug(
-            'processing %s-syllable tweet: %r',
-            total_syllables,
-            words_and_syllables
+        if not isinstance(phrase, (str, list, tuple)):
+            return self.match_stream(phrase)
+        rejection, words, pronunciations = analyse_phrase(
+            phrase,
+            self.min_words,
+            self.total_syllables,
+            self.estimates,
         )
-        if total_syllables != self.total_syllables:
+        if rejection is None:
+            fewest, most = syllable_range(pronunciations)
+            if not fewest <= self.total_syllables <= most:
+                rejection = 'syllables'
+        if rejection is not None:
+            self.rejections.add(rejection)
             return False
-        lines = self._greedy_match_syllable_pattern(words_and_syllables)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                'processing %s-word tweet: %r',
+                len(words),
+                [(word, tuple(sorted({syllables for syllables, _ in options})))
+                 for word, options in zip(words, pronunciations)],
+            )
+        with RHYME_CHECK_TIME.time():
+            lines = self.match_lines(words, pronunciations)
         if lines is None:
+            self.rejections.add('structure')
             return False
-        logger.info('tweet matches syllable pattern: %r', lines)
-        return self._match_rhyming_scheme(lines)
+        self.rejections.add('matched')
+        logger.info('tweet matches scheme: %r', lines)
+        return True
+
+    def match_stream(self, tokens):
+        """Whether a stream of words matches the scheme.
 
-    def _match_rhyming_scheme(self, lines):
-        """Whether the lines fit the rhyming scheme.
+        Unlike calling the matcher, the words are looked up and fitted
+        to the line boundaries one at a time, so it stops consuming the
+        stream at the first unknown word or as soon as no split of the
+        words so far can end its lines on the boundaries. Rhymes are
+        only checked once the whole phrase fits the syllable pattern.
 
         Arguments:
-          lines (:py:class:`list`): The lines, as a list of lists of
-            strings.
+          tokens (:py:class:`iterable`): The words of the phrase, e.g.
+            from :py:func:`~eleanorrigbot.extract.iter_words`.
 
         Returns:
-          :py:class:`bool`: Whether the lines match the rhyming scheme.
+          :py:class:`bool`: Whether it matches the scheme.
 
         """
-        if self.rhyming_lines is not None:
-            for indices in self.rhyming_lines.values():
-                if not self._lines_rhyme(*[lines[index] for index in indices]):
-                    return False
+        rejection, lines = self._stream_lines(tokens)
+        if rejection is not None:
+            self.rejections.add(rejection)
+            return False
+        self.rejections.add('matched')
+        logger.info('tweet matches scheme: %r', lines)
         return True
 
-    def _greedy_match_syllable_pattern(self, words_and_syllables):
-        """Whether the words_and_syllables fit into the pattern.
+    def _stream_lines(self, tokens):
+        """Split a stream of words into lines that fit the scheme.
+
+        As :py:meth:`match_lines`, but each state records the rhyme key
+        and word ending each line in a rhyming group, rather than
+        checking the rhymes as it goes.
+
+        Returns:
+          :py:class:`tuple`: The name of the stage that rejected the
+            phrase (or ``None``) and the words split into lines.
+
+        """
+        states = {(0, 0, ()): ()}
+        words = []
+        fewest = 0
+        for index, word in enumerate(tokens):
+            options = self._trusted_pronunciations(word)
+            if not options:
+                return 'unknown', None
+            words.append(word)
+            fewest += min(options)[0]
+            states = self._next_endings(states, index, word, options)
+            if not states:
+                return ('syllables' if fewest > self.total_syllables
+                        else 'structure'), None
+        if not words:
+            return 'length', None
+        complete = [(endings, breaks) for (_, line, endings), breaks
+                    in states.items() if line == len(self._boundaries)]
+        if not complete:
+            return 'syllables', None
+        with RHYME_CHECK_TIME.time():
+            lines = self._rhyming_split(words, complete)
+        return ('structure' if lines is None else None), lines
+
+    def _next_endings(self, states, index, word, options):
+        """As :py:meth:`_next_states`, recording the line endings.
+
+        A word ending a line in a rhyming group is added to the state's
+        ``(word, rhyme_key)`` endings, to be checked once the phrase
+        is complete.
+
+        """
+        next_states = {}
+        for (count, line, endings), breaks in states.items():
+            if line == len(self._boundaries):
+                continue
+            boundary = self._boundaries[line]
+            for syllables, rhyme_key in options:
+                new_count = count + syllables
+                if new_count < boundary:
+                    next_states.setdefault((new_count, line, endings), breaks)
+                elif new_count == boundary:
+                    if self._line_groups[line] is not None:
+                        new_endings = endings + ((word, rhyme_key),)
+                    else:
+                        new_endings = endings
+                    next_states.setdefault(
+                        (new_count, line + 1, new_endings),
+                        breaks + (index + 1,),
+                    )
+        return next_states
+
+    def _rhyming_split(self, words, complete):
+        """The first split of the words whose line endings rhyme.
 
         Arguments:
-          words_and_syllables (:py:class:`list`): The words in the
-            phrase and their syllable counts.
+          words (:py:class:`list`): The words in the phrase.
+          complete (:py:class:`list`): The ``(endings, breaks)`` of
+            each split fitting the syllable pattern.
 
         Returns:
-          :py:class:`list`: The words in the phrase split into the
-            pattern or ``None`` if the phrase didn't fit the pattern.
+          :py:class:`list`: The words split into lines, or ``None`` if
+            none of the splits rhyme.
+
+        """
+        for endings, breaks in complete:
+            if self._endings_rhyme(endings):
+                return [words[start:end] for start, end
+                        in zip((0,) + breaks, breaks)]
+        return None
+
+    def _trusted_pronunciations(self, word):
+        """The word's pronunciations, including trusted estimates."""
+        return trusted(WORD_CACHE(word), self.estimates)
+
+    def _endings_rhyme(self, endings):
+        """Whether the words ending the lines rhyme within their groups.
+
+        Arguments:
+          endings (:py:class:`tuple`): The ``(word, rhyme_key)`` ending
+            each line in a rhyming group, in order.
 
         """
-        words_and_syllables = words_and_syllables[:]
-        phrase = [[]]
-        for count in self.syllable_pattern:
-            while True:
-                word, syllables = words_and_syllables.pop(0)
-                count -= syllables
-                if count < 0:
-                    return
-                phrase[-1].append(word)
-                if count == 0:
-                    phrase.append([])
-                    break
-        return phrase[:-1] if len(words_and_syllables) == 0 else None
+        rhymes = (None,) * len(self.rhyming_lines or ())
+        groups = (group for group in self._line_groups if group is not None)
+        for group, (word, rhyme_key) in zip(groups, endings):
+            rhymes = self._add_rhyme(rhymes, group, word, rhyme_key)
+            if rhymes is None:
+                return False
+        return True
+
+    def match_lines(self, words, pronunciations):
+        """Split the words into lines that fit the scheme.
+
+        Every pronunciation of every word is considered, by tracking
+        the set of reachable states after each word rather than trying
+        each combination of pronunciations. A state is the syllable
+        count so far, the current line and, for each rhyming group, the
+        rhyme key and words of the lines already ended in that group.
+        The number of states is bounded by the syllable count of the
+        scheme (and the few rhyme keys that can end each line), so the
+        cost grows with words x syllables.
+
+        Arguments:
+          words (:py:class:`list`): The words in the phrase.
+          pronunciations (:py:class:`list`): The ``(syllables,
+            rhyme_key)`` pronunciations of each word.
+
+        Returns:
+          :py:class:`list`: The words in the phrase split into lines,
+            or ``None`` if the phrase didn't fit the scheme.
+
+        """
+        states = {(0, 0, (None,) * len(self.rhyming_lines or ())): ()}
+        for index, (word, options) in enumerate(zip(words, pronunciations)):
+            states = self._next_states(states, index, word, options)
+            if not states:
+                return None
+        for (_, line, _), breaks in states.items():
+            if line == len(self._boundaries):
+                return [words[start:end] for start, end
+                        in zip((0,) + breaks, breaks)]
+        return None
+
+    def _next_states(self, states, index, word, options):
+        """The states reachable by adding the next word to the phrase.
+
+        Arguments:
+          states (:py:class:`dict`): The ``(syllables, line, rhymes)``
+            states reachable before the word, each mapped to the
+            indices of the words the lines so far end before.
+          index (:py:class:`int`): The index of the word in the phrase.
+          word (:py:class:`str`): The word.
+          options (:py:class:`list`): The ``(syllables, rhyme_key)``
+            pronunciations of the word.
+
+        Returns:
+          :py:class:`dict`: The states reachable after the word (empty
+            if none of them fit the scheme).
+
+        """
+        next_states = {}
+        for (count, line, rhymes), breaks in states.items():
+            if line == len(self._boundaries):
+                continue
+            boundary = self._boundaries[line]
+            for syllables, rhyme_key in options:
+                new_count = count + syllables
+                if new_count < boundary:
+                    next_states.setdefault((new_count, line, rhymes), breaks)
+                elif new_count == boundary:
+                    new_rhymes = self._add_rhyme(
+                        rhymes, self._line_groups[line], word, rhyme_key,
+                    )
+                    if new_rhymes is not None:
+                        next_states.setdefault(
+                            (new_count, line + 1, new_rhymes),
+                            breaks + (index + 1,),
+                        )
+        return next_states
 
     @staticmethod
-    def _calculate_total_syllables(words_and_syllables):
-        """Calculate the total syllable count.
+    def _add_rhyme(rhymes, group, word, rhyme_key):
+        """Add a line-ending word to the state of its rhyming group.
 
         Arguments:
-          words_and_syllables (:py:class:`list`): The words in the
-            phrase and their syllable counts.
+          rhymes (:py:class:`tuple`): The rhyme key and words so far
+            for each rhyming group (``None`` for groups not yet seen).
+          group (:py:class:`int`): The index of the line's rhyming
+            group (or ``None`` if it isn't in a group).
+          word (:py:class:`str`): The word ending the line.
+          rhyme_key (:py:class:`int`): The rhyme key of the word.
 
         Returns:
-          :py:class:`int`: The total syllable count, or ``None`` if
-            any words had no syllable count.
+          :py:class:`tuple`: The new rhyme state, or ``None`` if the
+            word doesn't rhyme with the rest of its group.
 
         """
-        try:
-            return sum(syllables for _, syllables in words_and_syllables)
-        except TypeError:
-            pass
+        if group is None:
+            return rhymes
+        current = rhymes[group]
+        if current is None:
+            entry = (rhyme_key, frozenset((word,)))
+        else:
+            key, group_words = current
+            if key != rhyme_key or word in group_words:
+                return None
+            entry = (key, group_words | {word})
+        return rhymes[:group] + (entry,) + rhymes[group + 1:]
+
+    @staticmethod
+    def _create_line_groups(rhyming_lines, length):
+        """Create the sequence of rhyming group indices for each line."""
+        line_groups = [None] * length
+        for group, indices in enumerate((rhyming_lines or {}).values()):
+            for index in indices:
+                line_groups[index] = group
+        return tuple(line_groups)
 
     @staticmethod
     def _create_rhyming_lines(rhyming_scheme):
@@ -139,38 +651,111 @@ class PhraseMatcher:  # pylint: disable=too-few-public-methods
                 rhyming_lines[group].append(index)
         return rhyming_lines
 
-    @staticmethod
-    def _lines_rhyme(*lines):
-        """Whether the supplied lines rhyme.
+
+class SchemeSet:
+    """Match phrases against several schemes in a single pass.
+
+    Each phrase is split and looked up once, and only the schemes with
+    a total syllable count the phrase could reach are tried, so adding
+    schemes costs almost nothing for phrases that can't match them.
+
+    Arguments:
+      schemes (:py:class:`dict`): The map of scheme names to
+        :py:class:`PhraseMatcher` instances.
+      estimates (:py:class:`str`, optional): Which estimated
+        pronunciations to use, as for :py:class:`PhraseMatcher`.
+
+    Attributes:
+      schemes_by_total (:py:class:`dict`): The map of total syllable
+        counts to lists of ``(name, matcher)`` pairs.
+      rejections (:py:class:`Rejections`): The number of phrases
+        rejected at each stage, as for :py:class:`PhraseMatcher`.
+
+    """
+
+    def __init__(self, schemes, estimates='confident'):
+        _check_estimates(estimates)
+        self.schemes = dict(schemes)
+        self.estimates = estimates
+        self.schemes_by_total = defaultdict(list)
+        for name, matcher in self.schemes.items():
+            self.schemes_by_total[matcher.total_syllables].append(
+                (name, matcher),
+            )
+        self.rejections = Rejections()
+        self._max_syllables = max(self.schemes_by_total, default=0)
+        self._min_words = None
+
+    @property
+    def min_words(self):
+        """The fewest words that could match any of the schemes."""
+        if self._min_words is None:
+            self._min_words = min(
+                (matcher.min_words for matcher in self.schemes.values()),
+                default=1,
+            )
+        return self._min_words
+
+    def __call__(self, phrase):
+        """Whether a phrase matches any of the schemes.
 
         Arguments:
-          *lines (:py:class:`tuple`): The lines to check as lists of
-            lists of words.
+          phrase (:py:class:`str` or :py:class:`list`): The phrase to
+            test, or its words.
 
         Returns:
-          :py:class:`bool`: Whether all of the lines rhyme.
+          :py:class:`bool`: Whether it matches any scheme.
 
         """
-        words = [line[-1] for line in lines]
-        for first_word, second_word in combinations(words, 2):
-            if (first_word not in rhymes(second_word)
-                    and second_word not in rhymes(first_word)):
-                return False
-        return True
+        return bool(self.matches(phrase))
 
-    @staticmethod
-    def _syllables_in_word(word):
-        """Returns the number of syllables in the word.
+    def matches(self, phrase):
+        """The names of all of the schemes that the phrase matches.
 
         Arguments:
-          word (:py:class:`str`): The word to calculate the syllable
-            count for.
+          phrase (:py:class:`str` or :py:class:`list`): The phrase to
+            test, or its words.
 
         Returns:
-          :py:class:`int`: The number of syllables in the word (or
-            ``None`` if the count could not be calculated).
+          :py:class:`list`: The names of the matching schemes.
 
         """
-        phones = phones_for_word(word)
-        if phones:
-            return syllable_count(phones[0])
+        return list(self.split_lines(phrase))
+
+    def split_lines(self, phrase):
+        """Split the phrase into lines for each scheme it matches.
+
+        Arguments:
+          phrase (:py:class:`str` or :py:class:`list`): The phrase to
+            test, or its words.
+
+        Returns:
+          :py:class:`dict`: The map of the names of the matching
+            schemes to the phrase's words split into lines.
+
+        """
+        rejection, words, pronunciations = analyse_phrase(
+            phrase,
+            self.min_words,
+            self._max_syllables,
+            self.estimates,
+        )
+        if rejection is not None:
+            self.rejections.add(rejection)
+            return {}
+        fewest, most = syllable_range(pronunciations)
+        candidates = [schemes for total, schemes in self.schemes_by_total.items()
+                      if fewest <= total <= most]
+        if not candidates:
+            self.rejections.add('syllables')
+            return {}
+        matches = {}
+        for schemes in candidates:
+            for name, matcher in schemes:
+                with RHYME_CHECK_TIME.time():
+                    lines = matcher.match_lines(words, pronunciations)
+                if lines is not None:
+                    logger.info('tweet matches %s: %r', name, lines)
+                    matches[name] = lines
+        self.rejections.add('matched' if matches else 'structure')
+        return matches
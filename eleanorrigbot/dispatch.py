@@ -0,0 +1,768 @@
+"""Functionality for handing work off the stream-reading thread."""
+from collections import Counter, OrderedDict
+import heapq
+import logging
+from multiprocessing import Pool
+from queue import Empty, Full, Queue
+import random
+from threading import Condition, Lock, Thread
+from time import monotonic, perf_counter
+
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from requests.exceptions import Timeout
+
+from . import classify
+from .classify import RHYME_CHECK_TIME, get_pronunciations
+from .listen import MATCH_TIME
+from .metrics import REGISTRY, _snapshot
+
+logger = logging.getLogger(__name__)
+
+DROP_POLICIES = ('block', 'newest', 'oldest')
+
+TRANSIENT_ERRORS = (ConnectionError, TimeoutError, RequestsConnectionError,
+                    Timeout)
+"""The errors (without a response) worth retrying a call after."""
+
+# https://developer.twitter.com/en/docs/basics/rate-limits: 300 tweets
+# and retweets per three hours
+RETWEET_RATE = 300 / (3 * 60 * 60)
+
+RETWEET_TIME = REGISTRY.histogram(
+    'rigbot_retweet_seconds',
+    'Time taken by each retweet request',
+)
+
+_STOP = object()
+
+_FILTERER = None
+
+_WORKER_HISTOGRAMS = (MATCH_TIME, RHYME_CHECK_TIME)
+"""The histograms observed in worker processes, sent back with results."""
+
+
+class WorkerPool:
+    """Run submitted calls on a pool of threads via a bounded queue.
+
+    Arguments:
+      workers (:py:class:`int`, optional): The number of threads.
+      maxsize (:py:class:`int`, optional): The maximum number of calls
+        waiting in the queue (``0`` for no limit).
+      drop_policy (:py:class:`str`, optional): What to do when the
+        queue is full: ``'block'`` the submitter until there's space,
+        drop the ``'newest'`` call (the one being submitted) or drop
+        the ``'oldest'`` call waiting in the queue.
+      name (:py:class:`str`, optional): The name of the pool, used for
+        the threads and in log messages.
+
+    """
+
+    def __init__(self, workers=1, maxsize=1000, drop_policy='newest',
+                 name='worker'):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError('unknown drop policy {!r}'.format(drop_policy))
+        if workers < 1:
+            raise ValueError('pool must have at least one worker')
+        self.name = name
+        self.drop_policy = drop_policy
+        self._queue = Queue(maxsize)
+        self._threads = [
+            Thread(target=self._work, name='{}-{}'.format(name, index),
+                   daemon=True)
+            for index in range(workers)
+        ]
+        self._lock = Lock()
+        self._counts = dict(submitted=0, dropped=0, processed=0, errors=0)
+        self._lag = dict(last=0.0, max=0.0, total=0.0)
+
+    def start(self):
+        """Start the worker threads."""
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stop the worker threads once the queued calls are done."""
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def join(self):
+        """Wait until all of the queued calls have been made."""
+        self._queue.join()
+
+    def submit(self, function, *args):
+        """Queue a call to be made on a worker thread.
+
+        Arguments:
+          function (:py:class:`callable`): The function to call.
+          *args (:py:class:`tuple`): The arguments to call it with.
+
+        Returns:
+          :py:class:`bool`: Whether the call was queued (``False`` if
+            it was dropped because the queue was full).
+
+        """
+        item = (monotonic(), function, args)
+        with self._lock:
+            self._counts['submitted'] += 1
+        if self.drop_policy == 'block':
+            self._queue.put(item)
+            return True
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except Full:
+                if self.drop_policy == 'newest':
+                    self._dropped()
+                    return False
+            try:
+                self._queue.get_nowait()
+            except Empty:
+                continue
+            self._queue.task_done()
+            self._dropped()
+
+    def stats(self):
+        """The pool's metrics.
+
+        Returns:
+          :py:class:`dict`: The current queue depth and capacity, the
+            number of calls submitted, dropped, processed and failed,
+            and the last, maximum and mean time (in seconds) calls
+            waited in the queue.
+
+        """
+        with self._lock:
+            processed = self._counts['processed']
+            return dict(
+                depth=self._queue.qsize(),
+                maxsize=self._queue.maxsize,
+                last_lag=self._lag['last'],
+                max_lag=self._lag['max'],
+                mean_lag=self._lag['total'] / processed if processed else 0.0,
+                **self._counts
+            )
+
+    def _dropped(self):
+        """Record a dropped call."""
+        with self._lock:
+            self._counts['dropped'] += 1
+            dropped = self._counts['dropped']
+        logger.debug('%s queue full, %s calls dropped', self.name, dropped)
+
+    def _work(self):
+        """Make the queued calls until told to stop."""
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                submitted, function, args = item
+                lag = monotonic() - submitted
+                try:
+                    function(*args)
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception('%s call failed', self.name)
+                    failed = True
+                else:
+                    failed = False
+                with self._lock:
+                    self._counts['processed'] += 1
+                    self._counts['errors'] += failed
+                    self._lag['last'] = lag
+                    self._lag['max'] = max(self._lag['max'], lag)
+                    self._lag['total'] += lag
+            finally:
+                self._queue.task_done()
+
+
+class TokenBucket:
+    """Limit the rate of calls, allowing short bursts.
+
+    Arguments:
+      rate (:py:class:`float`): The number of tokens added per second.
+      capacity (:py:class:`int`): The most tokens the bucket can hold
+        (i.e. the largest burst).
+      clock (:py:class:`callable`, optional): Returns the current time
+        in seconds.
+
+    """
+
+    def __init__(self, rate, capacity, clock=monotonic):
+        if rate <= 0 or capacity < 1:
+            raise ValueError('rate and capacity must be positive')
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self._updated = clock()
+
+    def take(self):
+        """Take a token, if one is available.
+
+        Returns:
+          :py:class:`bool`: Whether a token was taken.
+
+        """
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self):
+        """The number of seconds until a token will be available."""
+        self._refill()
+        return max(1 - self.tokens, 0) / self.rate
+
+    def empty(self):
+        """Discard the available tokens (e.g. when rate limited)."""
+        self._refill()
+        self.tokens = 0
+
+    def _refill(self):
+        now = self.clock()
+        elapsed, self._updated = now - self._updated, now
+        self.tokens = min(self.tokens + elapsed * self.rate, self.capacity)
+
+
+class RetweetDispatcher:  # pylint: disable=too-many-instance-attributes
+    """Make calls to a rate-limited API on a background thread.
+
+    Calls are made no faster than a :py:class:`TokenBucket` allows,
+    and any call with the same arguments as one of the ``dedup_size``
+    most recent is dropped as a duplicate (e.g. the same status
+    arriving twice). Calls that fail with a transient error (a
+    connection error or timeout, rate limit or server error) are
+    retried after an exponential backoff with full jitter; other errors
+    (including bugs, e.g. :py:class:`TypeError`) are logged and the
+    call abandoned. Submitting never blocks and no call is
+    dropped other than duplicates.
+
+    Arguments:
+      rate (:py:class:`float`, optional): The number of calls allowed
+        per second (defaults to Twitter's retweet limit).
+      burst (:py:class:`int`, optional): The most calls allowed at
+        once.
+      dedup_size (:py:class:`int`, optional): The number of recent
+        calls to remember.
+      max_retries (:py:class:`int`, optional): The most times to retry
+        a failed call.
+      backoff (:py:class:`float`, optional): The maximum delay before
+        the first retry, in seconds; it doubles for each retry.
+      max_backoff (:py:class:`float`, optional): The longest delay
+        before a retry, in seconds.
+      name (:py:class:`str`, optional): The name of the dispatcher,
+        used for the thread and in log messages.
+
+    """
+
+    def __init__(self, rate=RETWEET_RATE, burst=10, dedup_size=10000,
+                 max_retries=5, backoff=1.0, max_backoff=15 * 60,
+                 name='retweeter'):
+        # pylint: disable=too-many-arguments
+        self.bucket = TokenBucket(rate, burst)
+        self.dedup_size = dedup_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.name = name
+        self._condition = Condition()
+        self._scheduled = []
+        self._sequence = 0
+        self._recent = OrderedDict()
+        self._in_flight = 0
+        self._running = False
+        self._counts = dict(submitted=0, duplicates=0, made=0, retried=0,
+                            failed=0)
+        self._thread = Thread(target=self._work, name=name, daemon=True)
+
+    def start(self):
+        """Start the dispatching thread."""
+        self._running = True
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stop the dispatching thread, abandoning any waiting calls."""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join(timeout)
+
+    def join(self, timeout=None):
+        """Wait until no calls are waiting to be made.
+
+        Returns:
+          :py:class:`bool`: Whether all of the calls have been made.
+
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._condition:
+            while self._scheduled or self._in_flight:
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def submit(self, function, *args):
+        """Schedule a call, unless it duplicates a recent one.
+
+        Arguments:
+          function (:py:class:`callable`): The function to call.
+          *args (:py:class:`tuple`): The arguments to call it with
+            (which identify duplicate calls).
+
+        Returns:
+          :py:class:`bool`: Whether the call was scheduled (``False``
+            if it was a duplicate).
+
+        """
+        with self._condition:
+            self._counts['submitted'] += 1
+            if not remember(self._recent, args, self.dedup_size):
+                self._counts['duplicates'] += 1
+                logger.debug('%s dropped duplicate call %r', self.name, args)
+                return False
+            self._schedule(monotonic(), function, args, 0)
+            return True
+
+    def stats(self):
+        """The dispatcher's metrics.
+
+        Returns:
+          :py:class:`dict`: The number of calls waiting, submitted,
+            dropped as duplicates, made successfully, retried and
+            abandoned after failing.
+
+        """
+        with self._condition:
+            return dict(pending=len(self._scheduled), **self._counts)
+
+    def _schedule(self, due, function, args, attempt):
+        """Add a call to the schedule; the condition must be held."""
+        self._sequence += 1
+        heapq.heappush(
+            self._scheduled,
+            (due, self._sequence, function, args, attempt),
+        )
+        self._condition.notify_all()
+
+    def _next_call(self):
+        """Wait until the next call is due and allowed by the bucket."""
+        with self._condition:
+            while self._running:
+                if not self._scheduled:
+                    self._condition.wait()
+                    continue
+                delay = self._scheduled[0][0] - monotonic()
+                if delay <= 0:
+                    if self.bucket.take():
+                        self._in_flight += 1
+                        return heapq.heappop(self._scheduled)
+                    delay = self.bucket.wait_time()
+                self._condition.wait(delay)
+            return None
+
+    def _work(self):
+        """Make the scheduled calls until told to stop."""
+        while True:
+            item = self._next_call()
+            if item is None:
+                return
+            _, _, function, args, attempt = item
+            try:
+                with RETWEET_TIME.time():
+                    function(*args)
+            except Exception as exc:  # pylint: disable=broad-except
+                self._failed(exc, function, args, attempt)
+            else:
+                self._finished('made')
+
+    def _failed(self, exc, function, args, attempt):
+        """Retry the call after a transient error, or give up."""
+        status_code = _status_code(exc)
+        if status_code == 429:
+            self.bucket.empty()
+        delay = None
+        if attempt < self.max_retries and (status_code is not None
+                                           or is_transient(exc)):
+            delay = retry_delay(status_code, attempt, self.backoff,
+                                self.max_backoff)
+        if delay is None:
+            logger.error('%s call %r failed: %s', self.name, args, exc)
+            self._finished('failed')
+            return
+        logger.warning('%s call %r failed (%s), retrying in %.1fs',
+                       self.name, args, exc, delay)
+        with self._condition:
+            self._counts['retried'] += 1
+            self._in_flight -= 1
+            self._schedule(monotonic() + delay, function, args, attempt + 1)
+
+    def _finished(self, outcome):
+        with self._condition:
+            self._counts[outcome] += 1
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+
+class ProcessClassifier:  # pylint: disable=too-many-instance-attributes
+    """Classify phrases in micro-batches on a pool of processes.
+
+    Phrases are collected until there are ``batch_size`` of them or the
+    oldest has waited ``max_delay`` seconds, then the batch is sent to
+    a worker process. Each worker receives the filterer once, when it
+    starts, and results are passed to the callbacks in the order the
+    phrases were submitted. If the filterer has a ``generation`` and
+    ``definitions`` (i.e. a :py:class:`~eleanorrigbot.schemes.SchemeFile`),
+    each batch carries them, and workers with a different generation
+    switch to those definitions first (rather than reading the file).
+    Workers send back what they've added to the filterer's
+    ``rejections`` and the match and rhyme check histograms with each
+    batch's results, and those are added to this process's metrics.
+
+    Arguments:
+      filterer (:py:class:`callable`): Whether a phrase matches; must
+        be picklable (e.g. a :py:class:`~.PhraseMatcher`).
+      processes (:py:class:`int`, optional): The number of worker
+        processes (defaults to the number of CPUs).
+      batch_size (:py:class:`int`, optional): The number of phrases to
+        send to a worker at once.
+      max_delay (:py:class:`float`, optional): The longest a phrase
+        waits for its batch to fill, in seconds.
+      maxsize (:py:class:`int`, optional): The maximum number of
+        phrases waiting for their results (``0`` for no limit).
+      drop_policy (:py:class:`str`, optional): What to do when that
+        many are waiting, as for :py:class:`WorkerPool`; phrases
+        already sent to a worker can't be dropped, so if none are
+        still in the current batch, ``'oldest'`` drops the newest.
+      name (:py:class:`str`, optional): The name of the classifier,
+        used in log messages.
+
+    """
+
+    def __init__(self, filterer, processes=None, batch_size=20, max_delay=0.5,
+                 maxsize=1000, drop_policy='newest', name='classifier'):
+        # pylint: disable=too-many-arguments
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError('unknown drop policy {!r}'.format(drop_policy))
+        self.filterer = filterer
+        self.processes = processes
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.maxsize = maxsize
+        self.drop_policy = drop_policy
+        self.name = name
+        self._batch = []
+        self._batch_started = None
+        self._waiting = 0
+        self._counts = dict(submitted=0, dropped=0, processed=0, errors=0)
+        self._lock = Lock()
+        self._space = Condition(self._lock)
+        self._pending = Queue()
+        self._pool = None
+        self._collector = Thread(target=self._collect, name='collector',
+                                 daemon=True)
+
+    def start(self):
+        """Start the worker processes and the result collector.
+
+        The pronunciation index is loaded first, so the workers inherit
+        it rather than a lock held by another thread loading it.
+
+        """
+        get_pronunciations()
+        self._pool = Pool(self.processes, _initialise_worker, (self.filterer,))
+        self._collector.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Classify any waiting phrases and stop the workers."""
+        self.flush()
+        self._pending.put(_STOP)
+        self._collector.join(timeout)
+        self._pool.close()
+        self._pool.join()
+
+    def submit(self, phrase, callback, *args):
+        """Queue a phrase for classification.
+
+        Arguments:
+          phrase (:py:class:`str` or :py:class:`list`): The phrase (or
+            words) to classify.
+          callback (:py:class:`callable`): Called with whether the
+            phrase matched, followed by ``args``.
+          *args (:py:class:`tuple`): Additional arguments for the
+            callback.
+
+        Returns:
+          :py:class:`bool`: Whether the phrase was queued (``False`` if
+            it was dropped because too many were waiting).
+
+        """
+        with self._space:
+            self._counts['submitted'] += 1
+            if self._full():
+                if self.drop_policy == 'block':
+                    self._space.wait_for(lambda: not self._full())
+                elif self.drop_policy == 'oldest' and self._batch:
+                    self._batch.pop(0)
+                    self._waiting -= 1
+                    self._dropped()
+                else:
+                    self._dropped()
+                    return False
+            if not self._batch:
+                self._batch_started = monotonic()
+            self._batch.append((phrase, callback, args))
+            self._waiting += 1
+            full = len(self._batch) >= self.batch_size
+        if full or self._batch_expired():
+            self.flush()
+        return True
+
+    def flush(self):
+        """Send the waiting phrases to the pool now."""
+        with self._lock:
+            batch, self._batch = self._batch, []
+            if batch:
+                result = self._pool.apply_async(
+                    _classify_batch,
+                    ([phrase for phrase, _, _ in batch],
+                     _schemes(self.filterer)),
+                )
+                self._pending.put((batch, result))
+
+    def stats(self):
+        """The classifier's metrics.
+
+        Returns:
+          :py:class:`dict`: The number of phrases waiting for their
+            results and the most allowed, and the number submitted,
+            dropped, classified and failed.
+
+        """
+        with self._lock:
+            return dict(depth=self._waiting, maxsize=self.maxsize,
+                        **self._counts)
+
+    def _full(self):
+        """Whether the most phrases are waiting; the lock must be held."""
+        return 0 < self.maxsize <= self._waiting
+
+    def _dropped(self):
+        """Record a dropped phrase; the lock must be held."""
+        self._counts['dropped'] += 1
+        logger.debug('%s queue full, %s phrases dropped', self.name,
+                     self._counts['dropped'])
+
+    def _batch_expired(self):
+        """Whether the current batch has waited for too long."""
+        with self._lock:
+            return (bool(self._batch)
+                    and monotonic() - self._batch_started >= self.max_delay)
+
+    def _collect(self):
+        """Pass results to their callbacks, in order."""
+        while True:
+            try:
+                item = self._pending.get(timeout=self.max_delay)
+            except Empty:
+                if self._batch_expired():
+                    self.flush()
+                continue
+            if item is _STOP:
+                return
+            batch, result = item
+            try:
+                matches, metrics = result.get()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('failed to classify %s phrases', len(batch))
+                self._finished(batch, failed=True)
+                continue
+            self._finished(batch)
+            _merge_metrics(self.filterer, metrics)
+            for (_, callback, args), matched in zip(batch, matches):
+                try:
+                    callback(matched, *args)
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception('classification callback failed')
+
+    def _finished(self, batch, failed=False):
+        """Make space for more phrases once a batch's results are in."""
+        with self._space:
+            self._waiting -= len(batch)
+            self._counts['processed'] += len(batch)
+            self._counts['errors'] += len(batch) if failed else 0
+            self._space.notify_all()
+
+
+def remember(recent, key, maxsize):
+    """Add a key to a bounded set of the most recently seen keys.
+
+    Arguments:
+      recent (:py:class:`collections.OrderedDict`): The recent keys,
+        least recently seen first.
+      key (:py:class:`object`): The key to add.
+      maxsize (:py:class:`int`): The most keys to remember.
+
+    Returns:
+      :py:class:`bool`: Whether the key was new.
+
+    """
+    if key in recent:
+        recent.move_to_end(key)
+        return False
+    recent[key] = None
+    if len(recent) > maxsize:
+        recent.popitem(last=False)
+    return True
+
+
+def retry_delay(status_code, attempt, backoff, max_backoff):
+    """How long to wait before retrying a failed API call.
+
+    Connection errors, rate limiting (429) and server errors (5xx) are
+    transient, so are retried after an exponential backoff with full
+    jitter; anything else is not worth retrying.
+
+    Arguments:
+      status_code (:py:class:`int`): The HTTP status code of the
+        response (``None`` if there wasn't one).
+      attempt (:py:class:`int`): The number of retries so far.
+      backoff (:py:class:`float`): The maximum delay before the first
+        retry, in seconds.
+      max_backoff (:py:class:`float`): The longest delay, in seconds.
+
+    Returns:
+      :py:class:`float`: The delay in seconds (or ``None`` if the call
+        shouldn't be retried).
+
+    """
+    if status_code not in (None, 429) and status_code < 500:
+        return None
+    return random.uniform(0, min(backoff * 2 ** attempt, max_backoff))
+
+
+def is_transient(exc):
+    """Whether an error without a response is worth retrying after.
+
+    Tweepy wraps the errors from :py:mod:`requests`, so the error and
+    the errors it was raised from are all checked.
+
+    Arguments:
+      exc (:py:class:`Exception`): The error.
+
+    Returns:
+      :py:class:`bool`: Whether it, or an error it was raised from, is
+        one of the :py:data:`TRANSIENT_ERRORS`.
+
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        if isinstance(exc, TRANSIENT_ERRORS):
+            return True
+        seen.add(id(exc))
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def _status_code(exc):
+    """The HTTP status code of a failed API call, if there was one."""
+    response = getattr(exc, 'response', None)
+    return getattr(response, 'status_code', None)
+
+
+def _initialise_worker(filterer):
+    """Load the pronunciations and store the filterer for this worker.
+
+    New estimates are sent back with the results rather than written
+    by each worker, so only the parent process writes the file.
+
+    """
+    global _FILTERER  # pylint: disable=global-statement
+    get_pronunciations()
+    if classify.ESTIMATOR is not None:
+        classify.ESTIMATOR.defer_saving()
+    _FILTERER = filterer
+
+
+def _schemes(filterer):
+    """The filterer's generation and definitions, if it has them."""
+    generation = getattr(filterer, 'generation', None)
+    if generation is None:
+        return None
+    # read after the generation, so they're never older than it
+    return generation, filterer.definitions
+
+
+def _classify_batch(phrases, schemes=None):
+    """Classify a batch of phrases in a worker process.
+
+    Filterers with a ``match_many`` method (e.g.
+    :py:class:`~eleanorrigbot.classify.PhraseMatcher`) match the whole
+    batch at once, which is faster even for small batches, so each
+    phrase's match time is recorded as the mean for the batch.
+
+    Returns:
+      :py:class:`tuple`: Whether each phrase matched, and the metrics
+        observed while classifying them (see :py:func:`_merge_metrics`).
+
+    """
+    if schemes is not None and schemes[0] != _FILTERER.generation:
+        generation, definitions = schemes
+        _FILTERER.update(definitions, generation)
+    rejections = getattr(_FILTERER, 'rejections', None)
+    before = _snapshot(rejections or {})
+    histograms = [histogram.snapshot() for histogram in _WORKER_HISTOGRAMS]
+    match_many = getattr(_FILTERER, 'match_many', None)
+    if match_many is None:
+        matches = []
+        for phrase in phrases:
+            with MATCH_TIME.time():
+                matches.append(bool(_FILTERER(phrase)))
+    else:
+        start = perf_counter()
+        matches = match_many(phrases)
+        mean = (perf_counter() - start) / len(phrases)
+        for _ in phrases:
+            MATCH_TIME.observe(mean)
+    added = Counter(_snapshot(rejections or {}))
+    added.subtract(before)
+    estimator = classify.ESTIMATOR
+    unsaved = estimator.take_unsaved() if estimator is not None else []
+    return matches, (+added, unsaved, [
+        ([new - old for new, old in zip(counts, previous_counts)],
+         total - previous_total)
+        for (counts, total), (previous_counts, previous_total) in zip(
+            (histogram.snapshot() for histogram in _WORKER_HISTOGRAMS),
+            histograms,
+        )
+    ])
+
+
+def _merge_metrics(filterer, metrics):
+    """Add the metrics a worker observed to this process's.
+
+    Arguments:
+      filterer (:py:class:`callable`): The filterer, whose
+        ``rejections`` (if any) the rejection counts are added to.
+      metrics (:py:class:`tuple`): The rejection counts added by the
+        worker, the ``(word, estimate)`` pairs it estimated (which are
+        saved by this process's estimator) and the bucket counts and
+        sum added to each of the :py:data:`_WORKER_HISTOGRAMS`.
+
+    """
+    rejections, unsaved, histograms = metrics
+    if rejections and getattr(filterer, 'rejections', None) is not None:
+        filterer.rejections.update(rejections)
+    if unsaved and classify.ESTIMATOR is not None:
+        for word, estimate in unsaved:
+            classify.ESTIMATOR.save(word, estimate)
+    for histogram, (counts, total) in zip(_WORKER_HISTOGRAMS, histograms):
+        histogram.merge(counts, total)
@@ -0,0 +1,453 @@
+"""Estimated pronunciations for words that aren't in the dictionary.
+
+Slang, names and typos would otherwise reject a phrase at the
+``'unknown'`` stage, however well the rest of it fits. The syllables of
+an unknown word are counted from its vowel groups, then an estimate
+borrows from its neighbours, the dictionary words sharing the longest
+ending with it: their most common rhyme key and the usual error in
+counting their syllables the same way.
+
+Each estimate is flagged as confident or not, depending on how much of
+the word the neighbours explain and how well they agree, so that the
+matchers can choose which estimates to trust. Estimates can be kept in
+a file, which grows as new words are seen and is read back on start.
+
+"""
+from array import array
+from collections import Counter
+from itertools import count
+import logging
+import re
+from threading import Lock
+
+from .cache import BoundedCache
+from .pronunciations import StringTable
+
+logger = logging.getLogger(__name__)
+
+ESTIMABLE = re.compile(r"[a-z]+(?:'[a-z]+)?")
+"""The words that can be estimated (lower case letters only)."""
+
+VOWEL_GROUPS = re.compile(r'[aeiouy]+')
+
+MIN_ENDING = 3
+"""The shortest shared ending for an estimate to count as confident."""
+
+MIN_NEIGHBOURS = 3
+"""The fewest neighbours that must agree for a confident estimate."""
+
+MIN_AGREEMENT = 0.8
+"""The share of neighbours that must agree for a confident estimate."""
+
+MAX_NEIGHBOURS = 500
+"""The most neighbours consulted for each estimate."""
+
+
+class Estimate(tuple):
+    """The estimated ``(syllables, rhyme_key)`` pronunciations of a word.
+
+    Behaves like the pronunciations from the dictionary, so can be used
+    wherever they are, but also records whether it's ``confident``.
+
+    """
+
+    def __new__(cls, pronunciations, confident):
+        estimate = super().__new__(cls, pronunciations)
+        estimate.confident = confident
+        return estimate
+
+    def __getnewargs__(self):
+        return tuple(self), self.confident
+
+    def __repr__(self):
+        return '{}({}, confident={!r})'.format(
+            type(self).__name__,
+            super().__repr__(),
+            self.confident,
+        )
+
+
+def count_syllables(word):
+    """Estimate the number of syllables in a word from its spelling.
+
+    Each group of vowels is a syllable, except for a silent ``e`` at
+    the end of the word (or before a final ``d`` or ``s``).
+
+    Arguments:
+      word (:py:class:`str`): The word, in lower case.
+
+    Returns:
+      :py:class:`int`: The estimated syllable count.
+
+    """
+    word = word.replace("'", '')
+    syllables = len(VOWEL_GROUPS.findall(word))
+    if syllables > 1 and _silent_ending(word):
+        syllables -= 1
+    return syllables
+
+
+def _silent_ending(word):
+    """Whether the word ends in a silent ``e`` (or ``ed`` or ``es``)."""
+    if word.endswith('e'):
+        return not word.endswith(('le', 'ee', 'ie'))
+    if word.endswith('ed'):
+        return not word.endswith(('ted', 'ded'))
+    if word.endswith('es'):
+        return not word.endswith(
+            ('ses', 'zes', 'ces', 'ges', 'ches', 'shes', 'xes'),
+        )
+    return False
+
+
+class EndingIndex:  # pylint: disable=too-few-public-methods
+    """Find the dictionary words ending the same way as another word.
+
+    The words are held reversed and sorted (in a
+    :py:class:`~eleanorrigbot.pronunciations.StringTable`), so the
+    words sharing an ending are adjacent and can be found by binary
+    search.
+
+    Arguments:
+      index (:py:class:`~eleanorrigbot.pronunciations.PronunciationIndex`):
+        The dictionary.
+
+    """
+
+    def __init__(self, index):
+        words = index.words
+        order = sorted(range(len(words)),
+                       key=lambda position: words[position][::-1].encode())
+        self.reversed_words = StringTable.from_strings(
+            words[position][::-1] for position in order
+        )
+        self.order = array('I', order)
+
+    def neighbours(self, word, minimum=1):
+        """The dictionary words sharing the longest ending with the word.
+
+        Arguments:
+          word (:py:class:`str`): The word.
+          minimum (:py:class:`int`, optional): The fewest neighbours to
+            find; the ending is shortened until there are enough (or it
+            would be empty).
+
+        Returns:
+          :py:class:`tuple`: The length of the shared ending and the
+            indices of the neighbours in the dictionary (excluding the
+            word itself).
+
+        """
+        reverse = word[::-1]
+        table = self.reversed_words
+        position = table.bisect(reverse)
+        length = 0
+        for candidate in (position - 1, position, position + 1):
+            if 0 <= candidate < len(table) and table[candidate] != reverse:
+                length = max(length, _common_prefix(reverse, table[candidate]))
+        while length:
+            ending = reverse[:length]
+            start = table.bisect(ending)
+            end = table.bisect(ending + '\U0010ffff')
+            neighbours = [self.order[index] for index in range(start, end)
+                          if table[index] != reverse]
+            if len(neighbours) >= minimum or length == 1:
+                return length, neighbours
+            length -= 1
+        return 0, []
+
+
+class Estimator:  # pylint: disable=too-many-instance-attributes
+    """Estimate (and remember) the pronunciations of unknown words.
+
+    Words with no neighbours get a negative rhyme key of their own, so
+    they don't rhyme with anything.
+
+    Arguments:
+      load (:py:class:`callable`): Returns the
+        :py:class:`~eleanorrigbot.pronunciations.PronunciationIndex`;
+        only called when the first word is estimated.
+      path (:py:class:`str`, optional): The file to keep estimates in
+        (defaults to keeping them in memory only).
+      maxsize (:py:class:`int`, optional): The most estimates to keep
+        in memory, besides those read from the file.
+
+    Attributes:
+      estimated (:py:class:`int`): The number of words estimated since
+        the estimator was created (rather than read from the file),
+        including those passed to :py:meth:`save`.
+
+    """
+
+    def __init__(self, load, path=None, maxsize=4096):
+        self.load = load
+        self.path = path
+        self.estimated = 0
+        self._lock = Lock()
+        self._index = None
+        self._endings = None
+        self._unrhymed = count(-1, -1)
+        self._file = None
+        self._unsaved = None
+        self._saved = read_estimates(path) if path is not None else {}
+        self._estimates = BoundedCache(self._lookup, maxsize)
+
+    def __call__(self, word):
+        """The estimated pronunciations of the word.
+
+        Arguments:
+          word (:py:class:`str`): The word, which shouldn't be in the
+            dictionary.
+
+        Returns:
+          :py:class:`Estimate`: The estimate (empty if the word can't
+            be estimated, e.g. it isn't made of letters).
+
+        """
+        if not ESTIMABLE.fullmatch(word):
+            return ()
+        return self._estimates(word)
+
+    def __len__(self):
+        return len(self._saved) + self.estimated
+
+    def close(self):
+        """Close the estimates file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def remember(self, word, pronunciations, confident):
+        """Use a saved estimate for the word, rather than estimating it.
+
+        Arguments:
+          word (:py:class:`str`): The word.
+          pronunciations (:py:class:`tuple`): The ``(syllables,
+            rhyming_part)`` pronunciations (with an empty rhyming part
+            for words that rhyme with nothing).
+          confident (:py:class:`bool`): Whether the estimate is
+            confident.
+
+        """
+        with self._lock:
+            self._saved[word] = tuple(pronunciations), confident
+
+    def defer_saving(self):
+        """Hold new estimates for :py:meth:`take_unsaved` instead.
+
+        For worker processes, so that only the parent process writes to
+        the file (see :py:meth:`save`).
+
+        """
+        with self._lock:
+            if self._unsaved is None:
+                self._unsaved = []
+        return self
+
+    def take_unsaved(self):
+        """The ``(word, estimate)`` pairs held since this was last called.
+
+        Returns:
+          :py:class:`list`: The new estimates (empty unless
+            :py:meth:`defer_saving` was called).
+
+        """
+        with self._lock:
+            unsaved = self._unsaved
+            if unsaved:
+                self._unsaved = []
+        return unsaved or []
+
+    def save(self, word, estimate):
+        """Write an estimate made elsewhere (e.g. by a worker) to the file.
+
+        Arguments:
+          word (:py:class:`str`): The word.
+          estimate (:py:class:`Estimate`): Its estimate, with rhyme keys
+            from the same pronunciation index.
+
+        """
+        with self._lock:
+            self._get_index()
+            self.estimated += 1
+            self._save(word, estimate)
+
+    def stats(self):
+        """The number of words known and the number newly estimated."""
+        return dict(words=len(self), estimated=self.estimated)
+
+    def estimate(self, word):
+        """Estimate the pronunciations of the word, without caching.
+
+        Arguments:
+          word (:py:class:`str`): The word.
+
+        Returns:
+          :py:class:`Estimate`: The estimate.
+
+        """
+        self._get_index()
+        syllables = count_syllables(word)
+        if not syllables:
+            return Estimate((), False)
+        length, neighbours = self._endings.neighbours(word, MIN_NEIGHBOURS)
+        if not neighbours:
+            return Estimate(((syllables, next(self._unrhymed)),), False)
+        keys, corrections = self._poll(neighbours)
+        (key, agreeing), = keys.most_common(1)
+        (correction, _), = corrections.most_common(1)
+        by_analogy = syllables + correction
+        confident = (
+            length >= MIN_ENDING
+            and agreeing >= MIN_NEIGHBOURS
+            and agreeing >= MIN_AGREEMENT * sum(keys.values())
+            and by_analogy == syllables
+        )
+        counts = sorted({syllables, by_analogy} - {0}) or [syllables]
+        return Estimate(tuple((total, key) for total in counts), confident)
+
+    def _poll(self, neighbours):
+        """Count the neighbours' rhyme keys and syllable count errors.
+
+        Up to :py:data:`MAX_NEIGHBOURS` of them are sampled, evenly.
+
+        """
+        index = self._index
+        keys, corrections = Counter(), Counter()
+        step = max(len(neighbours) // MAX_NEIGHBOURS, 1)
+        for position in neighbours[::step]:
+            start = index.offsets[position]
+            keys[index.rhyme_keys[start]] += 1
+            corrections[index.syllable_counts[start]
+                        - count_syllables(index.words[position])] += 1
+        return keys, corrections
+
+    def _lookup(self, word):
+        """Find a saved estimate or make a new one.
+
+        Estimates read from the file are kept, so aren't made again;
+        new ones are only kept in the (bounded) cache, so one dropped
+        from it is estimated and written again, and
+        :py:func:`read_estimates` keeps the last line for each word.
+
+        """
+        with self._lock:
+            saved = self._saved.get(word)
+            if saved is not None:
+                return self._from_saved(*saved)
+            estimate = self.estimate(word)
+            self.estimated += 1
+            if self._unsaved is not None:
+                self._unsaved.append((word, estimate))
+            else:
+                self._save(word, estimate)
+        return estimate
+
+    def _get_index(self):
+        if self._index is None:
+            self._index = self.load()
+            self._endings = EndingIndex(self._index)
+        return self._index
+
+    def _from_saved(self, pronunciations, confident):
+        index = self._get_index()
+        estimate = []
+        for syllables, part in pronunciations:
+            key = index.rhyme_key_for(part)
+            estimate.append((syllables,
+                             next(self._unrhymed) if key is None else key))
+        return Estimate(tuple(estimate), confident)
+
+    def _save(self, word, estimate):
+        if self.path is None:
+            return
+        line = '\t'.join([word, str(int(estimate.confident))]
+                         + format_pronunciations(estimate, self._index))
+        try:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line + '\n')
+            self._file.flush()
+        except OSError as exc:
+            logger.warning('could not save estimate of %r: %s', word, exc)
+
+
+def format_pronunciations(pronunciations, index):
+    """Describe pronunciations without the index's rhyme keys.
+
+    Arguments:
+      pronunciations (:py:class:`tuple`): The ``(syllables, rhyme_key)``
+        pronunciations.
+      index (:py:class:`~eleanorrigbot.pronunciations.PronunciationIndex`):
+        The index the rhyme keys are from.
+
+    Returns:
+      :py:class:`list`: The pronunciations as ``syllables:rhyming part``
+        strings (with an empty rhyming part for negative keys).
+
+    """
+    return ['{}:{}'.format(syllables,
+                           index.rhyming_parts[key] if key >= 0 else '')
+            for syllables, key in pronunciations]
+
+
+def parse_pronunciations(fields):
+    """Parse the strings made by :py:func:`format_pronunciations`.
+
+    Returns:
+      :py:class:`tuple`: The ``(syllables, rhyming_part)`` pairs.
+
+    Raises:
+      :py:class:`ValueError`: If a string is invalid.
+
+    """
+    return tuple((int(syllables), part) for syllables, part in (
+        field.split(':', 1) for field in fields
+    ))
+
+
+def read_estimates(path):
+    """Read the estimates saved in a file.
+
+    Each line holds the word, whether the estimate is confident (``1``
+    or ``0``) and its pronunciations as ``syllables:rhyming part``,
+    separated by tabs. Invalid lines are skipped.
+
+    Arguments:
+      path (:py:class:`str`): The file to read (which needn't exist).
+
+    Returns:
+      :py:class:`dict`: The map of words to their pronunciations (with
+        rhyming parts rather than keys) and confidence.
+
+    """
+    estimates = {}
+    try:
+        with open(path, encoding='utf-8') as estimates_file:
+            for number, line in enumerate(estimates_file, start=1):
+                try:
+                    word, confident, *pronunciations = (
+                        line.rstrip('\n').split('\t')
+                    )
+                    estimates[word] = (
+                        parse_pronunciations(pronunciations),
+                        confident == '1',
+                    )
+                except ValueError:
+                    logger.warning('skipping invalid estimate at %s:%s',
+                                   path, number)
+    except FileNotFoundError:
+        pass
+    logger.info('read %s estimates from %s', len(estimates), path)
+    return estimates
+
+
+def _common_prefix(first, second):
+    """The length of the common prefix of two strings."""
+    length = 0
+    for left, right in zip(first, second):
+        if left != right:
+            break
+        length += 1
+    return length
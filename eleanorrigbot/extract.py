@@ -5,6 +5,8 @@ VALID_PUNCTUATION = r'.,;:?!\''
 
 CLEAN_TEXT = re.compile(r'(?:^|\s)[a-z{}\s]+(?:$|\s)'.format(VALID_PUNCTUATION))
 
+WORD = re.compile(r'[{0}]*([a-z](?:\S*[a-z])?)[{0}]*'.format(VALID_PUNCTUATION))
+
 
 def extract_phrase(text):
     """Extract the text of the tweet for phrase testing.
@@ -13,17 +15,42 @@ def extract_phrase(text):
     clean text, with any punctuation between the words removed.
 
     """
-    return _rejoin(_clean_text(text.lower()))
+    return ' '.join(extract_words(text))
 
 
-def _clean_text(text):
-    """Find the longest substring of 'clean' characters in the text."""
-    clean_strings = CLEAN_TEXT.findall(text)
-    if clean_strings:
-        return max(clean_strings, key=len)
-    return ''
+def extract_words(text):
+    """Extract the words of the tweet for phrase testing.
+
+    As :py:func:`extract_phrase`, but returns the list of words found
+    in a single pass over the longest clean substring, without building
+    any intermediate strings.
+
+    """
+    text = text.lower()
+    start, end = _clean_span(text)
+    return WORD.findall(text, start, end)
+
 
+def iter_words(text):
+    """Extract the words of the tweet lazily, one at a time.
 
-def _rejoin(phrase):
-    """Rejoin phrase with any punctuation stripped."""
-    return ' '.join([word.strip(VALID_PUNCTUATION) for word in phrase.split()])
+    As :py:func:`extract_words`, but a generator, so a consumer that
+    rejects the phrase part-way through (e.g.
+    :py:meth:`~eleanorrigbot.classify.PhraseMatcher.match_stream`)
+    doesn't pay for the rest of the words.
+
+    """
+    text = text.lower()
+    start, end = _clean_span(text)
+    for match in WORD.finditer(text, start, end):
+        yield match.group(1)
+
+
+def _clean_span(text):
+    """Find the longest substring of 'clean' characters in the text."""
+    best_start = best_end = 0
+    for match in CLEAN_TEXT.finditer(text):
+        start, end = match.span()
+        if end - start > best_end - best_start:
+            best_start, best_end = start, end
+    return best_start, best_end
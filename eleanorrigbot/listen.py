@@ -1,11 +1,31 @@
 """Functionality for listening to the Twitter stream."""
+from collections import Counter
 import logging
-from time import sleep
+from threading import Lock
+import warnings
 
 from tweepy import StreamListener
 
+from .metrics import REGISTRY
+from .reconnect import ReconnectScheduler
+
 logger = logging.getLogger(__name__)
 
+RECEIVE_TIME = REGISTRY.histogram(
+    'rigbot_receive_seconds',
+    'Time the stream thread spends handling each status',
+)
+
+EXTRACT_TIME = REGISTRY.histogram(
+    'rigbot_extract_seconds',
+    'Time spent extracting the phrase from each status',
+)
+
+MATCH_TIME = REGISTRY.histogram(
+    'rigbot_match_seconds',
+    'Time spent classifying each extracted phrase',
+)
+
 
 def _match_all(_):
     return True
@@ -15,47 +35,271 @@ def _all_text(text):
     return text
 
 
-class RetweetListener(StreamListener):
-    """Listens to the Twitter stream and retweets matching statuses."""
+def status_text(status):
+    """The full text of the status, even if it's an extended tweet."""
+    try:
+        return status.extended_tweet['full_text']
+    except (AttributeError, KeyError):
+        return status.text
+
+
+def bounding_boxes(locations):
+    """Normalise a bounding box, or a list of them, to a list of them."""
+    if locations and isinstance(locations[0], (int, float)):
+        return [list(locations)]
+    return [list(box) for box in locations]
+
+
+def location_name(box):
+    """A name for the bounding box, for logging and counters."""
+    return ','.join(format(coordinate, 'g') for coordinate in box)
+
+
+class LocationCounts:
+    """Count statuses and matches by the location they came from.
+
+    A stream filtered by several bounding boxes doesn't say which one
+    each status matched, so they're located the same way as Twitter
+    does: by the status's coordinates if it has them, otherwise by
+    whether its place overlaps the box. A status can be counted in more
+    than one location, or in none (Twitter's matching is fuzzier).
+
+    Arguments:
+      locations (:py:class:`list`): The bounding box, or a list of
+        them.
+
+    """
+
+    def __init__(self, locations):
+        self.boxes = bounding_boxes(locations)
+        self.names = [location_name(box) for box in self.boxes]
+        self._counts = {
+            name: Counter(statuses=0, matches=0) for name in self.names
+        }
+        self._lock = Lock()
+
+    def locate(self, status):
+        """The names of the locations the status is from.
+
+        Arguments:
+          status (:py:class:`tweepy.Status`): The status.
+
+        Returns:
+          :py:class:`tuple`: The names of the matching locations.
+
+        """
+        point = _point(status)
+        if point is not None:
+            west = east = point[0]
+            south = north = point[1]
+        else:
+            corners = _place_corners(status)
+            if not corners:
+                return ()
+            west = min(lon for lon, _ in corners)
+            east = max(lon for lon, _ in corners)
+            south = min(lat for _, lat in corners)
+            north = max(lat for _, lat in corners)
+        return tuple(
+            name for name, (sw_lon, sw_lat, ne_lon, ne_lat)
+            in zip(self.names, self.boxes)
+            if west <= ne_lon and east >= sw_lon
+            and south <= ne_lat and north >= sw_lat
+        )
+
+    def count(self, names, key):
+        """Count a status (or a match) in each of the locations."""
+        with self._lock:
+            for name in names:
+                self._counts[name][key] += 1
+
+    def stats(self, name):
+        """The number of statuses received and matched in a location."""
+        with self._lock:
+            return dict(self._counts[name])
+
+
+def _point(status):
+    """The ``(longitude, latitude)`` of the status, if it has them."""
+    coordinates = getattr(status, 'coordinates', None)
+    if isinstance(coordinates, dict):
+        point = coordinates.get('coordinates')
+        if isinstance(point, list) and len(point) == 2:
+            return point
+    return None
+
+
+def _place_corners(status):
+    """The corners of the status's place's bounding box, if it has one."""
+    bounding_box = getattr(getattr(status, 'place', None), 'bounding_box', None)
+    polygon = getattr(bounding_box, 'coordinates', None)
+    if isinstance(polygon, list) and polygon and isinstance(polygon[0], list):
+        return [corner for corner in polygon[0]
+                if isinstance(corner, list) and len(corner) == 2]
+    return []
+
+
+def count_locations(locations, location=None):
+    """The counts for the locations a stream will listen to.
 
-    def __init__(self, api=None, extractor=_all_text, filterer=_match_all):
+    Arguments:
+      locations (:py:class:`list`): The bounding box, or a list of
+        them.
+      location (:py:class:`list`, optional): Deprecated alias for
+        ``locations``, from when a stream listened to a single box.
+
+    Returns:
+      :py:class:`LocationCounts`: The counts.
+
+    Raises:
+      :py:class:`TypeError`: If neither argument is given.
+
+    """
+    if location is not None:
+        warnings.warn(
+            'location is deprecated, use locations instead',
+            DeprecationWarning,
+            stacklevel=3,
+        )
+        if locations is None:
+            locations = location
+    if locations is None:
+        raise TypeError('no locations given to listen to')
+    return LocationCounts(locations)
+
+
+class RetweetListener(StreamListener):  # pylint: disable=too-many-instance-attributes
+    """Listens to the Twitter stream and retweets matching statuses.
+
+    By default statuses are classified and retweeted on the stream's
+    own thread. Supply :py:class:`~eleanorrigbot.dispatch.WorkerPool`
+    instances as ``classifiers`` and/or ``retweeter`` to do that work
+    in the background, so that reading the stream never waits on it.
+
+    Errors disconnect the stream rather than sleeping in the callback;
+    the ``reconnects`` scheduler records when it's safe to reconnect.
+
+    If the stream is filtered by several bounding boxes, supply
+    :py:class:`LocationCounts` for them as ``locations`` to count the
+    statuses and matches in each.
+
+    """
+
+    def __init__(self, api=None, extractor=_all_text, filterer=_match_all,
+                 classifiers=None, retweeter=None, reconnects=None,
+                 name='stream', locations=None):
+        # pylint: disable=too-many-arguments
         super().__init__(api)
         self.extractor = extractor
         self.filterer = filterer
-        self.timeout = 1
+        self.classifiers = classifiers
+        self.retweeter = retweeter
+        self.reconnects = reconnects or ReconnectScheduler()
+        self.name = name
+        self.locations = locations
+        self._counts = Counter(statuses=0, matches=0)
+        self._lock = Lock()
+
+    def stats(self):
+        """The stream's metrics.
+
+        Returns:
+          :py:class:`dict`: The number of statuses received and matched,
+            plus the reconnection metrics.
+
+        """
+        with self._lock:
+            counts = dict(self._counts)
+        return dict(counts, **self.reconnects.stats())
 
     def on_connect(self):
         """Called when a connection is made."""
-        self.timeout = 1
+        self.reconnects.connected()
         return super().on_connect()
 
     def on_status(self, status):
         """Called when a new status is streamed."""
-        text = self._get_text(status)
-        logger.debug(
-            'received %r from @%s: %r',
-            status.id,
-            status.author.screen_name,
-            text,
-        )
-        if self.filterer(self.extractor(text)):
-            logger.info('retweeting %r %r', status.id, text)
-            self.api.retweet(status.id)
-        return super().on_status(status)
+        with RECEIVE_TIME.time():
+            self._count('statuses')
+            text = status_text(status)
+            logger.debug(
+                'received %r from @%s: %r',
+                status.id,
+                status.author.screen_name,
+                text,
+            )
+            names = ()
+            if self.locations is not None:
+                names = self.locations.locate(status)
+                self.locations.count(names, 'statuses')
+            if self.classifiers is None:
+                self.classify(status.id, text, names)
+            else:
+                self.classifiers.submit(self.classify, status.id, text, names)
+            return super().on_status(status)
+
+    def classify(self, status_id, text, locations=()):
+        """Retweet the status if its text passes the filter."""
+        with EXTRACT_TIME.time():
+            phrase = self.extractor(text)
+        with MATCH_TIME.time():
+            matched = self.filterer(phrase)
+        if matched:
+            self.retweet(status_id, text, locations)
+
+    def retweet(self, status_id, text, locations=()):
+        """Retweet the status, from the named locations."""
+        self._count('matches')
+        if self.locations is not None:
+            self.locations.count(locations, 'matches')
+        logger.info('%s retweeting %r %r', self.name, status_id, text)
+        if self.retweeter is None:
+            self.api.retweet(status_id)
+        else:
+            self.retweeter.submit(self.api.retweet, status_id)
 
     def on_error(self, status_code):
         """Called when an error occurs."""
-        logger.error('streaming error %s', status_code)
-        if status_code == 420:
-            timeout = self.timeout * 60
-            logger.info('timing out for %s seconds', timeout)
-            sleep(self.timeout * 60)
-            self.timeout *= 2  # exponential back-off
+        logger.error('%s streaming error %s', self.name, status_code)
+        delay = self.reconnects.failed(status_code)
+        logger.info('reconnecting in %.1f seconds', delay)
         return super().on_error(status_code)
 
-    @staticmethod
-    def _get_text(status):
-        try:
-            return status.extended_tweet['full_text']
-        except (AttributeError, KeyError):
-            return status.text
+    def _count(self, key):
+        with self._lock:
+            self._counts[key] += 1
+
+
+class BatchRetweetListener(RetweetListener):
+    """Listens to the Twitter stream, classifying statuses in batches.
+
+    Extracted phrases are handed to a
+    :py:class:`~eleanorrigbot.dispatch.ProcessClassifier`, which
+    reports back, in order, whether each status should be retweeted.
+
+    """
+
+    def __init__(self, api=None, extractor=_all_text, classifier=None,
+                 retweeter=None, reconnects=None, name='stream',
+                 locations=None):
+        # pylint: disable=too-many-arguments
+        super().__init__(api, extractor, retweeter=retweeter,
+                         reconnects=reconnects, name=name,
+                         locations=locations)
+        self.classifier = classifier
+
+    def classify(self, status_id, text, locations=()):
+        """Queue the status's phrase for classification."""
+        with EXTRACT_TIME.time():
+            phrase = self.extractor(text)
+        self.classifier.submit(
+            phrase,
+            self._classified,
+            status_id,
+            text,
+            locations,
+        )
+
+    def _classified(self, matched, status_id, text, locations=()):
+        if matched:
+            self.retweet(status_id, text, locations)
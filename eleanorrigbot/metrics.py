@@ -0,0 +1,393 @@
+"""Low-overhead counters and latency histograms for the pipeline.
+
+The metrics are kept in memory and rendered in the `Prometheus text
+format`_ on demand, e.g. by the HTTP endpoint started by :py:func:`serve`.
+
+.. _Prometheus text format:
+  https://prometheus.io/docs/instrumenting/exposition_formats/
+
+"""
+from bisect import bisect_left
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+from threading import Lock, Thread
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+"""Histogram bucket bounds in seconds, from 10µs (a cached match) up."""
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Counter:
+    """A count that only goes up.
+
+    Arguments:
+      name (:py:class:`str`): The metric name.
+      help_ (:py:class:`str`): The description of the metric.
+
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name, help_):
+        self.name = name
+        self.help = help_
+        self.value = 0
+        self._lock = Lock()
+
+    def inc(self, amount=1):
+        """Increase the count."""
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        """The ``(suffix, labels, value)`` samples of the metric."""
+        return [('', {}, self.value)]
+
+
+class Histogram:
+    """The distribution of observed values (e.g. latencies).
+
+    Arguments:
+      name (:py:class:`str`): The metric name.
+      help_ (:py:class:`str`): The description of the metric.
+      buckets (:py:class:`tuple`, optional): The upper bounds of the
+        buckets, in ascending order.
+
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self._lock = Lock()
+
+    def observe(self, value):
+        """Record a value."""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        """A context manager observing the time its block takes."""
+        return _Timer(self)
+
+    def snapshot(self):
+        """A copy of the bucket counts and the sum of the values."""
+        with self._lock:
+            return list(self.counts), self.sum
+
+    def merge(self, counts, total):
+        """Add values observed elsewhere (e.g. in another process).
+
+        Arguments:
+          counts (:py:class:`list`): The number of values in each
+            bucket (which must be the same as this histogram's).
+          total (:py:class:`float`): The sum of the values.
+
+        """
+        with self._lock:
+            for index, count in enumerate(counts):
+                self.counts[index] += count
+            self.sum += total
+
+    def samples(self):
+        """The ``(suffix, labels, value)`` samples of the metric."""
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        samples, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            samples.append(('_bucket', dict(le=_format(bound)), cumulative))
+        samples.append(('_sum', {}, total))
+        samples.append(('_count', {}, cumulative))
+        return samples
+
+
+class _Timer:  # pylint: disable=too-few-public-methods
+    """Observe the duration of a ``with`` block in a histogram."""
+
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = None
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.histogram.observe(perf_counter() - self.start)
+
+
+class StatsCollector:
+    """Expose the numbers from ``stats()`` methods as metrics.
+
+    Each numeric value in the dictionaries becomes a metric named with
+    the prefix, labelled with the name of its source (if there's a
+    label); booleans are exposed as ``0`` or ``1``.
+
+    Arguments:
+      prefix (:py:class:`str`): The start of the metric names.
+      counters (:py:class:`tuple`, optional): The keys whose values
+        only go up; the others are exposed as gauges.
+      label (:py:class:`str`, optional): The label naming each source.
+
+    """
+
+    def __init__(self, prefix, counters=(), label=None):
+        self.prefix = prefix
+        self.counters = frozenset(counters)
+        self.label = label
+        self.sources = []
+
+    def add(self, stats, name=None):
+        """Add a source of metrics.
+
+        Arguments:
+          stats (:py:class:`callable`): Returns the metrics, as a
+            :py:class:`dict`.
+          name (:py:class:`str`, optional): The value of the label for
+            this source.
+
+        """
+        self.sources.append((name, stats))
+        return self
+
+    def __call__(self):
+        metrics = {}
+        for source, stats in self.sources:
+            labels = {} if self.label is None else {self.label: source}
+            for key, value in stats().items():
+                if not isinstance(value, (bool, int, float)):
+                    continue
+                kind = 'counter' if key in self.counters else 'gauge'
+                metric_name = '{}_{}{}'.format(
+                    self.prefix, key, '_total' if kind == 'counter' else '',
+                )
+                metrics.setdefault(metric_name, (kind, []))[1].append(
+                    (labels, float(value)),
+                )
+        return [(name, kind, '', samples)
+                for name, (kind, samples) in metrics.items()]
+
+
+class Registry:
+    """The collection of metrics to expose."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = Lock()
+
+    def counter(self, name, help_):
+        """Get (or create) a :py:class:`Counter`."""
+        return self._get(Counter, name, help_)
+
+    def histogram(self, name, help_, buckets=DEFAULT_BUCKETS):
+        """Get (or create) a :py:class:`Histogram`."""
+        return self._get(Histogram, name, help_, buckets)
+
+    def register(self, collector):
+        """Add a collector of metrics computed when they're rendered.
+
+        Arguments:
+          collector (:py:class:`callable`): Returns a list of ``(name,
+            kind, help, samples)`` metrics, where the samples are
+            ``(labels, value)`` pairs.
+
+        """
+        with self._lock:
+            self._collectors.append(collector)
+        return collector
+
+    def unregister(self, collector):
+        """Remove a collector."""
+        with self._lock:
+            self._collectors.remove(collector)
+
+    def render(self):
+        """The metrics, in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            _header(lines, metric.name, metric.kind, metric.help)
+            for suffix, labels, value in metric.samples():
+                lines.append(_sample(metric.name + suffix, labels, value))
+        for collector in collectors:
+            try:
+                collected = collector()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('metrics collector failed')
+                continue
+            for name, kind, help_, samples in collected:
+                _header(lines, name, kind, help_)
+                for labels, value in samples:
+                    lines.append(_sample(name, labels, value))
+        return ''.join(line + '\n' for line in lines)
+
+    def _get(self, cls, name, *args):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args)
+            elif not isinstance(metric, cls):
+                raise ValueError('{} is already a {}'.format(name, metric.kind))
+            return metric
+
+
+REGISTRY = Registry()
+"""The metrics recorded by the bot."""
+
+
+def register_pipeline(filterer, streams, pools=None, retweeter=None,
+                      registry=REGISTRY):
+    """Collect the metrics of the parts of a running bot.
+
+    Arguments:
+      filterer (:py:class:`callable`): The filterer, whose rejection
+        counts (if any) are exposed by stage.
+      streams (:py:class:`list`): The stream listeners (with a ``name``
+        and ``stats`` method), whose counts are labelled by stream, and
+        by location if they have
+        :py:class:`~eleanorrigbot.listen.LocationCounts`.
+      pools (:py:class:`dict`, optional): The map of names to
+        :py:class:`~eleanorrigbot.dispatch.WorkerPool` (or
+        :py:class:`~eleanorrigbot.dispatch.ProcessClassifier`)
+        instances.
+      retweeter (:py:class:`object`, optional): The retweet dispatcher.
+      registry (:py:class:`Registry`, optional): Where to register the
+        collectors.
+
+    """
+    collector = StatsCollector(
+        'rigbot_stream',
+        counters=('statuses', 'matches', 'disconnections',
+                  'time_disconnected'),
+        label='stream',
+    )
+    for stream in streams:
+        collector.add(stream.stats, stream.name)
+    registry.register(collector)
+    collector = StatsCollector(
+        'rigbot_location',
+        counters=('statuses', 'matches'),
+        label='location',
+    )
+    for stream in streams:
+        locations = getattr(stream, 'locations', None)
+        for name in getattr(locations, 'names', ()):
+            collector.add(partial(locations.stats, name), name)
+    if collector.sources:
+        registry.register(collector)
+    if pools:
+        collector = StatsCollector(
+            'rigbot_pool',
+            counters=('submitted', 'dropped', 'processed', 'errors'),
+            label='pool',
+        )
+        for name, pool in pools.items():
+            collector.add(pool.stats, name)
+        registry.register(collector)
+    if retweeter is not None:
+        registry.register(StatsCollector(
+            'rigbot_retweets',
+            counters=('submitted', 'duplicates', 'made', 'retried', 'failed'),
+        ).add(retweeter.stats))
+    rejections = getattr(filterer, 'rejections', None)
+    if rejections is not None:
+        registry.register(lambda: [(
+            'rigbot_phrases_total',
+            'counter',
+            'Phrases classified, by the stage they were rejected at',
+            [(dict(stage=stage), count)
+             for stage, count in sorted(_snapshot(rejections).items())],
+        )])
+
+
+def serve(port, host='127.0.0.1', registry=REGISTRY):
+    """Serve the metrics over HTTP, on a background thread.
+
+    Arguments:
+      port (:py:class:`int`): The port to listen on (``0`` for any
+        free port).
+      host (:py:class:`str`, optional): The address to listen on
+        (defaults to local connections only).
+      registry (:py:class:`Registry`, optional): The metrics to serve.
+
+    Returns:
+      :py:class:`http.server.ThreadingHTTPServer`: The server; call
+        ``shutdown`` to stop it.
+
+    """
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        """Respond to requests for the metrics."""
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            """Handle a GET request."""
+            if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            logger.debug(format, *args)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logger.info('serving metrics on http://%s:%s/metrics',
+                *server.server_address[:2])
+    return server
+
+
+def _header(lines, name, kind, help_):
+    if help_:
+        lines.append('# HELP {} {}'.format(name, _escape(help_)))
+    lines.append('# TYPE {} {}'.format(name, kind))
+
+
+def _sample(name, labels, value):
+    if labels:
+        name += '{%s}' % ','.join(
+            '{}="{}"'.format(key, _escape(str(label)).replace('"', '\\"'))
+            for key, label in sorted(labels.items())
+        )
+    return '{} {}'.format(name, _format(value))
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _format(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _snapshot(counts):
+    """Copy counts that may be added to by other threads."""
+    snapshot = getattr(counts, 'snapshot', None)
+    return snapshot() if snapshot is not None else dict(counts)
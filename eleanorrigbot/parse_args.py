@@ -11,7 +11,91 @@ LIVERPOOL = [-3.0087, 53.3261, -2.8180, 53.4751]
 def parse_args(args):
     """Parse the command line arguments."""
     parser = _build_parser()
-    return parser.parse_args(args)
+    parsed = parser.parse_args(args)
+    if not parsed.locations:
+        parsed.locations = [LIVERPOOL]
+    return parsed
+
+
+def read_locations(path):
+    """Read bounding boxes from a file.
+
+    Each line holds the four coordinates of a box, separated by commas
+    and/or whitespace; blank lines and comments (from ``#``) are
+    ignored.
+
+    Arguments:
+      path (:py:class:`str`): The file to read.
+
+    Returns:
+      :py:class:`list`: The bounding boxes.
+
+    Raises:
+      :py:class:`ValueError`: If a line isn't a valid box.
+
+    """
+    locations = []
+    with open(path, encoding='utf-8') as locations_file:
+        for line in locations_file:
+            coordinates = line.split('#', 1)[0].replace(',', ' ').split()
+            if not coordinates:
+                continue
+            if len(coordinates) != 4:
+                raise ValueError('expected 4 coordinates, got {!r}'.format(
+                    line.strip(),
+                ))
+            locations.append([float(coordinate) for coordinate in coordinates])
+    return locations
+
+
+def positive_int(value):
+    """Parse a positive integer argument.
+
+    Raises:
+      :py:class:`argparse.ArgumentTypeError`: If the value isn't a
+        positive integer.
+
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            '{!r} is not a positive integer'.format(value),
+        )
+    return number
+
+
+def non_negative_int(value):
+    """Parse an integer argument where zero is meaningful.
+
+    Raises:
+      :py:class:`argparse.ArgumentTypeError`: If the value isn't zero
+        or a positive integer.
+
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        number = -1
+    if number < 0:
+        raise argparse.ArgumentTypeError(
+            '{!r} is not a non-negative integer'.format(value),
+        )
+    return number
+
+
+class _ExtendLocations(argparse.Action):  # pylint: disable=too-few-public-methods
+    """Add the bounding boxes read from a file to the locations."""
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        try:
+            locations = read_locations(values)
+        except (OSError, ValueError) as exc:
+            parser.error('invalid locations file {!r}: {}'.format(values, exc))
+        setattr(namespace, self.dest,
+                (getattr(namespace, self.dest) or []) + locations)
 
 
 def _build_parser():
@@ -27,11 +111,106 @@ def _build_parser():
     )
     parser.add_argument(
         '--location', '-l',
-        default=LIVERPOOL,
-        help='specify a location to filter (defaults to Liverpool)',
+        action='append',
+        dest='locations',
+        help='specify a location to filter (defaults to Liverpool); repeat '
+             'to listen to several locations at once',
         metavar=('SW_LON', 'SW_LAT', 'NE_LON', 'NE_LAT'),
         nargs=4,
         type=float,
     )
+    parser.add_argument(
+        '--locations-file',
+        action=_ExtendLocations,
+        dest='locations',
+        help='read locations to filter from a file, one per line',
+        metavar='PATH',
+    )
+    parser.add_argument(
+        '--schemes',
+        help='match the schemes defined in this JSON, TOML or YAML file '
+             '(defaults to Eleanor Rigby), reloading it on SIGHUP',
+        metavar='PATH',
+    )
+    parser.add_argument(
+        '--cache-size',
+        default=4096,
+        help='maximum number of words to cache pronunciations for',
+        metavar='WORDS',
+        type=positive_int,
+    )
+    parser.add_argument(
+        '--cache-policy',
+        choices=('lru', 'lfu'),
+        default='lru',
+        help='eviction policy for the pronunciation cache',
+    )
+    parser.add_argument(
+        '--estimate-unknown',
+        action='store_true',
+        help='estimate the pronunciations of words not in the dictionary '
+             '(only confident estimates are used)',
+    )
+    parser.add_argument(
+        '--estimates-file',
+        help='keep the estimated pronunciations in this file between runs '
+             '(implies --estimate-unknown)',
+        metavar='PATH',
+    )
+    parser.add_argument(
+        '--word-store',
+        help='share the pronunciations looked up through this SQLite file, '
+             'warming the cache from it at startup',
+        metavar='PATH',
+    )
+    parser.add_argument(
+        '--workers',
+        default=0,
+        help='number of threads to classify statuses on (defaults to 0, '
+             'classifying on the stream thread)',
+        metavar='N',
+        type=non_negative_int,
+    )
+    parser.add_argument(
+        '--processes',
+        default=0,
+        help='number of processes to classify statuses on in batches '
+             '(overrides --workers)',
+        metavar='N',
+        type=non_negative_int,
+    )
+    parser.add_argument(
+        '--batch-size',
+        default=20,
+        help='number of statuses sent to a process at once',
+        metavar='N',
+        type=positive_int,
+    )
+    parser.add_argument(
+        '--queue-size',
+        default=1000,
+        help='maximum number of statuses waiting for a worker (0 for no '
+             'limit)',
+        metavar='N',
+        type=non_negative_int,
+    )
+    parser.add_argument(
+        '--drop-policy',
+        choices=('block', 'newest', 'oldest'),
+        default='newest',
+        help='what to do with statuses when the queue is full',
+    )
+    parser.add_argument(
+        '--metrics-port',
+        help='serve Prometheus metrics on this local port (defaults to not '
+             'serving them)',
+        metavar='PORT',
+        type=int,
+    )
+    parser.add_argument(
+        '--asyncio',
+        action='store_true',
+        help='stream and retweet on an asyncio event loop (requires aiohttp)',
+    )
     parser.add_argument('--version', action='version', version=__version__)
     return parser
@@ -0,0 +1,280 @@
+"""A sampling profiler that can be switched on in the running bot.
+
+Rather than tracing every call (as :py:mod:`cProfile` does), the stacks
+of all of the threads are sampled at an interval, so the overhead is
+low enough to use under real stream load. The samples are written as
+collapsed stacks (for flame graph tools) and as a :py:mod:`pstats`
+file (for ``python -m pstats`` or snakeviz).
+
+"""
+from collections import Counter
+from datetime import datetime
+import logging
+import marshal
+import os
+import signal
+import sys
+from threading import Event, Lock, Thread, enumerate as threads, get_ident
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SECONDS = 'RIGBOT_PROFILE_SECONDS'
+"""Environment variable: profile for this many seconds at startup."""
+
+PROFILE_DIR = 'RIGBOT_PROFILE_DIR'
+"""Environment variable: where to write the profiles."""
+
+
+class SamplingProfiler:
+    """Sample the stacks of the other threads on a background thread.
+
+    Arguments:
+      interval (:py:class:`float`, optional): The time between
+        samples, in seconds.
+
+    Attributes:
+      samples (:py:class:`collections.Counter`): The number of times
+        each stack was seen, keyed on the thread name and the ``(file,
+        first line, function)`` of each frame, outermost first.
+
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self._stopped = Event()
+        self._thread = None
+
+    def start(self):
+        """Start sampling."""
+        self._stopped.clear()
+        self._thread = Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling.
+
+        Returns:
+          :py:class:`collections.Counter`: The samples.
+
+        """
+        self._stopped.set()
+        self._thread.join()
+        return self.samples
+
+    def sample(self, ignore=()):
+        """Take one sample of every thread's stack.
+
+        Arguments:
+          ignore (:py:class:`tuple`, optional): The idents of threads
+            not to sample.
+
+        """
+        # pylint: disable=protected-access
+        names = {thread.ident: thread.name for thread in threads()}
+        for ident, frame in sys._current_frames().items():
+            if ident in ignore:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno,
+                              code.co_name))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples[names.get(ident, str(ident)), tuple(stack)] += 1
+
+    def _run(self):
+        ignore = (get_ident(),)
+        while not self._stopped.wait(self.interval):
+            self.sample(ignore)
+
+
+def write_collapsed(samples, path):
+    """Write the samples as collapsed stacks, one per line.
+
+    Each line is the thread name and the functions from the outermost
+    inwards, separated by semicolons, followed by the sample count.
+
+    """
+    with open(path, 'w', encoding='utf-8') as collapsed:
+        for (thread, stack), count in sorted(samples.items()):
+            frames = [thread] + [
+                '{} ({}:{})'.format(function, os.path.basename(filename), line)
+                for filename, line, function in stack
+            ]
+            collapsed.write('{} {}\n'.format(
+                ';'.join(frame.replace(';', ':') for frame in frames),
+                count,
+            ))
+
+
+def write_pstats(samples, path, interval):
+    """Write the samples in the format read by :py:class:`pstats.Stats`.
+
+    Each sample counts as ``interval`` seconds: of internal time for
+    the innermost function and of cumulative time for every function
+    on the stack. Call counts are sample counts.
+
+    """
+    stats = {}
+    for (_, stack), count in samples.items():
+        _add_stack(stats, stack, count, count * interval)
+    with open(path, 'wb') as pstats_file:
+        marshal.dump(stats, pstats_file)
+
+
+def _add_stack(stats, stack, count, elapsed):
+    """Add the samples of one stack to the pstats entries."""
+    seen = set()
+    for depth, function in enumerate(stack):
+        calls, _, internal, cumulative, callers = stats.get(
+            function, (0, 0, 0.0, 0.0, {}),
+        )
+        innermost = elapsed if depth == len(stack) - 1 else 0.0
+        if function not in seen:
+            cumulative += elapsed
+            seen.add(function)
+        if depth:
+            caller_calls, _, caller_internal, caller_cumulative = (
+                callers.get(stack[depth - 1], (0, 0, 0.0, 0.0))
+            )
+            callers[stack[depth - 1]] = (
+                caller_calls + count,
+                caller_calls + count,
+                caller_internal + innermost,
+                caller_cumulative + elapsed,
+            )
+        stats[function] = (calls + count, calls + count,
+                           internal + innermost, cumulative, callers)
+
+
+class ProfileTrigger:  # pylint: disable=too-many-instance-attributes
+    """Profile the running process for a while, on request.
+
+    Arguments:
+      duration (:py:class:`float`, optional): How long to profile for,
+        in seconds.
+      directory (:py:class:`str`, optional): Where to write the
+        ``.collapsed`` and ``.pstats`` files.
+      interval (:py:class:`float`, optional): The time between
+        samples, in seconds.
+
+    """
+
+    def __init__(self, duration=30, directory='.', interval=0.005):
+        self.duration = duration
+        self.directory = directory
+        self.interval = interval
+        self._lock = Lock()
+        self._running = False
+        self._stopped = Event()
+        self._thread = None
+        self._requested = Event()
+        self._watcher = None
+
+    def __call__(self):
+        """Start profiling in the background, unless already running.
+
+        Returns:
+          :py:class:`threading.Thread`: The thread that will write the
+            profile (or ``None`` if one is already being taken).
+
+        """
+        with self._lock:
+            if self._running:
+                logger.info('already profiling')
+                return None
+            self._running = True
+            self._stopped.clear()
+            thread = Thread(target=self.run, name='profile-writer',
+                            daemon=True)
+            self._thread = thread
+        thread.start()
+        return thread
+
+    def stop(self, timeout=None):
+        """Cut the current profile short, waiting for it to be written."""
+        with self._lock:
+            thread = self._thread
+        self._stopped.set()
+        if thread is not None:
+            thread.join(timeout)
+
+    def request_profile(self, *_):
+        """Wake the background thread to start profiling.
+
+        Accepts (and ignores) the arguments of a signal handler; it
+        takes no locks, so the signal can't interrupt (and wait for)
+        a profile being started or finished.
+
+        """
+        self._requested.set()
+
+    def install(self, signum=getattr(signal, 'SIGUSR1', None)):
+        """Start profiling whenever the process receives the signal."""
+        if signum is not None:
+            if self._watcher is None:
+                self._watcher = Thread(target=self._watch, name='profiling',
+                                       daemon=True)
+                self._watcher.start()
+            signal.signal(signum, self.request_profile)
+        return self
+
+    def run(self):
+        """Profile for the duration, then write the files.
+
+        Returns:
+          :py:class:`tuple`: The paths of the collapsed stacks and
+            pstats files.
+
+        """
+        try:
+            logger.info('profiling for %s seconds', self.duration)
+            profiler = SamplingProfiler(self.interval).start()
+            self._stopped.wait(self.duration)
+            samples = profiler.stop()
+            prefix = os.path.join(
+                self.directory,
+                'rigbot-{:%Y%m%d-%H%M%S}'.format(datetime.now()),
+            )
+            paths = prefix + '.collapsed', prefix + '.pstats'
+            write_collapsed(samples, paths[0])
+            write_pstats(samples, paths[1], self.interval)
+            logger.info('wrote %s samples to %s and %s',
+                        sum(samples.values()), *paths)
+            return paths
+        finally:
+            with self._lock:
+                self._running = False
+
+    def _watch(self):
+        """Start a profile each time one is requested."""
+        while True:
+            self._requested.wait()
+            self._requested.clear()
+            self()
+
+
+def configure(environ=None):
+    """Set up profiling from the environment.
+
+    ``SIGUSR1`` always starts a profile; if ``RIGBOT_PROFILE_SECONDS``
+    is set, that is how long each profile lasts and one is also started
+    straight away. Profiles are written to ``RIGBOT_PROFILE_DIR`` (the
+    working directory by default).
+
+    Returns:
+      :py:class:`ProfileTrigger`: The installed trigger.
+
+    """
+    environ = os.environ if environ is None else environ
+    seconds = environ.get(PROFILE_SECONDS)
+    trigger = ProfileTrigger(
+        duration=float(seconds) if seconds else 30,
+        directory=environ.get(PROFILE_DIR, '.'),
+    ).install()
+    if seconds:
+        trigger()
+    return trigger
@@ -0,0 +1,409 @@
+"""Compact pronunciation index built from the CMU Pronouncing Dictionary."""
+from array import array
+import logging
+import os
+import struct
+import sys
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+
+INDEX_PATH = os.path.join(os.path.dirname(__file__), 'pronunciations.idx')
+
+_HEADER = struct.Struct('<4sIIIII')
+
+_MAGIC = b'RIGB'
+
+
+class StringTable:
+    """A sequence of strings stored in a single blob.
+
+    Arguments:
+      blob (:py:class:`bytes`): The UTF-8 encoded strings, concatenated.
+      offsets (:py:class:`array.array`): The start of each string in
+        the blob, followed by the length of the blob.
+
+    """
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError('string table index out of range')
+        return self.blob[self.offsets[index]:self.offsets[index + 1]].decode()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def find(self, string):
+        """Find a string by binary search, if the table is sorted.
+
+        Arguments:
+          string (:py:class:`str`): The string to find.
+
+        Returns:
+          :py:class:`int`: The index of the string (or ``-1`` if it's
+            not in the table).
+
+        """
+        low = self.bisect(string)
+        blob, offsets = self.blob, self.offsets
+        if (low < len(offsets) - 1
+                and blob[offsets[low]:offsets[low + 1]] == string.encode()):
+            return low
+        return -1
+
+    def bisect(self, string):
+        """Where the string would be inserted, if the table is sorted.
+
+        Arguments:
+          string (:py:class:`str`): The string to locate.
+
+        Returns:
+          :py:class:`int`: The index of the first string in the table
+            that is not less than it (compared as UTF-8).
+
+        """
+        key = string.encode()
+        blob, offsets = self.blob, self.offsets
+        low, high = 0, len(offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if blob[offsets[middle]:offsets[middle + 1]] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    @classmethod
+    def from_strings(cls, strings):
+        """Create a table from a sequence of strings."""
+        encoded = [string.encode() for string in strings]
+        offsets = array('I', [0])
+        for string in encoded:
+            offsets.append(offsets[-1] + len(string))
+        return cls(b''.join(encoded), offsets)
+
+
+class PronunciationIndex:
+    """Word lookups against a precomputed pronunciation index.
+
+    Each word has one or more distinct pronunciations, in CMUdict
+    order, each represented as a pair of the syllable count and the
+    integer key of its rhyming part (everything from the vowel in the
+    last stressed syllable onwards).
+
+    Rather than a dictionary of Python objects, the data is held in a
+    few flat arrays: the sorted words (found by binary search) and,
+    for each word, the range of its pronunciations in the parallel
+    arrays of syllable counts and rhyme keys.
+
+    Arguments:
+      words (:py:class:`StringTable`): The words, sorted.
+      rhyming_parts (:py:class:`StringTable`): The rhyming parts,
+        indexed by rhyme key.
+      offsets (:py:class:`array.array`): The index of each word's first
+        pronunciation, followed by the number of pronunciations.
+      syllables (:py:class:`array.array`): The syllable count of each
+        pronunciation.
+      rhyme_keys (:py:class:`array.array`): The rhyme key of each
+        pronunciation.
+
+    """
+
+    def __init__(self, words, rhyming_parts, offsets, syllables, rhyme_keys):
+        # pylint: disable=too-many-arguments
+        self.words = words
+        self.rhyming_parts = rhyming_parts
+        self.offsets = offsets
+        self.syllable_counts = syllables
+        self.rhyme_keys = rhyme_keys
+        self._keys_by_part = None
+
+    def __contains__(self, word):
+        return self.words.find(word) >= 0
+
+    def __len__(self):
+        return len(self.words)
+
+    def max_syllables(self):
+        """The largest syllable count of any word in the index."""
+        return max(self.syllable_counts, default=0)
+
+    def pronunciations(self, word):
+        """The ``(syllables, rhyme_key)`` pairs for the word.
+
+        Arguments:
+          word (:py:class:`str`): The word to look up.
+
+        Returns:
+          :py:class:`tuple`: The pronunciations (empty if the word is
+            not in the index).
+
+        """
+        index = self.words.find(word)
+        if index < 0:
+            return ()
+        return self._pronunciations_at(index)
+
+    def syllables(self, word):
+        """The number of syllables in the word's first pronunciation.
+
+        Arguments:
+          word (:py:class:`str`): The word to look up.
+
+        Returns:
+          :py:class:`int`: The syllable count (or ``None`` if the word
+            is not in the index).
+
+        """
+        index = self.words.find(word)
+        if index < 0:
+            return None
+        return self.syllable_counts[self.offsets[index]]
+
+    def rhyme_key(self, word):
+        """The rhyme key of the word's first pronunciation.
+
+        Arguments:
+          word (:py:class:`str`): The word to look up.
+
+        Returns:
+          :py:class:`int`: The rhyme key (or ``None`` if the word is
+            not in the index).
+
+        """
+        index = self.words.find(word)
+        if index < 0:
+            return None
+        return self.rhyme_keys[self.offsets[index]]
+
+    def rhyme_key_for(self, rhyming_part):
+        """The rhyme key of a rhyming part.
+
+        Keys depend on the order the index was built in, so anything
+        stored outside the index should use the rhyming parts instead.
+
+        Arguments:
+          rhyming_part (:py:class:`str`): The rhyming part, e.g.
+            ``'AO1 R'``.
+
+        Returns:
+          :py:class:`int`: The rhyme key (or ``None`` if no word in the
+            index has that rhyming part).
+
+        """
+        if self._keys_by_part is None:
+            parts = self.rhyming_parts
+            self._keys_by_part = {parts[key]: key for key in range(len(parts))}
+        return self._keys_by_part.get(rhyming_part)
+
+    def items(self):
+        """Iterate over the words and their pronunciations."""
+        for index, word in enumerate(self.words):
+            yield word, self._pronunciations_at(index)
+
+    def _pronunciations_at(self, index):
+        """The pronunciations of the word at the index."""
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return tuple(zip(self.syllable_counts[start:end],
+                         self.rhyme_keys[start:end]))
+
+    @classmethod
+    def from_entries(cls, entries, rhyming_parts):
+        """Build the index from Python objects.
+
+        Arguments:
+          entries (:py:class:`dict`): The map of words to tuples of
+            ``(syllables, rhyme_key)`` pronunciations.
+          rhyming_parts (:py:class:`list`): The rhyming parts, indexed
+            by rhyme key.
+
+        """
+        words = sorted(entries, key=str.encode)
+        offsets = array('I', [0])
+        syllables = array('B')
+        rhyme_keys = array('I')
+        for word in words:
+            for syllable_count, rhyme_key in entries[word]:
+                syllables.append(syllable_count)
+                rhyme_keys.append(rhyme_key)
+            offsets.append(len(syllables))
+        return cls(
+            StringTable.from_strings(words),
+            StringTable.from_strings(rhyming_parts),
+            offsets,
+            syllables,
+            rhyme_keys,
+        )
+
+    @classmethod
+    def from_cmudict(cls):
+        """Build the index from the pronouncing library's CMUdict.
+
+        This parses the full dictionary, so takes a few seconds; the
+        library is only imported when it's needed.
+
+        """
+        import pronouncing  # pylint: disable=import-outside-toplevel
+        pronouncing.init_cmu()
+        rhyme_keys = {}
+        entries = {}
+        for word, phones in pronouncing.pronunciations:
+            rhyme = pronouncing.rhyming_part(phones)
+            key = rhyme_keys.setdefault(rhyme, len(rhyme_keys))
+            pronunciation = (pronouncing.syllable_count(phones), key)
+            existing = entries.get(word, ())
+            if pronunciation not in existing:
+                entries[word] = existing + (pronunciation,)
+        return cls.from_entries(entries, list(rhyme_keys))
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        """Load the index from disk in a single read.
+
+        Arguments:
+          path (:py:class:`str`, optional): The index file to load.
+
+        Raises:
+          :py:class:`ValueError`: If the file is not a valid index.
+
+        """
+        with open(path, 'rb') as index_file:
+            data = memoryview(index_file.read())
+        words, pronunciations, rhymes, blob_size = _read_header(data)
+        reader = _Reader(data, _HEADER.size)
+        word_offsets = reader.array('I', words + 1)
+        offsets = reader.array('I', words + 1)
+        syllables = reader.array('B', pronunciations)
+        rhyme_keys = reader.array('I', pronunciations)
+        rhyme_offsets = reader.array('I', rhymes + 1)
+        return cls(
+            StringTable(reader.bytes(blob_size), word_offsets),
+            StringTable(reader.bytes(rhyme_offsets[-1]), rhyme_offsets),
+            offsets,
+            syllables,
+            rhyme_keys,
+        )
+
+    def save(self, path=INDEX_PATH):
+        """Write the index to disk.
+
+        Arguments:
+          path (:py:class:`str`, optional): The index file to write.
+
+        """
+        header = _HEADER.pack(
+            _MAGIC,
+            FORMAT_VERSION,
+            len(self.words),
+            len(self.syllable_counts),
+            len(self.rhyming_parts),
+            len(self.words.blob),
+        )
+        with open(path, 'wb') as index_file:
+            index_file.write(header)
+            for values in (self.words.offsets, self.offsets,
+                           self.syllable_counts, self.rhyme_keys,
+                           self.rhyming_parts.offsets):
+                index_file.write(_little_endian(values).tobytes())
+            index_file.write(self.words.blob)
+            index_file.write(self.rhyming_parts.blob)
+
+
+class _Reader:  # pylint: disable=too-few-public-methods
+    """Read consecutive arrays out of a buffer."""
+
+    def __init__(self, data, position):
+        self.data = data
+        self.position = position
+
+    def array(self, typecode, length):
+        """Read the next ``length`` values of the array type.
+
+        Arguments:
+          typecode (:py:class:`str`): The :py:mod:`array` type code.
+          length (:py:class:`int`): The number of values to read.
+
+        Raises:
+          :py:class:`ValueError`: If the buffer is too short.
+
+        """
+        values = array(typecode)
+        end = self.position + length * values.itemsize
+        if end > len(self.data):
+            raise ValueError('truncated index file')
+        values.frombytes(self.data[self.position:end])
+        self.position = end
+        return _little_endian(values)
+
+    def bytes(self, length):
+        """Read the next ``length`` bytes.
+
+        Raises:
+          :py:class:`ValueError`: If the buffer is too short.
+
+        """
+        end = self.position + length
+        if end > len(self.data):
+            raise ValueError('truncated index file')
+        value = self.data[self.position:end].tobytes()
+        self.position = end
+        return value
+
+
+def _read_header(data):
+    """Check the index file's header and read the sizes from it.
+
+    Returns:
+      :py:class:`tuple`: The number of words, pronunciations and
+        rhyming parts, and the size of the words' blob.
+
+    Raises:
+      :py:class:`ValueError`: If the file is not a valid index.
+
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError('truncated index file')
+    magic, version, *sizes = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != FORMAT_VERSION:
+        raise ValueError('unsupported index format')
+    return tuple(sizes)
+
+
+def _little_endian(values):
+    """Convert an array between native and little-endian byte order."""
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+def build_index(path=INDEX_PATH):
+    """Build the index from CMUdict and write it to disk."""
+    index = PronunciationIndex.from_cmudict()
+    index.save(path)
+    logger.info('wrote %s words to %s', len(index), path)
+    return index
+
+
+def load_index(path=INDEX_PATH):
+    """Load the index, building it first if it's missing or invalid."""
+    try:
+        return PronunciationIndex.load(path)
+    except (OSError, ValueError):
+        logger.info('building pronunciation index at %s', path)
+    index = PronunciationIndex.from_cmudict()
+    try:
+        index.save(path)
+    except OSError:
+        logger.warning('could not write pronunciation index to %s', path)
+    return index
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    build_index(*sys.argv[1:2])
@@ -0,0 +1,141 @@
+"""Backoff state for reconnecting to the Twitter stream."""
+import logging
+import random
+from threading import Event, Lock
+from time import monotonic
+
+logger = logging.getLogger(__name__)
+
+NETWORK_STEP, NETWORK_MAX = 0.25, 16
+"""Network errors back off linearly in 250ms steps, up to 16 seconds."""
+
+HTTP_START, HTTP_MAX = 5, 320
+"""HTTP errors back off exponentially from 5 seconds, up to 320 seconds."""
+
+RATE_LIMIT_START = 60
+"""Rate limiting (420) backs off exponentially from a minute."""
+
+
+class ReconnectScheduler:  # pylint: disable=too-many-instance-attributes
+    """Decide when to reconnect to the stream after it fails.
+
+    The delays follow `Twitter's reconnection rules`_, capped at
+    ``max_delay`` and lengthened by up to ``jitter`` (as a fraction)
+    so that they are never shorter than the rules require. Waiting
+    happens on whichever thread reconnects rather than in the
+    listener's callbacks, so the workers keep draining their queues.
+
+    Arguments:
+      max_delay (:py:class:`float`, optional): The longest delay before
+        reconnecting, in seconds.
+      jitter (:py:class:`float`, optional): The largest random increase
+        in each delay, as a fraction of it.
+      clock (:py:class:`callable`, optional): Returns the current time
+        in seconds.
+
+    .. _Twitter's reconnection rules:
+      https://developer.twitter.com/en/docs/tutorials/consuming-streaming-data
+
+    """
+
+    def __init__(self, max_delay=15 * 60, jitter=0.1, clock=monotonic):
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.clock = clock
+        self.failures = 0
+        self.delay = 0.0
+        self._lock = Lock()
+        self._stopped = Event()
+        self._due = None
+        self._disconnected_since = None
+        self._counts = dict(disconnections=0, time_disconnected=0.0)
+
+    @property
+    def disconnected(self):
+        """Whether the stream has failed since it last connected."""
+        return self._due is not None
+
+    def connected(self):
+        """Record a successful connection, resetting the backoff."""
+        with self._lock:
+            if self._disconnected_since is not None:
+                self._counts['time_disconnected'] += (
+                    self.clock() - self._disconnected_since
+                )
+            self.failures = 0
+            self.delay = 0.0
+            self._due = self._disconnected_since = None
+
+    def failed(self, status_code=None):
+        """Record a failure and schedule the reconnection.
+
+        Arguments:
+          status_code (:py:class:`int`, optional): The HTTP status code
+            of the failed connection (``None`` for a network error).
+
+        Returns:
+          :py:class:`float`: The delay before reconnecting, in seconds.
+
+        """
+        with self._lock:
+            now = self.clock()
+            if self._disconnected_since is None:
+                self._disconnected_since = now
+                self._counts['disconnections'] += 1
+            self.failures += 1
+            delay = min(_rule_delay(status_code, self.failures), self.max_delay)
+            self.delay = delay + random.uniform(0, self.jitter * delay)
+            self._due = now + self.delay
+            return self.delay
+
+    def wait(self):
+        """Wait until the scheduled reconnection.
+
+        Returns:
+          :py:class:`bool`: Whether to reconnect (``False`` if the
+            scheduler was stopped while waiting).
+
+        """
+        while not self._stopped.is_set():
+            with self._lock:
+                remaining = 0 if self._due is None else self._due - self.clock()
+            if remaining <= 0:
+                return True
+            self._stopped.wait(remaining)
+        return False
+
+    def stop(self):
+        """Cancel any wait for a reconnection."""
+        self._stopped.set()
+
+    def stats(self):
+        """The scheduler's metrics.
+
+        Returns:
+          :py:class:`dict`: Whether the stream is connected, the number
+            of consecutive failures, the current delay, the number of
+            disconnections and the total time spent disconnected (in
+            seconds, including the current disconnection).
+
+        """
+        with self._lock:
+            stats = dict(
+                connected=self._due is None,
+                failures=self.failures,
+                delay=self.delay,
+                **self._counts
+            )
+            if self._disconnected_since is not None:
+                stats['time_disconnected'] += (
+                    self.clock() - self._disconnected_since
+                )
+            return stats
+
+
+def _rule_delay(status_code, failures):
+    """The delay Twitter requires after consecutive failures."""
+    if status_code is None:
+        return min(NETWORK_STEP * failures, NETWORK_MAX)
+    if status_code == 420:
+        return RATE_LIMIT_START * 2 ** (failures - 1)
+    return min(HTTP_START * 2 ** (failures - 1), HTTP_MAX)
@@ -0,0 +1,175 @@
+"""Replay recorded statuses through the listener, offline."""
+import argparse
+from collections import Counter
+import gzip
+import json
+import logging
+import math
+import sys
+from time import perf_counter, sleep
+
+from tweepy.models import Status
+
+from . import ELEANOR_RIGBY
+from .extract import extract_words
+from .listen import RetweetListener
+
+
+class RecordingAPI:  # pylint: disable=too-few-public-methods
+    """Stand-in for the Twitter API that records retweets."""
+
+    def __init__(self):
+        self.retweets = []
+
+    def retweet(self, status_id):
+        """Record the retweet."""
+        self.retweets.append(status_id)
+
+
+def read_statuses(path, counts=None):
+    """Read statuses from a JSONL file, optionally gzip-compressed.
+
+    Arguments:
+      path (:py:class:`str`): The file to read, one status JSON object
+        per line; blank lines and stream messages without an ``id``
+        (e.g. deletions) are skipped.
+      counts (:py:class:`collections.Counter`, optional): Where to
+        count the ``invalid`` lines (that aren't JSON objects), which
+        are also skipped.
+
+    Returns:
+      :py:class:`generator`: The :py:class:`tweepy.models.Status`
+        objects.
+
+    """
+    with _open(path) as lines:
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError:
+                data = None
+            if not isinstance(data, dict):
+                if counts is not None:
+                    counts['invalid'] += 1
+                continue
+            if 'id' in data and ('text' in data or 'full_text' in data):
+                data.setdefault('text', data.get('full_text'))
+                yield Status.parse(None, data)
+
+
+def replay(statuses, filterer=ELEANOR_RIGBY, rate=None):
+    """Feed the statuses through :py:class:`RetweetListener`.
+
+    Arguments:
+      statuses (:py:class:`iterable`): The statuses to replay.
+      filterer (:py:class:`callable`, optional): The filterer to use.
+      rate (:py:class:`float`, optional): Replay the statuses at this
+        multiple of the speed they were recorded at, using their
+        ``timestamp_ms`` (defaults to as fast as possible).
+
+    Returns:
+      :py:class:`dict`: The number of statuses and matches, the
+        statuses processed per second and the median and 99th
+        percentile time to process a status, in seconds.
+
+    """
+    api = RecordingAPI()
+    listener = RetweetListener(api, extract_words, filterer)
+    latencies = []
+    first_timestamp = None
+    start = perf_counter()
+    for status in statuses:
+        if rate is not None:
+            timestamp = int(getattr(status, 'timestamp_ms', 0)) / 1000
+            if first_timestamp is None:
+                first_timestamp = timestamp
+            delay = (timestamp - first_timestamp) / rate - (perf_counter() - start)
+            if delay > 0:
+                sleep(delay)
+        before = perf_counter()
+        listener.on_status(status)
+        latencies.append(perf_counter() - before)
+    elapsed = perf_counter() - start
+    latencies.sort()
+    return dict(
+        statuses=len(latencies),
+        matches=len(api.retweets),
+        statuses_per_second=len(latencies) / elapsed if elapsed else 0.0,
+        p50=_percentile(latencies, 50),
+        p99=_percentile(latencies, 99),
+    )
+
+
+def main(args=None):
+    """Replay recorded statuses and report on the throughput."""
+    replay_report(args)
+    return 0
+
+
+def replay_report(args=None):
+    """Replay the statuses named on the command line, printing a summary.
+
+    Arguments:
+      args (:py:class:`list`, optional): The command line arguments
+        (defaults to :py:data:`sys.argv`).
+
+    Returns:
+      :py:class:`dict`: The report from :py:func:`replay`, and the
+        number of ``invalid`` lines skipped.
+
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        'paths',
+        help='JSONL file(s) of statuses, optionally gzip-compressed',
+        metavar='PATH',
+        nargs='+',
+    )
+    parser.add_argument(
+        '--rate', '-r',
+        help='replay at this multiple of the recorded speed (defaults to '
+             'as fast as possible)',
+        type=float,
+    )
+    parsed = parser.parse_args(sys.argv[1:] if args is None else args)
+    logging.basicConfig(level=logging.WARNING)
+    counts = Counter(invalid=0)
+    report = replay(
+        (status for path in parsed.paths
+         for status in read_statuses(path, counts)),
+        rate=parsed.rate,
+    )
+    report.update(counts)
+    print(
+        '{statuses} statuses, {matches} matches, {invalid} invalid lines, '
+        '{statuses_per_second:.1f} statuses/s, '
+        'p50 {p50_ms:.3f}ms, p99 {p99_ms:.3f}ms'.format(
+            p50_ms=report['p50'] * 1000,
+            p99_ms=report['p99'] * 1000,
+            **report
+        )
+    )
+    return report
+
+
+def _open(path):
+    """Open a text file, decompressing it if it's gzipped."""
+    with open(path, 'rb') as raw:
+        compressed = raw.read(2) == b'\x1f\x8b'
+    if compressed:
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def _percentile(ordered, percent):
+    """The nearest-rank percentile of the sorted values."""
+    if not ordered:
+        return 0.0
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[max(rank - 1, 0)]
+
+
+if __name__ == '__main__':
+    main()
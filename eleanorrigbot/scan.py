@@ -0,0 +1,378 @@
+"""Scan archives of statuses for matches, offline.
+
+Each JSONL file is memory-mapped and split into chunks of whole lines
+by byte range, and the chunks are scanned across a pool of processes.
+The matches are appended to the output file (one JSON object per line)
+as each chunk finishes, and the chunks done are recorded in a
+checkpoint file alongside it, so an interrupted scan can be resumed.
+
+"""
+import argparse
+from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+import gzip
+import json
+import logging
+import mmap
+import os
+import sys
+from time import perf_counter
+
+from . import ELEANOR_RIGBY
+from .classify import SchemeSet, get_pronunciations
+from .extract import extract_words
+from .schemes import SchemeFile
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024 * 1024
+"""The default size of each chunk, in bytes."""
+
+SCHEMES = SchemeSet({'eleanor rigby': ELEANOR_RIGBY})
+"""The schemes scanned for by default."""
+
+
+def chunk_ranges(path, chunk_size=CHUNK_SIZE):
+    """Split a file into byte ranges of whole lines.
+
+    Arguments:
+      path (:py:class:`str`): The file to split.
+      chunk_size (:py:class:`int`, optional): The approximate size of
+        each range, in bytes; each ends at the first line break after
+        that size. Gzipped files can't be split, so are one range.
+
+    Returns:
+      :py:class:`list`: The ``(start, end)`` ranges.
+
+    """
+    size = os.path.getsize(path)
+    if not size:
+        return []
+    if _is_gzipped(path):
+        return [(0, size)]
+    ranges = []
+    with open(path, 'rb') as file_, \
+            mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        start = 0
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                newline = data.find(b'\n', end - 1)
+                end = size if newline < 0 else newline + 1
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def scan_chunk(path, start, end, schemes=SCHEMES):
+    """Find the matching statuses in a range of a file.
+
+    Arguments:
+      path (:py:class:`str`): The JSONL file of statuses.
+      start (:py:class:`int`): The offset of the first line.
+      end (:py:class:`int`): The offset after the last line.
+      schemes (:py:class:`~eleanorrigbot.classify.SchemeSet`, optional):
+        The schemes to match.
+
+    Returns:
+      :py:class:`tuple`: The matches, as dictionaries of the status
+        ``id``, the ``scheme`` name and the phrase split into
+        ``lines``, and the counts of ``statuses``, ``matches`` and
+        ``invalid`` lines.
+
+    """
+    matches, counts = [], Counter(statuses=0, matches=0, invalid=0)
+    for line in _read_lines(path, start, end):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            counts['invalid'] += 1
+            continue
+        if not isinstance(data, dict):
+            counts['invalid'] += 1
+            continue
+        text = _text(data)
+        if text is None or 'id' not in data:
+            continue
+        counts['statuses'] += 1
+        for name, lines in schemes.split_lines(extract_words(text)).items():
+            counts['matches'] += 1
+            matches.append(dict(
+                id=data['id'],
+                scheme=name,
+                lines=[' '.join(words) for words in lines],
+            ))
+    return matches, dict(counts)
+
+
+def scan(paths, output, processes=None, chunk_size=CHUNK_SIZE,
+         resume=False, schemes=SCHEMES):
+    """Scan files of statuses for matches, writing them to the output.
+
+    Arguments:
+      paths (:py:class:`list`): The JSONL files of statuses, optionally
+        gzipped.
+      output (:py:class:`str`): The file to write the matches to; the
+        checkpoint is kept in the same place, with ``.checkpoint``
+        appended.
+      processes (:py:class:`int`, optional): The number of processes to
+        scan with (defaults to the number of CPUs; ``0`` scans in this
+        process).
+      chunk_size (:py:class:`int`, optional): The size of each chunk,
+        in bytes.
+      resume (:py:class:`bool`, optional): Whether to carry on from the
+        checkpoint of an earlier scan (rather than starting again).
+      schemes (:py:class:`~eleanorrigbot.classify.SchemeSet`, optional):
+        The schemes to match.
+
+    Returns:
+      :py:class:`dict`: The counts of ``chunks`` scanned (in this run),
+        ``statuses``, ``matches`` and ``invalid`` lines (in total).
+
+    Raises:
+      :py:class:`ValueError`: If the checkpoint doesn't match the scan.
+
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+    checkpoint = Checkpoint(output + '.checkpoint', chunk_size)
+    if resume:
+        checkpoint.load()
+    else:
+        checkpoint.reset()
+    pending = [
+        (path, start, end)
+        for path in paths
+        for start, end in checkpoint.chunks(path)
+        if not checkpoint.done(path, start)
+    ]
+    if processes == 0:
+        executor = _InProcessExecutor()
+    else:
+        executor = ProcessPoolExecutor(processes, initializer=get_pronunciations)
+    with executor, open(output, 'ab') as output_file:
+        output_file.truncate(checkpoint.output_size)
+        output_file.seek(checkpoint.output_size)
+        futures = {
+            executor.submit(scan_chunk, path, start, end, schemes):
+            (path, start)
+            for path, start, end in pending
+        }
+        for future in as_completed(futures):
+            matches, counts = future.result()
+            for match in matches:
+                output_file.write(json.dumps(match).encode('utf-8') + b'\n')
+            output_file.flush()
+            os.fsync(output_file.fileno())
+            checkpoint.complete(*futures[future], counts, output_file.tell())
+    return dict(chunks=len(pending), **checkpoint.counts)
+
+
+class Checkpoint:
+    """The progress of a scan, saved after each chunk.
+
+    Arguments:
+      path (:py:class:`str`): The checkpoint file.
+      chunk_size (:py:class:`int`): The size of each chunk, in bytes.
+
+    Attributes:
+      output_size (:py:class:`int`): The size of the output file when
+        the last chunk was recorded, so anything written after that is
+        discarded on resuming.
+      counts (:py:class:`collections.Counter`): The totals of the
+        counts from the chunks done.
+
+    """
+
+    def __init__(self, path, chunk_size):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.output_size = 0
+        self.counts = Counter(statuses=0, matches=0, invalid=0)
+        self._files = {}
+
+    def reset(self):
+        """Start again, discarding any saved progress."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def load(self):
+        """Read the saved progress, if there is any.
+
+        Raises:
+          :py:class:`ValueError`: If it was saved by a scan with a
+            different chunk size.
+
+        """
+        try:
+            with open(self.path, encoding='utf-8') as checkpoint_file:
+                saved = json.load(checkpoint_file)
+        except FileNotFoundError:
+            return
+        if saved['chunk_size'] != self.chunk_size:
+            raise ValueError('checkpoint has a chunk size of {}'.format(
+                saved['chunk_size'],
+            ))
+        self.output_size = saved['output_size']
+        self.counts.update(saved['counts'])
+        self._files = {
+            path: dict(size=progress['size'], done=set(progress['done']))
+            for path, progress in saved['files'].items()
+        }
+
+    def chunks(self, path):
+        """The byte ranges of the file's chunks.
+
+        Raises:
+          :py:class:`ValueError`: If the file has changed size since the
+            progress was saved.
+
+        """
+        size = os.path.getsize(path)
+        progress = self._files.setdefault(path, dict(size=size, done=set()))
+        if progress['size'] != size:
+            raise ValueError('{} has changed since the checkpoint'.format(path))
+        return chunk_ranges(path, self.chunk_size)
+
+    def done(self, path, start):
+        """Whether the chunk starting at the offset has been scanned."""
+        return start in self._files[path]['done']
+
+    def complete(self, path, start, counts, output_size):
+        """Record that a chunk has been scanned, and save the progress."""
+        self._files[path]['done'].add(start)
+        self.counts.update(counts)
+        self.output_size = output_size
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as checkpoint_file:
+            json.dump(dict(
+                chunk_size=self.chunk_size,
+                output_size=output_size,
+                counts=self.counts,
+                files={
+                    path: dict(size=progress['size'],
+                               done=sorted(progress['done']))
+                    for path, progress in self._files.items()
+                },
+            ), checkpoint_file)
+        os.replace(temporary, self.path)
+
+
+def main(args=None):
+    """Scan archived statuses for phrases that match the schemes."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        'paths',
+        help='JSONL file(s) of statuses, optionally gzip-compressed',
+        metavar='PATH',
+        nargs='+',
+    )
+    parser.add_argument(
+        '--output', '-o',
+        help='file to write the matches to, one JSON object per line',
+        metavar='PATH',
+        required=True,
+    )
+    parser.add_argument(
+        '--processes', '-p',
+        help='number of processes to scan with (defaults to the number of '
+             'CPUs)',
+        metavar='N',
+        type=int,
+    )
+    parser.add_argument(
+        '--chunk-size',
+        default=CHUNK_SIZE // (1024 * 1024),
+        help='size of the chunks each process scans, in megabytes',
+        metavar='MB',
+        type=int,
+    )
+    parser.add_argument(
+        '--schemes',
+        help='match the schemes defined in this JSON, TOML or YAML file '
+             '(defaults to Eleanor Rigby)',
+        metavar='PATH',
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='carry on from the checkpoint of an interrupted scan',
+    )
+    parsed = parser.parse_args(sys.argv[1:] if args is None else args)
+    logging.basicConfig(level=logging.WARNING)
+    start = perf_counter()
+    try:
+        schemes = SCHEMES
+        if parsed.schemes:
+            schemes = SchemeFile(parsed.schemes).schemes
+        report = scan(
+            parsed.paths,
+            parsed.output,
+            processes=parsed.processes,
+            chunk_size=parsed.chunk_size * 1024 * 1024,
+            resume=parsed.resume,
+            schemes=schemes,
+        )
+    except (OSError, ValueError) as exc:
+        parser.error(str(exc))
+    print(
+        '{chunks} chunks, {statuses} statuses, {matches} matches, '
+        '{invalid} invalid lines in {elapsed:.1f}s'.format(
+            elapsed=perf_counter() - start,
+            **report
+        )
+    )
+    return 0
+
+
+class _InProcessExecutor:
+    """Run the tasks straight away, for scanning without processes."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+    @staticmethod
+    def submit(function, *args):
+        """Call the function, returning its result as a future."""
+        future = Future()
+        future.set_result(function(*args))
+        return future
+
+
+def _read_lines(path, start, end):
+    """The lines in a byte range of the file."""
+    if _is_gzipped(path):
+        with gzip.open(path, 'rb') as lines:
+            yield from lines
+        return
+    with open(path, 'rb') as file_, \
+            mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        position = start
+        while position < end:
+            newline = data.find(b'\n', position, end)
+            line_end = end if newline < 0 else newline
+            yield data[position:line_end]
+            position = line_end + 1
+
+
+def _is_gzipped(path):
+    with open(path, 'rb') as file_:
+        return file_.read(2) == b'\x1f\x8b'
+
+
+def _text(data):
+    """The full text of a status's JSON, or ``None`` if it has none."""
+    extended = data.get('extended_tweet')
+    if isinstance(extended, dict) and 'full_text' in extended:
+        return extended['full_text']
+    return data.get('full_text', data.get('text'))
+
+
+if __name__ == '__main__':
+    main()
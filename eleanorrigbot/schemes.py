@@ -0,0 +1,295 @@
+"""Schemes to match, defined in a file and reloaded on request.
+
+The file maps scheme names to their ``syllable_pattern`` and (optional)
+``rhyming_scheme``, in JSON, TOML (with the ``toml`` package) or YAML
+(with PyYAML), chosen by its extension; e.g. in YAML::
+
+    estimates: confident
+    schemes:
+      eleanor rigby:
+        syllable_pattern: [5, 4, 9, 4]
+        rhyming_scheme: [null, null, 0, 0]
+      that is amore:
+        syllable_pattern: [3, 3, 3, 3]
+        rhyming_scheme: -a-a
+
+A rhyming scheme given as a string has one character per line, with
+``-`` for lines that needn't rhyme (TOML has no ``null``).
+
+"""
+import json
+import logging
+import os
+import signal
+from threading import Event, Lock, Thread
+
+try:
+    import toml
+except ImportError:  # pragma: no cover
+    toml = None
+
+try:
+    import yaml
+except ImportError:  # pragma: no cover
+    yaml = None
+
+from .classify import (
+    ESTIMATE_POLICIES,
+    PhraseMatcher,
+    Rejections,
+    SchemeSet,
+)
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('syllable_pattern', 'rhyming_scheme')
+"""The fields of each scheme's definition."""
+
+
+def read_schemes(path):
+    """Read the scheme definitions from a file.
+
+    Arguments:
+      path (:py:class:`str`): The ``.json``, ``.toml``, ``.yaml`` or
+        ``.yml`` file to read.
+
+    Returns:
+      :py:class:`dict`: The ``estimates`` policy (``'confident'`` if
+        not given) and the map of scheme names to their ``(syllable
+        pattern, rhyming scheme)``.
+
+    Raises:
+      :py:class:`ValueError`: If the file can't be parsed or doesn't
+        define valid schemes.
+
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, encoding='utf-8') as schemes_file:
+        if extension == '.json':
+            data = json.load(schemes_file)
+        elif extension == '.toml':
+            if toml is None:
+                raise ValueError('reading TOML requires the toml package')
+            data = toml.load(schemes_file)
+        elif extension in ('.yaml', '.yml'):
+            if yaml is None:
+                raise ValueError('reading YAML requires the PyYAML package')
+            try:
+                data = yaml.safe_load(schemes_file)
+            except yaml.YAMLError as exc:
+                raise ValueError(str(exc))
+        else:
+            raise ValueError('unknown schemes file type {!r}'.format(extension))
+    if not isinstance(data, dict) or not isinstance(data.get('schemes'), dict):
+        raise ValueError('expected a mapping of schemes')
+    unknown = set(data) - {'estimates', 'schemes'}
+    if unknown:
+        raise ValueError('unknown settings {}'.format(sorted(unknown)))
+    estimates = data.get('estimates', 'confident')
+    if estimates not in ESTIMATE_POLICIES:
+        raise ValueError('estimates must be one of {}'.format(
+            ESTIMATE_POLICIES,
+        ))
+    if not data['schemes']:
+        raise ValueError('no schemes defined')
+    return dict(
+        estimates=estimates,
+        schemes={
+            str(name): _parse_scheme(name, definition)
+            for name, definition in data['schemes'].items()
+        },
+    )
+
+
+class SchemeFile:  # pylint: disable=too-many-instance-attributes
+    """Match phrases against the schemes defined in a file.
+
+    The schemes are compiled into a
+    :py:class:`~eleanorrigbot.classify.SchemeSet` when the file is
+    read, and again each time it's reloaded (e.g. on ``SIGHUP``), so
+    they can be changed without restarting the streams. A signal only
+    wakes a background thread to do the reload, so it's safe however
+    often (and whenever) the signal arrives. Matchers for
+    schemes that haven't changed are reused, and all of them share the
+    pronunciation index and word cache.
+
+    Arguments:
+      path (:py:class:`str`): The file to read (see
+        :py:func:`read_schemes`).
+
+    Attributes:
+      schemes (:py:class:`~eleanorrigbot.classify.SchemeSet`): The
+        current schemes.
+      definitions (:py:class:`dict`): The definitions they were
+        compiled from (see :py:func:`read_schemes`).
+      generation (:py:class:`int`): The number of times the schemes
+        have been reloaded.
+      rejections (:py:class:`~eleanorrigbot.classify.Rejections`): The
+        number of phrases rejected at each stage, across reloads.
+
+    Raises:
+      :py:class:`ValueError`: If the file doesn't define valid schemes.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.generation = 0
+        self.rejections = Rejections()
+        self._lock = Lock()
+        self._reload_requested = Event()
+        self._reloader = None
+        self._matchers = {}
+        self.definitions = read_schemes(path)
+        self.schemes = self._compile(self.definitions)
+
+    def __call__(self, phrase):
+        """Whether a phrase matches any of the current schemes."""
+        return self.schemes(phrase)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ('_lock', '_reload_requested', '_reloader'):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = Lock()
+        self._reload_requested = Event()
+        self._reloader = None
+
+    @property
+    def min_words(self):
+        """The fewest words that could match any of the schemes."""
+        return self.schemes.min_words
+
+    def matches(self, phrase):
+        """The names of all of the current schemes the phrase matches."""
+        return self.schemes.matches(phrase)
+
+    def split_lines(self, phrase):
+        """Split the phrase into lines for each scheme it matches."""
+        return self.schemes.split_lines(phrase)
+
+    def reload(self):
+        """Read the schemes from the file again.
+
+        If the file is no longer valid, the current schemes are kept.
+
+        Returns:
+          :py:class:`bool`: Whether the schemes were reloaded.
+
+        """
+        try:
+            definitions = read_schemes(self.path)
+        except (OSError, ValueError) as exc:
+            logger.error('keeping the current schemes, could not read %s: %s',
+                         self.path, exc)
+            return False
+        self.update(definitions)
+        logger.info('loaded %s schemes from %s', len(self.schemes.schemes),
+                    self.path)
+        return True
+
+    def update(self, definitions, generation=None):
+        """Switch to the schemes defined.
+
+        Arguments:
+          definitions (:py:class:`dict`): The definitions to compile
+            (see :py:func:`read_schemes`).
+          generation (:py:class:`int`, optional): The generation they
+            belong to, e.g. when passed on from the process that read
+            them (defaults to the next one).
+
+        """
+        with self._lock:
+            self.schemes = self._compile(definitions)
+            self.definitions = definitions
+            self.generation = (self.generation + 1 if generation is None
+                               else generation)
+
+    def request_reload(self, *_):
+        """Wake the background thread to reload the schemes.
+
+        Accepts (and ignores) the arguments of a signal handler; it
+        takes no locks, so the signal can't interrupt (and wait for)
+        a reload in progress.
+
+        """
+        self._reload_requested.set()
+
+    def install(self, signum=getattr(signal, 'SIGHUP', None)):
+        """Reload the schemes whenever the process receives the signal."""
+        if signum is not None:
+            if self._reloader is None:
+                self._reloader = Thread(target=self._watch, name='schemes',
+                                        daemon=True)
+                self._reloader.start()
+            signal.signal(signum, self.request_reload)
+        return self
+
+    def _watch(self):
+        """Reload the schemes each time it's requested."""
+        while True:
+            self._reload_requested.wait()
+            self._reload_requested.clear()
+            self.reload()
+
+    def _compile(self, definitions):
+        """Build the scheme set, reusing the matchers already built."""
+        matchers = {}
+        schemes = {}
+        for name, (syllable_pattern, rhyming_scheme) in \
+                definitions['schemes'].items():
+            key = syllable_pattern, rhyming_scheme
+            if key not in matchers:
+                matchers[key] = self._matchers.get(key) or PhraseMatcher(
+                    syllable_pattern,
+                    rhyming_scheme,
+                    definitions['estimates'],
+                )
+            schemes[name] = matchers[key]
+        self._matchers = matchers
+        scheme_set = SchemeSet(schemes, definitions['estimates'])
+        scheme_set.rejections = self.rejections
+        return scheme_set
+
+
+def _parse_scheme(name, definition):
+    """Check a scheme's definition, returning its pattern and scheme."""
+    if not isinstance(definition, dict):
+        raise ValueError('scheme {!r} must be a mapping'.format(name))
+    unknown = set(definition) - set(FIELDS)
+    if unknown:
+        raise ValueError('unknown fields {} in scheme {!r}'.format(
+            sorted(unknown), name,
+        ))
+    syllable_pattern = definition.get('syllable_pattern')
+    if (not isinstance(syllable_pattern, list) or not syllable_pattern
+            or not all(isinstance(syllables, int) and syllables > 0
+                       and not isinstance(syllables, bool)
+                       for syllables in syllable_pattern)):
+        raise ValueError(
+            'syllable pattern of scheme {!r} must be a list of positive '
+            'integers'.format(name)
+        )
+    rhyming_scheme = definition.get('rhyming_scheme')
+    if isinstance(rhyming_scheme, str):
+        rhyming_scheme = [None if group == '-' else group
+                          for group in rhyming_scheme]
+    if rhyming_scheme is not None:
+        if (not isinstance(rhyming_scheme, list) or not all(
+                group is None or isinstance(group, (int, str))
+                for group in rhyming_scheme)):
+            raise ValueError(
+                'rhyming scheme of scheme {!r} must be a string or a list '
+                'of groups'.format(name)
+            )
+        if len(rhyming_scheme) != len(syllable_pattern):
+            raise ValueError(
+                'syllable pattern and rhyming scheme of scheme {!r} must '
+                'have same length'.format(name)
+            )
+        rhyming_scheme = tuple(rhyming_scheme)
+    return tuple(syllable_pattern), rhyming_scheme
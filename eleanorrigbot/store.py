@@ -0,0 +1,227 @@
+"""A store of word pronunciations shared between processes and restarts.
+
+The pronunciations of each word looked up (including estimates) are
+kept in an SQLite database in WAL mode, so any number of bot processes
+can read it while one at a time writes. New words are written behind,
+in batches on a background thread, and each batch also counts the
+words looked up since the last one, so the most used words can be
+loaded back into the cache when the bot starts.
+
+"""
+from contextlib import closing, contextmanager
+import logging
+import os
+import sqlite3
+from threading import Event, Lock, Thread
+from time import time
+
+from .estimate import Estimate, format_pronunciations, parse_pronunciations
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS words (
+    word TEXT PRIMARY KEY,
+    pronunciations TEXT NOT NULL,
+    estimated INTEGER NOT NULL,
+    confident INTEGER NOT NULL,
+    uses INTEGER NOT NULL DEFAULT 0,
+    seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS words_by_use ON words (uses DESC, seen DESC);
+"""
+
+_START_LOCK = Lock()
+
+
+class WordStore:  # pylint: disable=too-many-instance-attributes
+    """Write words' pronunciations behind to a shared SQLite database.
+
+    The writer thread is started by the first word recorded in each
+    process, so a store inherited by forked worker processes writes
+    from each of them.
+
+    Arguments:
+      path (:py:class:`str`): The database file.
+      load (:py:class:`callable`): Returns the
+        :py:class:`~eleanorrigbot.pronunciations.PronunciationIndex`
+        the rhyme keys are from.
+      used (:py:class:`callable`, optional): Returns the words looked
+        up since it was last called (e.g.
+        :py:meth:`~eleanorrigbot.cache.BoundedCache.take_lookups`),
+        whose use counts go up with the next write.
+      interval (:py:class:`float`, optional): The time between writes,
+        in seconds.
+      timeout (:py:class:`float`, optional): How long to wait for
+        another process's write to finish, in seconds.
+
+    """
+
+    def __init__(self, path, load, used=None, interval=5.0, timeout=10.0):
+        # pylint: disable=too-many-arguments
+        self.path = path
+        self.load = load
+        self.used = used
+        self.interval = interval
+        self.timeout = timeout
+        self._pid = None
+        self._lock = Lock()
+        self._pending = {}
+        self._stopped = Event()
+        self._thread = None
+        self._counts = dict(recorded=0, written=0, flushes=0, errors=0)
+        with self._transaction() as connection:
+            connection.executescript(SCHEMA)
+
+    def record(self, word, pronunciations):
+        """Queue the word's pronunciations to be written.
+
+        Arguments:
+          word (:py:class:`str`): The word.
+          pronunciations (:py:class:`tuple`): Its ``(syllables,
+            rhyme_key)`` pronunciations (which may be an
+            :py:class:`~eleanorrigbot.estimate.Estimate`); unknown words
+            aren't stored.
+
+        """
+        if not pronunciations:
+            return
+        if self._pid != os.getpid():
+            with _START_LOCK:
+                if self._pid != os.getpid():
+                    self.start()
+        with self._lock:
+            if word not in self._pending:
+                self._pending[word] = pronunciations
+                self._counts['recorded'] += 1
+
+    def start(self):
+        """Start writing behind on a background thread in this process."""
+        self._pid = os.getpid()
+        self._lock = Lock()
+        self._pending = {}
+        self._stopped = Event()
+        self._thread = Thread(target=self._run, name='word-store', daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        """Stop the writer thread and write any pending words."""
+        if self._thread is not None and self._pid == os.getpid():
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+            self._pid = None
+        self.flush()
+
+    def flush(self):
+        """Write the pending words and count the words looked up.
+
+        Nothing is written if no words have been looked up since the
+        last flush.
+
+        Returns:
+          :py:class:`int`: The number of new words written.
+
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        used = set(self.used() if self.used is not None else ())
+        if not pending and not used:
+            return 0
+        index = self.load()
+        now = time()
+        rows = [(
+            word,
+            '\t'.join(format_pronunciations(pronunciations, index)),
+            int(isinstance(pronunciations, Estimate)),
+            int(getattr(pronunciations, 'confident', True)),
+            now,
+        ) for word, pronunciations in pending.items()]
+        try:
+            with self._transaction() as connection:
+                written = connection.total_changes
+                connection.executemany(
+                    'INSERT OR IGNORE INTO words (word, pronunciations, '
+                    'estimated, confident, seen) VALUES (?, ?, ?, ?, ?)',
+                    rows,
+                )
+                written = connection.total_changes - written
+                connection.executemany(
+                    'UPDATE words SET uses = uses + 1, seen = ? '
+                    'WHERE word = ?',
+                    [(now, word) for word in used.union(pending)],
+                )
+        except sqlite3.Error as exc:
+            logger.warning('could not write to word store %s: %s',
+                           self.path, exc)
+            with self._lock:
+                self._counts['errors'] += 1
+                for word, pronunciations in pending.items():
+                    self._pending.setdefault(word, pronunciations)
+            return 0
+        with self._lock:
+            self._counts['written'] += written
+            self._counts['flushes'] += 1
+        return written
+
+    def most_used(self, limit):
+        """The most used words in the store.
+
+        Arguments:
+          limit (:py:class:`int`): The most words to return.
+
+        Returns:
+          :py:class:`list`: The ``(word, pronunciations, estimated,
+            confident)`` rows, most used first, where the pronunciations
+            are ``(syllables, rhyming_part)`` pairs.
+
+        """
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                'SELECT word, pronunciations, estimated, confident '
+                'FROM words ORDER BY uses DESC, seen DESC LIMIT ?',
+                (limit,),
+            ).fetchall()
+        words = []
+        for word, pronunciations, estimated, confident in rows:
+            try:
+                pronunciations = parse_pronunciations(pronunciations.split('\t'))
+            except ValueError:
+                logger.warning('skipping invalid word %r in store', word)
+                continue
+            words.append((word, pronunciations, bool(estimated),
+                          bool(confident)))
+        return words
+
+    def stats(self):
+        """The store's metrics.
+
+        Returns:
+          :py:class:`dict`: The number of words waiting to be written,
+            recorded, written (i.e. new to the store), the number of
+            writes and the number of failed writes.
+
+        """
+        with self._lock:
+            return dict(pending=len(self._pending), **self._counts)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=self.timeout)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        """A connection that's committed (or rolled back) and closed."""
+        with closing(self._connect()) as connection:
+            with connection:
+                yield connection
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('word store writer failed')
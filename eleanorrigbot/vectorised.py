@@ -0,0 +1,376 @@
+"""Matching batches of phrases with NumPy array operations."""
+from itertools import chain, combinations
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+MAX_MASK_SYLLABLES = 62
+"""The most syllables a scheme can have to be checked with bit masks."""
+
+
+def word_arrays(pronunciations):
+    """Gather the words' syllable counts and rhyme keys into arrays.
+
+    Arguments:
+      pronunciations (:py:class:`iterable`): The pronunciations of each
+        word, in id order.
+
+    Returns:
+      :py:class:`tuple`: The fewest and most syllables of each word
+        (``-1`` for unknown words), its distinct rhyme keys (one row per
+        word, padded with ``-1``) and the set of its syllable counts as
+        a bit mask (up to :py:data:`MAX_MASK_SYLLABLES`).
+
+    """
+    fewest, most, keys, masks = [], [], [], []
+    for options in pronunciations:
+        if options:
+            fewest.append(min(options)[0])
+            most.append(max(options)[0])
+            keys.append(sorted({key for _, key in options}))
+            masks.append(sum({1 << syllables for syllables, _ in options
+                              if syllables <= MAX_MASK_SYLLABLES}))
+        else:
+            fewest.append(-1)
+            most.append(-1)
+            keys.append([])
+            masks.append(0)
+    key_table = numpy.full((len(keys), max(map(len, keys), default=1) or 1),
+                           -1, dtype=numpy.int64)
+    for index, word_keys in enumerate(keys):
+        key_table[index, :len(word_keys)] = word_keys
+    return (numpy.array(fewest, dtype=numpy.int64),
+            numpy.array(most, dtype=numpy.int64),
+            key_table,
+            numpy.array(masks, dtype=numpy.int64))
+
+
+class BatchMatchingMixin:  # pylint: disable=too-few-public-methods
+    """Add :py:meth:`match_many` to a phrase matcher.
+
+    The matcher provides the scheme (``total_syllables``, ``min_words``,
+    ``rhyming_lines`` and the line ``_boundaries``), its ``rejections``,
+    :py:meth:`match_lines` and ``_trusted_pronunciations`` to look up
+    each word, and is called to match phrases one at a time without
+    NumPy; see :py:class:`~eleanorrigbot.classify.PhraseMatcher`.
+
+    """
+
+    def match_many(self, phrases):
+        """Whether each of a batch of phrases matches the scheme.
+
+        With NumPy installed, the words of the whole batch are mapped to
+        integer ids (so each distinct word is only looked up once) and
+        their syllable counts and rhyme keys gathered into arrays. The
+        syllable totals are checked per phrase and, where each word has
+        a single syllable count, the line boundaries (from prefix sums)
+        and rhymes (from the line-ending words' keys) too, all with
+        vectorised operations. Only phrases needing alternate
+        pronunciations go through :py:meth:`match_lines`. Without
+        NumPy, each phrase is matched in turn.
+
+        Arguments:
+          phrases (:py:class:`list`): The phrases to test, as strings
+            or lists of words.
+
+        Returns:
+          :py:class:`list`: Whether each phrase matches the scheme.
+
+        """
+        if numpy is None:
+            return [self(phrase)  # pylint: disable=not-callable
+                    for phrase in phrases]
+        batch = []
+        for phrase in phrases:
+            if not isinstance(phrase, str):
+                batch.append(list(phrase))
+            elif (len(phrase) < 2 * self.min_words - 1
+                  or phrase.count(' ') + 1 < self.min_words):
+                batch.append([])  # too short, as in analyse_phrase
+            else:
+                batch.append(phrase.split())
+        results = [False] * len(batch)
+        matched, undecided, lookup = self._vectorised_match(batch)
+        for index in matched:
+            results[index] = True
+        for index in undecided:
+            words = batch[index]
+            pronunciations = [lookup[word] for word in words]
+            if self.match_lines(words, pronunciations) is not None:
+                results[index] = True
+                matched.append(index)
+            else:
+                self.rejections.add('structure')
+        self.rejections.add('matched', len(matched))
+        return results
+
+    def _vectorised_match(self, batch):
+        """Match as much of the batch as possible with array operations.
+
+        Arguments:
+          batch (:py:class:`list`): The phrases, as lists of words.
+
+        Returns:
+          :py:class:`tuple`: The indices of the phrases that matched,
+            the indices of the phrases that need to be checked with
+            :py:meth:`match_lines`, and the map of words in the batch to
+            their pronunciations.
+
+        """
+        # pylint: disable=too-many-locals
+        flat = list(chain.from_iterable(batch))
+        if not flat:
+            self.rejections.add('length', len(batch))
+            return [], [], {}
+        lookup = {word: self._trusted_pronunciations(word)
+                  for word in dict.fromkeys(flat)}
+        ids = numpy.fromiter(
+            map({word: index for index, word in enumerate(lookup)}.__getitem__,
+                flat),
+            dtype=numpy.int64,
+            count=len(flat),
+        )
+        fewest_by_id, most_by_id, keys_by_id, mask_by_id = word_arrays(
+            lookup.values(),
+        )
+        # which syllable count a word ends a line with can limit the
+        # rhyme keys it has there, so that's left to match_lines
+        ambiguous_by_id = ((fewest_by_id != most_by_id)
+                           & (keys_by_id[:, 1:] >= 0).any(axis=1))
+        rhyme_keys = keys_by_id, ambiguous_by_id
+
+        lengths = numpy.fromiter(map(len, batch), dtype=numpy.int64,
+                                 count=len(batch))
+        ends = numpy.cumsum(lengths)
+        starts = ends - lengths
+        long_enough = (lengths >= self.min_words) & (lengths > 0)
+        # reduceat needs strictly increasing indices, so reduce over the
+        # non-empty phrases only (empty phrases are never long enough)
+        nonempty = numpy.flatnonzero(lengths)
+
+        def per_phrase(ufunc, values, dtype):
+            result = numpy.zeros(len(batch), dtype=dtype)
+            result[nonempty] = ufunc.reduceat(values[ids], starts[nonempty])
+            return result
+
+        fewest = per_phrase(numpy.add, fewest_by_id, numpy.int64)
+        most = per_phrase(numpy.add, most_by_id, numpy.int64)
+        silent = per_phrase(numpy.logical_or, fewest_by_id == 0, bool)
+        # unknown words count as silent so that the sums never decrease
+        prefix = numpy.cumsum(numpy.maximum(fewest_by_id, 0)[ids])
+        bases = numpy.concatenate(([0], prefix))[starts]
+
+        # as in analyse_phrase, a phrase is rejected at whichever comes
+        # first: an unknown word, or too many syllables to fit
+        total = self.total_syllables
+        positions = numpy.arange(len(flat))
+        first_unknown = numpy.full(len(batch), len(flat), dtype=numpy.int64)
+        first_over = first_unknown.copy()
+        first_unknown[nonempty] = numpy.minimum.reduceat(
+            numpy.where(fewest_by_id[ids] < 0, positions, len(flat)),
+            starts[nonempty],
+        )
+        first_over[nonempty] = numpy.minimum.reduceat(
+            numpy.where(prefix - numpy.repeat(bases, lengths) > total,
+                        positions, len(flat)),
+            starts[nonempty],
+        )
+        unknown = long_enough & (first_unknown < first_over)
+        in_range = (long_enough & (first_unknown == len(flat))
+                    & (fewest <= total) & (total <= most))
+        self.rejections.add('length', int((~long_enough).sum()))
+        self.rejections.add('unknown', int(unknown.sum()))
+        self.rejections.add('syllables', int(
+            (long_enough & ~unknown & ~in_range).sum()
+        ))
+
+        # where every word has one syllable count (and none is silent,
+        # so could also end a line), each line must end exactly where
+        # the prefix sums of syllables reach the line's boundary
+        exact = in_range & (fewest == most) & ~silent
+        undecided = numpy.flatnonzero(in_range & ~exact)
+        matched = []
+        if undecided.size and total <= MAX_MASK_SYLLABLES:
+            matched, undecided = self._match_splits(
+                undecided, mask_by_id, ids, starts, lengths, rhyme_keys,
+            )
+        undecided = undecided.tolist()
+        exact_indices = numpy.flatnonzero(exact)
+        if not exact_indices.size:
+            return matched, undecided, lookup
+        base = bases[exact_indices]
+        targets = base[:, None] + numpy.array(self._boundaries)[None, :]
+        line_ends = numpy.searchsorted(prefix, targets)
+        structured = (
+            (line_ends < ends[exact_indices][:, None])
+            & (prefix[numpy.minimum(line_ends, len(prefix) - 1)] == targets)
+        ).all(axis=1)
+        self.rejections.add('structure', int((~structured).sum()))
+
+        end_ids = ids[line_ends[structured]]
+        rhymed, unknown_rhymes = self._vectorised_rhymes(end_ids, *rhyme_keys)
+        structured_indices = exact_indices[structured]
+        self.rejections.add('structure',
+                            int((~rhymed & ~unknown_rhymes).sum()))
+        undecided.extend(structured_indices[unknown_rhymes].tolist())
+        return (matched + structured_indices[rhymed].tolist(), undecided,
+                lookup)
+
+    def _match_splits(self, indices, mask_by_id, ids, starts, lengths,
+                      rhyme_keys):
+        """Match phrases with words that have several syllable counts.
+
+        Phrases that can't be split on the line boundaries are rejected
+        and, where each rhyming line can only end on one word, rhymes
+        are checked with array operations; the rest are left for
+        :py:meth:`match_lines`.
+
+        Returns:
+          :py:class:`tuple`: The indices of the phrases that matched,
+            and the indices of those still to be checked.
+
+        """
+        # pylint: disable=too-many-arguments
+        possible, ends = self._vectorised_splits(
+            mask_by_id[ids], starts[indices], lengths[indices],
+        )
+        self.rejections.add('structure', int((~possible).sum()))
+        decided = possible & (ends[:, self._checked_lines()] >= 0).all(axis=1)
+        end_ids = ids[numpy.maximum(ends[decided], 0)]
+        rhymed, ambiguous = self._vectorised_rhymes(end_ids, *rhyme_keys)
+        decided_indices = indices[decided]
+        self.rejections.add('structure', int((~rhymed & ~ambiguous).sum()))
+        return (decided_indices[rhymed].tolist(),
+                numpy.concatenate((indices[possible & ~decided],
+                                   decided_indices[ambiguous])))
+
+    def _vectorised_splits(self, masks, starts, lengths):
+        """Find where phrases with several syllable counts can split.
+
+        The syllable counts each phrase can reach before each word are
+        tracked as a bit mask (a word moving every count on by each of
+        its syllable counts, unless that would cross a line boundary),
+        and likewise the counts from which the rest of the phrase can
+        end on the last boundary, so all of the phrases are stepped
+        through their words together. A word can end a line if some
+        split reaching it ends the line on it and carries on to the
+        end.
+
+        Arguments:
+          masks (:py:class:`numpy.ndarray`): The syllable count masks
+            of all of the words in the batch.
+          starts (:py:class:`numpy.ndarray`): The index of the first
+            word of each phrase to check.
+          lengths (:py:class:`numpy.ndarray`): The number of words in
+            each phrase to check.
+
+        Returns:
+          :py:class:`tuple`: Whether each phrase can be split into
+            lines, and the index of the word ending each line in a
+            rhyming group (``-1`` where several words could end it, or
+            for lines not in a group).
+
+        """
+        # pylint: disable=too-many-locals
+        total = self.total_syllables
+        everything = (1 << (total + 1)) - 1
+        # the counts from which a word would cross a boundary; nothing
+        # (not even a silent word) can follow the end of the last line
+        crossing = [1 << total] + [
+            sum(1 << count for count in range(total)
+                if any(count < boundary < count + syllables
+                       for boundary in self._boundaries))
+            for syllables in range(1, total + 1)
+        ]
+        counts = [syllables for syllables in range(total + 1)
+                  if (masks >> syllables & 1).any()]
+        longest = int(lengths.max())
+        active = [position < lengths for position in range(longest)]
+        options = [masks[numpy.where(active[position], starts + position, 0)]
+                   for position in range(longest)]
+        before = [numpy.ones(len(starts), dtype=numpy.int64)]
+        for position in range(longest):
+            step = numpy.zeros_like(before[-1])
+            for syllables in counts:
+                moved = ((before[-1] & ~crossing[syllables]) << syllables
+                         & everything)
+                step |= numpy.where(options[position] >> syllables & 1,
+                                    moved, 0)
+            before.append(numpy.where(active[position], step, before[-1]))
+        possible = (before[-1] >> total & 1).astype(bool)
+
+        # the counts after each word from which the phrase can finish
+        after = [numpy.full(len(starts), 1 << total, dtype=numpy.int64)]
+        for position in reversed(range(1, longest)):
+            step = numpy.zeros_like(after[0])
+            for syllables in counts:
+                moved = (after[0] >> syllables) & ~crossing[syllables]
+                step |= numpy.where(options[position] >> syllables & 1,
+                                    moved, 0)
+            after.insert(0, numpy.where(active[position], step, after[0]))
+
+        ends = numpy.full((len(starts), len(self._boundaries)), -1,
+                          dtype=numpy.int64)
+        for line in self._checked_lines():
+            boundary = self._boundaries[line]
+            candidates = numpy.zeros(len(starts), dtype=numpy.int64)
+            for position in range(longest):
+                ending = numpy.zeros(len(starts), dtype=bool)
+                for syllables in counts:
+                    if not 0 < syllables <= boundary:
+                        continue
+                    ending |= (
+                        (options[position] >> syllables & 1).astype(bool)
+                        & (before[position] & ~crossing[syllables])
+                        >> (boundary - syllables) & 1
+                    ).astype(bool)
+                ending &= (after[position] >> boundary & 1).astype(bool)
+                ending &= active[position]
+                candidates += ending
+                ends[ending, line] = starts[ending] + position
+            ends[candidates != 1, line] = -1
+        return possible, ends
+
+    def _checked_lines(self):
+        """The lines whose ending words must rhyme with another's."""
+        return [line for lines in (self.rhyming_lines or {}).values()
+                if len(lines) >= 2 for line in lines]
+
+    def _vectorised_rhymes(self, end_ids, keys_by_id, ambiguous_by_id):
+        """Check the rhyming groups of phrases' line-ending words.
+
+        The words in a group rhyme if they're distinct and have a rhyme
+        key in common, as in :py:meth:`match_lines`.
+
+        Arguments:
+          end_ids (:py:class:`numpy.ndarray`): The ids of the words
+            ending each line (one row per phrase).
+          keys_by_id (:py:class:`numpy.ndarray`): The rhyme keys of
+            each word (one row per word, padded with ``-1``).
+          ambiguous_by_id (:py:class:`numpy.ndarray`): Whether each
+            word's rhyme keys depend on its syllable count.
+
+        Returns:
+          :py:class:`tuple`: Whether each phrase rhymes, and whether
+            each phrase has a line-ending word whose rhyme keys depend
+            on how the phrase is split (so couldn't be checked).
+
+        """
+        rhymed = numpy.ones(len(end_ids), dtype=bool)
+        ambiguous = numpy.zeros(len(end_ids), dtype=bool)
+        for lines in (self.rhyming_lines or {}).values():
+            if len(lines) < 2:
+                continue
+            group_ids = end_ids[:, lines]
+            ambiguous |= ambiguous_by_id[group_ids].any(axis=1)
+            keys = keys_by_id[group_ids]
+            common = keys[:, 0, :] >= 0
+            for other in range(1, len(lines)):
+                common &= (keys[:, 0, :, None]
+                           == keys[:, other, None, :]).any(axis=2)
+            rhymed &= common.any(axis=1)
+            for first, second in combinations(range(len(lines)), 2):
+                rhymed &= group_ids[:, first] != group_ids[:, second]
+        return rhymed & ~ambiguous, ambiguous
@@ -1,9 +1,18 @@
 #!/usr/bin/env python
 """Configure logging and start the process."""
+import asyncio
 import logging
 import sys
 
-from eleanorrigbot import parse_args, start_listening
+from eleanorrigbot import ELEANOR_RIGBY, parse_args, start_listening
+from eleanorrigbot.classify import (
+    configure_cache,
+    configure_estimator,
+    configure_store,
+)
+from eleanorrigbot.metrics import serve
+from eleanorrigbot.profiling import configure as configure_profiling
+from eleanorrigbot.schemes import SchemeFile
 
 
 if __name__ == '__main__':
@@ -16,4 +25,37 @@ if __name__ == '__main__':
         stream=sys.stdout,
     )
 
-    start_listening(location=ARGS.location)
+    configure_cache(maxsize=ARGS.cache_size, policy=ARGS.cache_policy)
+    if ARGS.estimate_unknown or ARGS.estimates_file:
+        configure_estimator(ARGS.estimates_file)
+    if ARGS.word_store:
+        configure_store(ARGS.word_store)
+    configure_profiling()
+    FILTERER = (
+        SchemeFile(ARGS.schemes).install() if ARGS.schemes else ELEANOR_RIGBY
+    )
+
+    if ARGS.metrics_port is not None:
+        serve(ARGS.metrics_port)
+
+    if ARGS.asyncio:
+        from eleanorrigbot import aio
+        asyncio.run(aio.start_listening(
+            locations=ARGS.locations,
+            filterer=FILTERER,
+            workers=ARGS.workers,
+            processes=ARGS.processes,
+            batch_size=ARGS.batch_size,
+            maxsize=ARGS.queue_size,
+            drop_policy=ARGS.drop_policy,
+        ))
+    else:
+        start_listening(
+            locations=ARGS.locations,
+            filterer=FILTERER,
+            workers=ARGS.workers,
+            processes=ARGS.processes,
+            batch_size=ARGS.batch_size,
+            maxsize=ARGS.queue_size,
+            drop_policy=ARGS.drop_policy,
+        )
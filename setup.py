@@ -1,6 +1,10 @@
+from distutils.errors import DistutilsError
+import importlib.util
 import io
 import os
 from setuptools import setup
+from setuptools.command.build_py import build_py
+from setuptools.command.develop import develop
 from setuptools.command.test import test as TestCommand
 import sys
 
@@ -20,6 +24,46 @@ def read(*filenames, **kwargs):
 long_description = read('README.rst')
 
 
+def build_pronunciation_index(package_dir):
+    """Prebuild the pronunciation snapshot so startup is fast.
+
+    Only the pronunciations module is loaded (not the package, which
+    would need tweepy and the rest of the runtime requirements), but
+    building the index needs pronouncing.
+
+    """
+    spec = importlib.util.spec_from_file_location(
+        'eleanorrigbot_pronunciations',
+        os.path.join(here, 'eleanorrigbot', 'pronunciations.py'),
+    )
+    pronunciations = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(pronunciations)
+    try:
+        pronunciations.build_index(
+            os.path.join(package_dir, 'pronunciations.idx'),
+        )
+    except Exception as exc:
+        raise DistutilsError(
+            'could not build the pronunciation index: {}'.format(exc),
+        )
+
+
+class BuildPy(build_py):
+
+    def run(self):
+        build_py.run(self)
+        if not self.dry_run:
+            build_pronunciation_index(os.path.join(self.build_lib, 'eleanorrigbot'))
+
+
+class Develop(develop):
+
+    def run(self):
+        develop.run(self)
+        if not self.dry_run:
+            build_pronunciation_index(os.path.join(here, 'eleanorrigbot'))
+
+
 class PyTest(TestCommand):
 
     def finalize_options(self):
@@ -47,8 +91,20 @@ setup(
         'Topic :: Communications :: Chat',
         'Topic :: Text Processing :: Linguistic',
     ],
-    cmdclass={'test': PyTest},
+    cmdclass={'build_py': BuildPy, 'develop': Develop, 'test': PyTest},
     description='The code powering @eleanorrigbot',
+    entry_points={
+        'console_scripts': [
+            'rigbot-replay = eleanorrigbot.replay:main',
+            'rigbot-scan = eleanorrigbot.scan:main',
+        ],
+    },
+    extras_require={
+        'async': ['aiohttp'],
+        'batch': ['numpy'],
+        'toml': ['toml'],
+        'yaml': ['PyYAML'],
+    },
     install_requires=['pronouncing', 'tweepy'],
     license='License :: OSI Approved :: ISC License (ISCL)',
     long_description=long_description,
@@ -0,0 +1,232 @@
+# pylint: disable=wrong-import-position
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+from threading import Event
+from unittest.mock import Mock
+
+import pytest
+from tweepy import OAuthHandler
+from tweepy.models import Status
+
+aiohttp = pytest.importorskip('aiohttp')
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from eleanorrigbot import PhraseMatcher
+from eleanorrigbot.aio import (
+    AsyncProcessClassifier,
+    AsyncRetweeter,
+    AsyncRetweetListener,
+    AsyncStream,
+)
+from eleanorrigbot.listen import MATCH_TIME, LocationCounts
+from eleanorrigbot.reconnect import ReconnectScheduler
+
+STATUSES = [
+    dict(id=1, text='a match', user=dict(screen_name='EleanorRigby')),
+    dict(id=2, text='no thanks', user=dict(screen_name='FatherMcKenzie')),
+    dict(delete=dict(status=dict(id=3))),
+    dict(id=4, text='another match', user=dict(screen_name='EleanorRigby')),
+]
+
+
+class FakeTwitter:
+    """Streams the statuses then hangs up, and records retweets."""
+
+    def __init__(self, failures=()):
+        self.connections = 0
+        self.retweets = []
+        self.failures = list(failures)
+        self.app = web.Application()
+        self.app.router.add_post('/stream', self.stream)
+        self.app.router.add_post('/retweet/{id}', self.retweet)
+
+    async def stream(self, request):
+        assert 'oauth_signature' in request.headers['Authorization']
+        assert (await request.post())['locations'] == '1,2,3,4'
+        self.connections += 1
+        response = web.StreamResponse()
+        await response.prepare(request)
+        for status in STATUSES:
+            await response.write(json.dumps(status).encode() + b'\r\n')
+        await response.write(b'\r\n')
+        return response
+
+    async def retweet(self, request):
+        status_id = int(request.match_info['id'])
+        if status_id in self.failures:
+            self.failures.remove(status_id)
+            return web.Response(status=503)
+        self.retweets.append(status_id)
+        return web.json_response(dict(id=status_id))
+
+
+def _auth():
+    auth = OAuthHandler('key', 'secret')
+    auth.set_access_token('token', 'token secret')
+    return auth
+
+
+async def _listen(twitter, until):
+    async with TestServer(twitter.app) as server, \
+            aiohttp.ClientSession() as session:
+        retweeter = AsyncRetweeter(
+            session,
+            _auth(),
+            rate=1000,
+            backoff=0.01,
+            url=str(server.make_url('/retweet/')) + '{}',
+        )
+        listener = AsyncRetweetListener(
+            retweeter,
+            str.split,
+            lambda words: 'match' in words,
+        )
+        stream = AsyncStream(
+            session,
+            _auth(),
+            listener,
+            ReconnectScheduler(jitter=0),
+            url=str(server.make_url('/stream')),
+        )
+        task = asyncio.ensure_future(stream.filter([1, 2, 3, 4]))
+        for _ in range(100):
+            if until(twitter, retweeter):
+                break
+            await asyncio.sleep(0.02)
+        task.cancel()
+        await listener.join()
+        await retweeter.join()
+        return retweeter.stats()
+
+
+def test_streamed_matches_are_retweeted_once():
+    twitter = FakeTwitter()
+    stats = asyncio.run(_listen(
+        twitter,
+        lambda twitter, _: twitter.connections >= 2,
+    ))
+    assert sorted(twitter.retweets) == [1, 4]
+    assert stats['made'] == 2
+    assert stats['duplicates'] >= 1
+
+
+def test_failed_retweets_are_retried():
+    twitter = FakeTwitter(failures=[4, 4])
+    stats = asyncio.run(_listen(
+        twitter,
+        lambda _, retweeter: retweeter.stats()['made'] == 2,
+    ))
+    assert sorted(twitter.retweets) == [1, 4]
+    assert stats['retried'] == 2
+
+
+def test_listener_counts_locations():
+    locations = LocationCounts([[1, 2, 3, 4], [5, 6, 7, 8]])
+    retweeter = Mock()
+    listener = AsyncRetweetListener(
+        retweeter,
+        str.split,
+        lambda words: 'match' in words,
+        locations=locations,
+    )
+
+    async def listen():
+        for id_, text, point in [(1, 'a match', [2, 3]),
+                                 (2, 'no thanks', [2, 3]),
+                                 (4, 'another match', [6, 7])]:
+            listener.on_status(Status.parse(None, dict(
+                id=id_,
+                text=text,
+                user=dict(screen_name='EleanorRigby'),
+                coordinates=dict(type='Point', coordinates=point),
+            )))
+        await listener.join()
+
+    asyncio.run(listen())
+    assert [locations.stats(name) for name in locations.names] == [
+        dict(statuses=2, matches=1),
+        dict(statuses=1, matches=1),
+    ]
+    assert listener.stats() == dict(statuses=3, matches=2, dropped=0)
+
+
+def _status(id_, text):
+    return Status.parse(None, dict(
+        id=id_,
+        text=text,
+        user=dict(screen_name='EleanorRigby'),
+    ))
+
+
+@pytest.mark.parametrize('drop_policy, retweeted', [
+    ('newest', [1]),
+    ('oldest', [4]),
+])
+def test_listener_drops_when_full(drop_policy, retweeted):
+    release = Event()
+    retweeter = Mock()
+    listener = AsyncRetweetListener(
+        retweeter,
+        str.split,
+        lambda words: release.wait(5) and 'match' in words,
+        ThreadPoolExecutor(1),
+        maxsize=1,
+        drop_policy=drop_policy,
+    )
+
+    async def listen():
+        for id_ in [1, 2, 4]:
+            listener.on_status(_status(id_, 'a match'))
+            await asyncio.sleep(0)
+        release.set()
+        await listener.join()
+
+    asyncio.run(listen())
+    assert [call[0][0] for call in retweeter.submit.call_args_list] == retweeted
+    assert listener.stats() == dict(statuses=3, matches=1, dropped=2)
+
+
+def test_listener_blocks_when_full():
+    release = Event()
+    listener = AsyncRetweetListener(
+        Mock(),
+        str.split,
+        lambda words: release.wait(5) and 'match' in words,
+        ThreadPoolExecutor(1),
+        maxsize=1,
+        drop_policy='block',
+    )
+
+    async def listen():
+        listener.on_status(_status(1, 'a match'))
+        space = asyncio.ensure_future(listener.space())
+        await asyncio.sleep(0.05)
+        assert not space.done()
+        release.set()
+        await asyncio.wait_for(space, 5)
+        await listener.join()
+
+    asyncio.run(listen())
+    assert listener.stats() == dict(statuses=1, matches=1, dropped=0)
+
+
+def test_process_classifier_batches_and_reports_metrics():
+    matcher = PhraseMatcher((2, 2))
+    matched = MATCH_TIME.snapshot()[0]
+
+    async def classify():
+        classifier = AsyncProcessClassifier(matcher, processes=1,
+                                            batch_size=3).start()
+        try:
+            return await asyncio.wait_for(asyncio.gather(*(
+                classifier.classify(phrase)
+                for phrase in ['hello hello', 'hello world', 'hello']
+            )), 10)
+        finally:
+            classifier.shutdown()
+
+    assert asyncio.run(classify()) == [True, False, False]
+    assert +matcher.rejections == dict(matched=1, syllables=2)
+    assert sum(MATCH_TIME.snapshot()[0]) - sum(matched) == 3
@@ -6,7 +6,23 @@ import pytest
 from eleanorrigbot import parse_args
 
 
-DEFAULTS = dict(location=[-3.0087, 53.3261, -2.8180, 53.4751], log_level=INFO)
+DEFAULTS = dict(
+    asyncio=False,
+    batch_size=20,
+    cache_policy='lru',
+    cache_size=4096,
+    drop_policy='newest',
+    estimate_unknown=False,
+    estimates_file=None,
+    locations=[[-3.0087, 53.3261, -2.8180, 53.4751]],
+    log_level=INFO,
+    metrics_port=None,
+    processes=0,
+    queue_size=1000,
+    schemes=None,
+    word_store=None,
+    workers=0,
+)
 
 
 def build_namespace(**kwargs):
@@ -19,15 +35,44 @@ def build_namespace(**kwargs):
     ([], build_namespace()),
     (['-v'], build_namespace(log_level=DEBUG)),
     (['--verbose'], build_namespace(log_level=DEBUG)),
-    (['-l', '1', '2', '3', '4'], build_namespace(location=[1, 2, 3, 4])),
+    (['-l', '1', '2', '3', '4'], build_namespace(locations=[[1, 2, 3, 4]])),
     (
             ['--location', '1', '2', '3', '4'],
-            build_namespace(location=[1, 2, 3, 4]),
+            build_namespace(locations=[[1, 2, 3, 4]]),
     ),
     (
         ['--verbose', '-l', '1.23', '4.56', '7.89', '10.00'],
-        build_namespace(location=[1.23, 4.56, 7.89, 10.0], log_level=DEBUG)
-    )
+        build_namespace(locations=[[1.23, 4.56, 7.89, 10.0]], log_level=DEBUG)
+    ),
+    (
+        ['--cache-size', '100', '--cache-policy', 'lfu'],
+        build_namespace(cache_size=100, cache_policy='lfu'),
+    ),
+    (
+        ['--workers', '4', '--queue-size', '10', '--drop-policy', 'oldest'],
+        build_namespace(workers=4, queue_size=10, drop_policy='oldest'),
+    ),
+    (
+        ['--processes', '4', '--batch-size', '50'],
+        build_namespace(processes=4, batch_size=50),
+    ),
+    (
+        ['--workers', '0', '--processes', '0', '--queue-size', '0'],
+        build_namespace(queue_size=0),
+    ),
+    (['--asyncio'], build_namespace(asyncio=True)),
+    (['--estimate-unknown'], build_namespace(estimate_unknown=True)),
+    (['--word-store', 'words.db'], build_namespace(word_store='words.db')),
+    (['--schemes', 'schemes.yml'], build_namespace(schemes='schemes.yml')),
+    (
+        ['--estimates-file', 'estimates.tsv'],
+        build_namespace(estimates_file='estimates.tsv'),
+    ),
+    (['--metrics-port', '9100'], build_namespace(metrics_port=9100)),
+    (
+        ['-l', '1', '2', '3', '4', '-l', '5', '6', '7', '8'],
+        build_namespace(locations=[[1, 2, 3, 4], [5, 6, 7, 8]]),
+    ),
 ])
 def test_arg_parsing(args, namespace):
     assert(parse_args(args)) == namespace
@@ -42,8 +87,32 @@ def test_arg_version():
 @pytest.mark.parametrize('args', [
     ['-l', '1', '2', '3'],
     ['-l', 'foo', 'bar', 'baz', 'bang'],
+    ['--cache-policy', 'fifo'],
+    ['--cache-size', '0'],
+    ['--cache-size', 'many'],
+    ['--workers', '-1'],
+    ['--processes', 'two'],
+    ['--batch-size', '0'],
+    ['--queue-size', '-5'],
 ])
 def test_parse_failure(args):
     with pytest.raises(SystemExit) as exc:
         parse_args(args)
     assert exc.value.code == 2
+
+
+def test_locations_file(tmpdir):
+    path = tmpdir.join('locations.txt')
+    path.write('# liverpool\n-3.0087, 53.3261, -2.8180, 53.4751\n\n1 2 3 4\n')
+    args = parse_args(['-l', '5', '6', '7', '8', '--locations-file', str(path)])
+    assert args.locations == [
+        [5, 6, 7, 8], [-3.0087, 53.3261, -2.8180, 53.4751], [1, 2, 3, 4],
+    ]
+
+
+def test_invalid_locations_file(tmpdir):
+    path = tmpdir.join('locations.txt')
+    path.write('1 2 3\n')
+    with pytest.raises(SystemExit) as exc:
+        parse_args(['--locations-file', str(path)])
+    assert exc.value.code == 2
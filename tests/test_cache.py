@@ -0,0 +1,104 @@
+from unittest.mock import Mock
+
+import pytest
+
+from eleanorrigbot.cache import BoundedCache
+
+
+@pytest.fixture
+def function():
+    return Mock(side_effect=str.upper)
+
+
+def test_memoization(function):
+    cache = BoundedCache(function)
+    assert cache('foo') == 'FOO'
+    assert cache('foo') == 'FOO'
+    function.assert_called_once_with('foo')
+    assert cache.stats() == dict(
+        policy='lru',
+        size=1,
+        maxsize=4096,
+        hits=1,
+        misses=1,
+        evictions=0,
+        hit_rate=0.5,
+    )
+
+
+def test_lru_eviction(function):
+    cache = BoundedCache(function, maxsize=2)
+    cache('foo')
+    cache('bar')
+    cache('foo')
+    cache('baz')  # evicts 'bar'
+    cache('foo')
+    cache('bar')
+    assert function.call_count == 4
+    assert cache.evictions == 2
+    assert len(cache) == 2
+
+
+def test_lfu_eviction(function):
+    cache = BoundedCache(function, maxsize=2, policy='lfu')
+    cache('foo')
+    cache('foo')
+    cache('bar')
+    cache('baz')  # evicts 'bar', the least frequently used
+    cache('foo')
+    assert function.call_count == 3
+    cache('bar')  # evicts 'baz'
+    cache('baz')
+    assert function.call_count == 5
+    assert cache.evictions == 3
+
+
+def test_clear(function):
+    cache = BoundedCache(function)
+    cache('foo')
+    cache.clear()
+    cache('foo')
+    assert function.call_count == 2
+    assert cache.misses == 1
+
+
+@pytest.mark.parametrize('kwargs', [dict(policy='fifo'), dict(maxsize=0)])
+def test_validation(function, kwargs):
+    with pytest.raises(ValueError):
+        BoundedCache(function, **kwargs)
+
+
+@pytest.mark.parametrize('policy', ['lru', 'lfu'])
+def test_warming(function, policy):
+    cache = BoundedCache(function, maxsize=2, policy=policy)
+    cache.put('foo', 'warm')
+    cache.put('bar', 'warm')
+    cache.put('foo', 'ignored')
+    assert cache('foo') == 'warm'
+    assert sorted(cache.keys()) == ['bar', 'foo']
+    cache.put('baz', 'warm')
+    assert cache.evictions == 1
+    assert len(cache) == 2
+    function.assert_not_called()
+
+
+def test_take_lookups(function):
+    cache = BoundedCache(function).track_lookups()
+    cache.put('warm', 'WARM')
+    cache('foo')
+    cache('foo')
+    cache('bar')
+    assert cache.take_lookups() == {'foo', 'bar'}
+    assert cache.take_lookups() == set()
+    cache('warm')
+    assert cache.take_lookups() == {'warm'}
+
+
+def test_lookups_not_kept_unless_tracked(function):
+    cache = BoundedCache(function, maxsize=10)
+    for index in range(1000):
+        cache(str(index))
+    assert cache.take_lookups() == set()
+    cache.track_lookups()
+    cache('foo')
+    assert cache.take_lookups() == {'foo'}
@@ -1,8 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
+import pickle
+import random
 from unittest.mock import patch
 
 import pytest
 
-from eleanorrigbot import ELEANOR_RIGBY, PhraseMatcher
+from eleanorrigbot import ELEANOR_RIGBY, PhraseMatcher, SchemeSet
+from eleanorrigbot.cache import BoundedCache
+from eleanorrigbot.classify import (
+    get_pronunciations,
+    lookup_pronunciations,
+    trusted,
+)
+from eleanorrigbot.estimate import Estimate, Estimator
+from eleanorrigbot.extract import iter_words
 
 
 @pytest.mark.parametrize('input_, output', [
@@ -44,18 +55,19 @@ def test_logging(mock_logger):
             'the sky final goodbye')
     ELEANOR_RIGBY(text)
     mock_logger.debug.assert_called_once_with(
-        'processing %s-syllable tweet: %r',
-        22,
+        'processing %s-word tweet: %r',
+        17,
         [
-            ('over', 2), ('wing', 1), ('exit', 2), ('leaving', 2), ('the', 1),
-            ('plane', 1), ('as', 1), ('it', 1), ('falls', 1), ('like', 1),
-            ('a', 1), ('stone', 1), ('from', 1), ('the', 1), ('sky', 1),
-            ('final', 2), ('goodbye', 2),
+            ('over', (2,)), ('wing', (1,)), ('exit', (2,)), ('leaving', (2,)),
+            ('the', (1,)), ('plane', (1,)), ('as', (1,)), ('it', (1,)),
+            ('falls', (1,)), ('like', (1,)), ('a', (1,)), ('stone', (1,)),
+            ('from', (1,)), ('the', (1,)), ('sky', (1,)), ('final', (2,)),
+            ('goodbye', (2,)),
         ]
     )
 
     mock_logger.info.assert_called_once_with(
-        'tweet matches syllable pattern: %r',
+        'tweet matches scheme: %r',
         [
             ['over', 'wing', 'exit'],
             ['leaving', 'the', 'plane'],
@@ -79,6 +91,264 @@ def test_whether_multiple_rhymes():
     assert not rhyming('can you see we can be not a rhyme')
 
 
+def test_word_lists():
+    assert ELEANOR_RIGBY(
+        'eleanor rigby died in the church and was buried along with her '
+        'name nobody came'.split()
+    )
+    assert not ELEANOR_RIGBY(['hello'])
+    assert not ELEANOR_RIGBY([])
+
+
+def test_alternate_pronunciations():
+    # "every" is three syllables in its first pronunciation, two in another
+    assert PhraseMatcher((2, 1))('every day')
+    assert PhraseMatcher((3, 1))('every day')
+    assert not PhraseMatcher((1, 2))('every day')
+
+
+def test_rhymes_with_alternate_pronunciations():
+    # only fits with the two-syllable "every" and "family"
+    rhyming = PhraseMatcher((3, 3), (0, 0))
+    assert rhyming('every one family sun')
+    assert not rhyming('every one family moon')
+
+
 def test_validation():
     with pytest.raises(ValueError):
         PhraseMatcher((1, 2, 3), (1, 2, 3, 4))
+
+
+@pytest.fixture
+def scheme_set():
+    return SchemeSet({
+        'eleanor rigby': ELEANOR_RIGBY,
+        'that is amore': PhraseMatcher((3, 3, 3, 3), (None, 0, None, 0)),
+        'twelve syllables': PhraseMatcher((12,)),
+    })
+
+
+@pytest.mark.parametrize('input_, output', [
+    ('hello world', []),
+    ('', []),
+    ('when the moon hits your eye like a big pizza pie',
+     ['that is amore', 'twelve syllables']),
+    ('eleanor rigby died in the church and was buried along with her '
+     'name nobody came', ['eleanor rigby']),
+    ('look at him working darning his socks', []),
+])
+def test_scheme_set_matches(scheme_set, input_, output):
+    assert scheme_set.matches(input_) == output
+    assert scheme_set(input_) == bool(output)
+
+
+def test_scheme_set_split_lines(scheme_set):
+    assert scheme_set.split_lines(
+        'when the moon hits your eye like a big pizza pie',
+    ) == {
+        'that is amore': [['when', 'the', 'moon'], ['hits', 'your', 'eye'],
+                          ['like', 'a', 'big'], ['pizza', 'pie']],
+        'twelve syllables': [['when', 'the', 'moon', 'hits', 'your', 'eye',
+                              'like', 'a', 'big', 'pizza', 'pie']],
+    }
+    assert scheme_set.split_lines('hello world') == {}
+
+
+def test_scheme_set_groups_by_total(scheme_set):
+    assert sorted(scheme_set.schemes_by_total) == [12, 22]
+    assert [name for name, _ in scheme_set.schemes_by_total[12]] == [
+        'that is amore',
+        'twelve syllables',
+    ]
+
+
+@patch('eleanorrigbot.classify.PhraseMatcher.match_lines')
+def test_scheme_set_skips_unreachable_totals(mock_match_lines, scheme_set):
+    scheme_set('hello world')
+    mock_match_lines.assert_not_called()
+
+
+@pytest.mark.parametrize('input_, stage', [
+    ('', 'length'),
+    ('hello', 'length'),
+    ('look at him working darning his socks in the night', 'unknown'),
+    ('concatenate banana terrible alpha bravo charlie delta echo '
+     'foxtrot golf hotel', 'syllables'),
+    ('hello world', 'syllables'),
+    ('concatenate banana terrible alpha bravo charlie delta echo '
+     'foxtrot', 'structure'),
+    ('eleanor rigby died in the church and was buried along with her '
+     'name nobody came', 'matched'),
+])
+def test_rejection_stages(input_, stage):
+    matcher = PhraseMatcher((5, 4, 9, 4), (None, None, 0, 0))
+    matcher(input_)
+    assert matcher.rejections == {stage: 1}
+
+
+def test_rejections_counted_across_threads():
+    matcher = PhraseMatcher((5, 4, 9, 4), (None, None, 0, 0))
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(matcher, ['hello world'] * 4000))
+    assert matcher.rejections.snapshot() == dict(syllables=4000)
+    assert pickle.loads(pickle.dumps(matcher.rejections)) == dict(
+        syllables=4000,
+    )
+
+
+@patch('eleanorrigbot.classify.WORD_CACHE', side_effect=lambda _: ())
+def test_stops_at_first_unknown_word(mock_cache):
+    assert not ELEANOR_RIGBY('lorem ipsum dolor sit amet')
+    mock_cache.assert_called_once_with('lorem')
+
+
+def test_scheme_set_rejections(scheme_set):
+    scheme_set('hello world')
+    scheme_set('look at him working darning his socks')
+    scheme_set('when the moon hits your eye like a big pizza pie')
+    assert scheme_set.rejections == dict(syllables=1, unknown=1, matched=1)
+
+
+@patch('eleanorrigbot.classify.load_index')
+@patch('eleanorrigbot.classify._PRONUNCIATIONS', None)
+def test_pronunciations_loaded_once_on_demand(mock_load_index):
+    assert get_pronunciations() is mock_load_index.return_value
+    assert get_pronunciations() is mock_load_index.return_value
+    mock_load_index.assert_called_once_with()
+
+
+BATCH = [
+    '',
+    'hello world',
+    'look at him working darning his socks in the night',
+    'concatenate banana terrible alpha bravo charlie delta echo foxtrot',
+    'eleanor rigby died in the church and was buried along with her '
+    'name nobody came',
+    'every one family sun',
+    'waits at the window wearing the face that she keeps in a jar by '
+    'the door who is it for'.split(),
+    'father mckenzie wiping the dirt from his hands as he walks from '
+    'the grave no one was saved',
+    'hmm hmm hmm when the moon hits your eye like a big pizza pie',
+]
+
+
+@pytest.mark.parametrize('scheme', [
+    ((5, 4, 9, 4), (None, None, 0, 0)),
+    ((3, 3), (0, 0)),
+    ((12,), None),
+])
+def test_match_many(scheme):
+    matcher, expected = PhraseMatcher(*scheme), PhraseMatcher(*scheme)
+    assert matcher.match_many(BATCH) == [expected(phrase) for phrase in BATCH]
+    assert +matcher.rejections == +expected.rejections
+
+
+@pytest.mark.parametrize('scheme', [
+    ((5, 4, 9, 4), (None, None, 0, 0)),
+    ((3, 3), (0, 0)),
+    ((2, 2, 2), ('a', None, 'a')),
+])
+def test_match_many_rejections_match_per_phrase(scheme):
+    vocabulary = (
+        'the a in sun one fun eleanor rigby church buried along name '
+        'nobody came door for jar keeps darning zzyzx qwrtp'
+    ).split()
+    rng = random.Random(14)
+    for _ in range(200):
+        batch = []
+        for _ in range(rng.randint(1, 12)):
+            words = [rng.choice(vocabulary) for _ in range(rng.randint(0, 8))]
+            batch.append(' '.join(words) if rng.random() < 0.5 else words)
+        matcher, expected = PhraseMatcher(*scheme), PhraseMatcher(*scheme)
+        assert matcher.match_many(batch) == [expected(phrase)
+                                             for phrase in batch]
+        assert +matcher.rejections == +expected.rejections, batch
+
+
+@patch('eleanorrigbot.vectorised.numpy', None)
+def test_match_many_without_numpy():
+    assert ELEANOR_RIGBY.match_many(BATCH[3:5]) == [False, True]
+
+
+DARNING = ('look at him working darning his socks in the night when there\'s '
+           'nobody there what does he care')
+
+
+@pytest.fixture
+def estimator():
+    estimator = Estimator(get_pronunciations)
+    with patch('eleanorrigbot.classify.ESTIMATOR', estimator), \
+            patch('eleanorrigbot.classify.WORD_CACHE',
+                  BoundedCache(lookup_pronunciations)):
+        yield estimator
+
+
+@pytest.mark.parametrize('estimates, output', [
+    (None, False),
+    ('confident', False),
+    ('all', True),
+])
+def test_estimated_pronunciations(estimator, estimates, output):
+    matcher = PhraseMatcher((5, 4, 9, 4), (None, None, 0, 0), estimates)
+    assert matcher(DARNING) == output
+    assert matcher.match_many([DARNING]) == [output]
+    assert SchemeSet({'eleanor rigby': matcher}, estimates)(DARNING) == output
+    assert not estimator('darning').confident
+
+
+def test_estimates_are_trusted_by_policy():
+    estimate = Estimate(((2, 0),), False)
+    assert trusted(estimate, 'all') == estimate
+    assert trusted(estimate, 'confident') == ()
+    assert trusted(Estimate(((2, 0),), True), 'confident') == ((2, 0),)
+    assert trusted(((2, 0),), None) == ((2, 0),)
+
+
+def test_unknown_estimate_policy():
+    with pytest.raises(ValueError):
+        PhraseMatcher((5, 4, 9, 4), estimates='some')
+
+
+@pytest.mark.parametrize('input_', [
+    'hello world',
+    'waits at the window wearing the face that she keeps in a jar by '
+    'the door who is it for',
+    DARNING,
+    'eleanor rigby picks up the rice in the church where a wedding has '
+    'been lives in a dream',
+    'concatenate banana terrible alpha bravo charlie delta echo foxtrot',
+    'eleanor rigby picks up the rice in the church where a wedding has '
+    'been lives in a cart',
+])
+def test_match_stream(input_):
+    matcher = PhraseMatcher((5, 4, 9, 4), (None, None, 0, 0))
+    assert matcher.match_stream(iter_words(input_)) == ELEANOR_RIGBY(input_)
+    assert matcher(iter(input_.split())) == ELEANOR_RIGBY(input_)
+
+
+@pytest.mark.parametrize('input_, stage, rest', [
+    ('', 'length', []),
+    ('look at him working darning his socks', 'unknown', ['his', 'socks']),
+    ('concatenate banana terrible alpha', 'structure', ['terrible', 'alpha']),
+    ('the window wearing the face', 'syllables', []),
+    ('eleanor rigby picks up the rice in the church where a wedding has '
+     'been lives in a cart', 'structure', []),
+    ('eleanor rigby died in the church and was buried along with her '
+     'name nobody came', 'matched', []),
+])
+def test_match_stream_stops_early(input_, stage, rest):
+    matcher = PhraseMatcher((5, 4, 9, 4), (None, None, 0, 0))
+    tokens = iter(input_.split())
+    matcher.match_stream(tokens)
+    assert matcher.rejections == {stage: 1}
+    assert list(tokens) == rest
+
+
+def test_match_stream_rhymes_after_structure():
+    rhyming = PhraseMatcher((3, 3, 3), (0, 0, 0))
+    assert rhyming.match_stream(iter('all of these phrases please such a '
+                                     'tease'.split()))
+    assert not rhyming.match_stream(iter('all of these phrases please such '
+                                         'a pie'.split()))
+    assert rhyming.rejections == dict(matched=1, structure=1)
@@ -0,0 +1,300 @@
+import socket
+from threading import Event, Thread
+from time import sleep
+from unittest.mock import Mock
+
+import pytest
+import requests
+from tweepy import TweepError
+
+from eleanorrigbot import classify
+from eleanorrigbot.cache import BoundedCache
+from eleanorrigbot.classify import PhraseMatcher, lookup_pronunciations
+from eleanorrigbot.dispatch import (
+    ProcessClassifier,
+    RetweetDispatcher,
+    TokenBucket,
+    WorkerPool,
+    is_transient,
+)
+from eleanorrigbot.estimate import Estimator, read_estimates
+from eleanorrigbot.listen import MATCH_TIME
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool(workers=2, maxsize=10).start()
+    yield pool
+    pool.stop(timeout=1)
+
+
+def test_submitted_calls_are_made(pool):
+    function = Mock()
+    assert pool.submit(function, 'foo', 'bar')
+    pool.join()
+    function.assert_called_once_with('foo', 'bar')
+    stats = pool.stats()
+    assert stats['submitted'] == stats['processed'] == 1
+    assert stats['depth'] == stats['dropped'] == stats['errors'] == 0
+
+
+def test_errors_are_counted(pool):
+    assert pool.submit(Mock(side_effect=ValueError))
+    pool.join()
+    assert pool.stats()['errors'] == 1
+
+
+def _blocked_pool(drop_policy):
+    """Create a pool whose only worker is waiting on an event."""
+    pool = WorkerPool(maxsize=2, drop_policy=drop_policy).start()
+    release, started = Event(), Event()
+    pool.submit(lambda: started.set() or release.wait(1))
+    started.wait(1)
+    return pool, release
+
+
+def test_drop_newest():
+    pool, release = _blocked_pool('newest')
+    calls = []
+    results = [pool.submit(calls.append, index) for index in range(3)]
+    release.set()
+    pool.join()
+    assert results == [True, True, False]
+    assert calls == [0, 1]
+    assert pool.stats()['dropped'] == 1
+    pool.stop()
+
+
+def test_drop_oldest():
+    pool, release = _blocked_pool('oldest')
+    calls = []
+    results = [pool.submit(calls.append, index) for index in range(3)]
+    assert pool.stats()['depth'] == 2
+    release.set()
+    pool.join()
+    assert results == [True, True, True]
+    assert calls == [1, 2]
+    assert pool.stats()['dropped'] == 1
+    pool.stop()
+
+
+@pytest.mark.parametrize('kwargs', [dict(drop_policy='random'), dict(workers=0)])
+def test_validation(kwargs):
+    with pytest.raises(ValueError):
+        WorkerPool(**kwargs)
+
+
+def _has_foo(phrase):
+    return 'foo' in phrase
+
+
+def test_process_classifier_preserves_order():
+    classifier = ProcessClassifier(_has_foo, processes=2, batch_size=3)
+    results = []
+    classifier.start()
+    for index, phrase in enumerate(['foo', 'bar', 'foo bar', 'baz', 'qux']):
+        classifier.submit(phrase, lambda *args: results.append(args), index)
+    classifier.stop(timeout=5)
+    assert results == [
+        (True, 0), (False, 1), (True, 2), (False, 3), (False, 4),
+    ]
+
+
+def test_process_classifier_flushes_after_delay():
+    classifier = ProcessClassifier(_has_foo, processes=1, max_delay=0.05)
+    matched = Event()
+    classifier.start()
+    classifier.submit('foo', lambda result: result and matched.set())
+    assert matched.wait(5)
+    classifier.stop(timeout=5)
+
+
+@pytest.mark.parametrize('drop_policy, submitted, results', [
+    ('newest', [True, True, False], [(True, 0), (False, 1)]),
+    ('oldest', [True, True, True], [(False, 1), (True, 2)]),
+])
+def test_process_classifier_drops_when_full(drop_policy, submitted, results):
+    classifier = ProcessClassifier(_has_foo, processes=1, batch_size=10,
+                                   maxsize=2, drop_policy=drop_policy)
+    received = []
+    classifier.start()
+    assert [
+        classifier.submit(phrase, lambda *args: received.append(args), index)
+        for index, phrase in enumerate(['foo', 'bar', 'foo bar'])
+    ] == submitted
+    classifier.stop(timeout=5)
+    assert received == results
+    assert classifier.stats() == dict(depth=0, maxsize=2, submitted=3,
+                                      dropped=1, processed=2, errors=0)
+
+
+def test_process_classifier_unbounded_queue():
+    classifier = ProcessClassifier(_has_foo, processes=1, batch_size=10,
+                                   maxsize=0)
+    results = []
+    classifier.start()
+    assert all(classifier.submit(phrase, results.append)
+               for phrase in ['foo', 'bar', 'foo bar'])
+    classifier.stop(timeout=5)
+    assert results == [True, False, True]
+    assert classifier.stats()['dropped'] == 0
+
+
+def test_process_classifier_blocks_when_full():
+    classifier = ProcessClassifier(_has_foo, processes=1, batch_size=1,
+                                   maxsize=1, drop_policy='block')
+    results = []
+    classifier.start()
+    for phrase in ['foo', 'bar', 'foo bar']:
+        assert classifier.submit(phrase, results.append)
+    classifier.stop(timeout=5)
+    assert results == [True, False, True]
+    assert classifier.stats()['dropped'] == 0
+
+
+def test_process_classifier_reports_worker_metrics():
+    matcher = PhraseMatcher((2, 2))
+    matched = MATCH_TIME.snapshot()[0]
+    results = []
+    classifier = ProcessClassifier(matcher, processes=1, batch_size=3).start()
+    for phrase in ['hello hello', 'hello world', 'hello']:
+        classifier.submit(phrase, results.append)
+    classifier.stop(timeout=5)
+    assert results == [True, False, False]
+    assert +matcher.rejections == dict(matched=1, syllables=2)
+    assert sum(MATCH_TIME.snapshot()[0]) - sum(matched) == 3
+
+
+def test_process_classifier_saves_worker_estimates(monkeypatch, tmpdir):
+    path = str(tmpdir.join('estimates.tsv'))
+    estimator = Estimator(classify.get_pronunciations, path)
+    monkeypatch.setattr(classify, 'ESTIMATOR', estimator)
+    monkeypatch.setattr(classify, 'WORD_CACHE',
+                        BoundedCache(lookup_pronunciations))
+    classifier = ProcessClassifier(PhraseMatcher((2,), estimates='all'),
+                                   processes=1).start()
+    results = []
+    classifier.submit('darning', results.append)
+    classifier.stop(timeout=5)
+    estimator.close()
+    assert results == [True]
+    assert list(read_estimates(path)) == ['darning']
+    assert estimator.estimated == 1
+
+
+def test_process_classifier_waits_for_index(monkeypatch):
+    monkeypatch.setattr(classify, '_PRONUNCIATIONS', None)
+    held = Event()
+    loading = Thread(target=_hold, args=(classify._PRONUNCIATIONS_LOCK, held))
+    loading.start()
+    held.wait()
+    classifier = ProcessClassifier(_has_foo, processes=1, max_delay=0.05)
+    matched = Event()
+    classifier.start()
+    classifier.submit('foo', lambda result: result and matched.set())
+    assert matched.wait(5)
+    classifier.stop(timeout=5)
+    loading.join()
+
+
+def _hold(lock, held):
+    with lock:
+        held.set()
+        sleep(0.2)
+
+
+def test_token_bucket():
+    now = [0.0]
+    bucket = TokenBucket(rate=0.5, capacity=2, clock=lambda: now[0])
+    assert [bucket.take() for _ in range(3)] == [True, True, False]
+    assert bucket.wait_time() == 2
+    now[0] = 1.0
+    assert not bucket.take()
+    now[0] = 10.0
+    assert [bucket.take() for _ in range(3)] == [True, True, False]
+
+
+class FakeAPI:
+    """Fails the first calls for each status with the given errors."""
+
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.retweets = []
+
+    def retweet(self, status_id):
+        if self.errors.get(status_id):
+            raise self.errors[status_id].pop(0)
+        self.retweets.append(status_id)
+
+
+def _error(status_code):
+    return TweepError('failed', Mock(status_code=status_code))
+
+
+@pytest.fixture
+def dispatcher():
+    dispatcher = RetweetDispatcher(rate=1000, burst=5, backoff=0.01).start()
+    yield dispatcher
+    dispatcher.stop(timeout=1)
+
+
+def test_dispatcher_drops_duplicates(dispatcher):
+    api = FakeAPI()
+    results = [dispatcher.submit(api.retweet, id_) for id_ in [1, 2, 1, 3, 2]]
+    assert dispatcher.join(timeout=1)
+    assert results == [True, True, False, True, False]
+    assert api.retweets == [1, 2, 3]
+    assert dispatcher.stats()['duplicates'] == 2
+
+
+def test_dispatcher_retries_transient_errors(dispatcher):
+    api = FakeAPI({1: [ConnectionError(), _error(503)], 2: [_error(403)]})
+    for id_ in [1, 2, 3]:
+        dispatcher.submit(api.retweet, id_)
+    assert dispatcher.join(timeout=1)
+    assert sorted(api.retweets) == [1, 3]
+    stats = dispatcher.stats()
+    assert (stats['made'], stats['retried'], stats['failed']) == (2, 2, 1)
+
+
+def test_dispatcher_does_not_retry_bugs(dispatcher):
+    api = FakeAPI({1: [TypeError('oops')], 2: [TweepError('bad request')]})
+    for id_ in [1, 2]:
+        dispatcher.submit(api.retweet, id_)
+    assert dispatcher.join(timeout=1)
+    stats = dispatcher.stats()
+    assert (stats['made'], stats['retried'], stats['failed']) == (0, 0, 2)
+
+
+def test_is_transient():
+    assert is_transient(ConnectionError())
+    assert is_transient(socket.timeout())
+    assert not is_transient(AttributeError())
+    try:
+        try:
+            raise requests.exceptions.ConnectTimeout()
+        except requests.exceptions.RequestException as exc:
+            raise TweepError('Failed to send request: {}'.format(exc))
+    except TweepError as exc:
+        assert is_transient(exc)
+
+
+def test_dispatcher_gives_up_after_max_retries():
+    dispatcher = RetweetDispatcher(rate=1000, max_retries=1, backoff=0.01)
+    api = FakeAPI({1: [_error(500)] * 3})
+    dispatcher.start().submit(api.retweet, 1)
+    assert dispatcher.join(timeout=1)
+    assert api.retweets == []
+    assert dispatcher.stats()['failed'] == 1
+    dispatcher.stop(timeout=1)
+
+
+def test_dispatcher_limits_rate():
+    dispatcher = RetweetDispatcher(rate=0.01, burst=2).start()
+    api = FakeAPI()
+    for id_ in range(5):
+        dispatcher.submit(api.retweet, id_)
+    assert not dispatcher.join(timeout=0.2)
+    assert api.retweets == [0, 1]
+    assert dispatcher.stats()['pending'] == 3
+    dispatcher.stop(timeout=1)
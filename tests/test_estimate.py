@@ -0,0 +1,151 @@
+import pickle
+
+import pytest
+
+from eleanorrigbot.estimate import (
+    EndingIndex,
+    Estimate,
+    Estimator,
+    count_syllables,
+    read_estimates,
+)
+from eleanorrigbot.pronunciations import PronunciationIndex
+
+ENTRIES = {
+    'burning': ((2, 0),),
+    'earning': ((2, 0),),
+    'learning': ((2, 0),),
+    'turning': ((2, 0),),
+    'warning': ((2, 1),),
+    'cat': ((1, 2),),
+}
+
+
+@pytest.fixture
+def index():
+    return PronunciationIndex.from_entries(
+        ENTRIES,
+        ['ER1 N IH0 NG', 'AO1 R N IH0 NG', 'AE1 T'],
+    )
+
+
+@pytest.mark.parametrize('word, syllables', [
+    ('cat', 1),
+    ('rigby', 2),
+    ('bake', 1),
+    ('baked', 1),
+    ('wanted', 2),
+    ('bakes', 1),
+    ('wishes', 2),
+    ('table', 2),
+    ('yeeted', 2),
+    ("y'all", 1),
+    ('brb', 0),
+])
+def test_count_syllables(word, syllables):
+    assert count_syllables(word) == syllables
+
+
+def test_estimate_pickles():
+    estimate = Estimate(((2, 0),), True)
+    copy = pickle.loads(pickle.dumps(estimate))
+    assert copy == ((2, 0),)
+    assert copy.confident
+    assert repr(copy) == 'Estimate(((2, 0),), confident=True)'
+
+
+def test_ending_index(index):
+    endings = EndingIndex(index)
+    length, neighbours = endings.neighbours('churning')
+    assert length == 6
+    assert sorted(index.words[position] for position in neighbours) == [
+        'burning', 'turning',
+    ]
+    length, neighbours = endings.neighbours('churning', minimum=3)
+    assert length == 5
+    assert len(neighbours) == 5
+    assert endings.neighbours('learning')[1] == [index.words.find('earning')]
+    assert endings.neighbours('xyz') == (0, [])
+
+
+def test_confident_estimate(index):
+    estimator = Estimator(lambda: index)
+    assert estimator('churning') == ((2, 0),)
+    assert estimator('churning').confident
+    assert estimator.stats() == dict(words=1, estimated=1)
+
+
+def test_unconfident_estimate(index):
+    estimator = Estimator(lambda: index)
+    estimate = estimator('spat')
+    assert estimate == ((1, 2),)
+    assert not estimate.confident
+
+
+@pytest.mark.parametrize('word', ['brb', 'hello world', '123', 'Cat'])
+def test_words_that_cannot_be_estimated(index, word):
+    assert not Estimator(lambda: index)(word)
+
+
+def test_words_without_neighbours_rhyme_with_nothing(index):
+    estimator = Estimator(lambda: index)
+    (_, first), = estimator('zoo')
+    (_, second), = estimator('moo')
+    assert first < 0
+    assert second < 0
+    assert first != second
+
+
+def test_estimates_persist(index, tmpdir):
+    path = str(tmpdir.join('estimates.tsv'))
+    estimator = Estimator(lambda: index, path)
+    estimate = estimator('churning')
+    estimator('spat')
+    estimator.close()
+
+    assert read_estimates(path) == {
+        'churning': (((2, 'ER1 N IH0 NG'),), True),
+        'spat': (((1, 'AE1 T'),), False),
+    }
+    estimator = Estimator(lambda: index, path)
+    assert len(estimator) == 2
+    assert estimator('churning') == estimate
+    assert estimator('churning').confident
+    assert estimator.estimated == 0
+
+
+def test_estimates_cached_within_bounds(index, tmpdir):
+    path = str(tmpdir.join('estimates.tsv'))
+    estimator = Estimator(lambda: index, path, maxsize=1)
+    estimator('churning')
+    estimator('spat')
+    assert estimator('spat').confident is False
+    assert estimator.estimated == 2
+    estimator.close()
+    assert sorted(read_estimates(path)) == ['churning', 'spat']
+
+
+def test_deferred_estimates_saved_elsewhere(index, tmpdir):
+    path = str(tmpdir.join('estimates.tsv'))
+    worker = Estimator(lambda: index, path).defer_saving()
+    estimate = worker('churning')
+    assert worker.take_unsaved() == [('churning', estimate)]
+    assert worker.take_unsaved() == []
+    assert read_estimates(path) == {}
+
+    parent = Estimator(lambda: index, path)
+    parent.save('churning', estimate)
+    parent.close()
+    assert read_estimates(path) == {
+        'churning': (((2, 'ER1 N IH0 NG'),), True),
+    }
+    assert parent.estimated == 1
+
+
+def test_invalid_estimates_skipped(tmpdir):
+    path = tmpdir.join('estimates.tsv')
+    path.write('churning\t1\t2:ER1 N IH0 NG\nspat\t0\tone:AE1 T\n')
+    assert read_estimates(str(path)) == {
+        'churning': (((2, 'ER1 N IH0 NG'),), True),
+    }
+    assert read_estimates(str(tmpdir.join('missing.tsv'))) == {}
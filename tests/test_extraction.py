@@ -1,6 +1,7 @@
 import pytest
 
-from eleanorrigbot import extract_phrase
+from eleanorrigbot import extract_phrase, extract_words
+from eleanorrigbot.extract import iter_words
 
 
 @pytest.mark.parametrize('input_, output', [
@@ -31,3 +32,15 @@ from eleanorrigbot import extract_phrase
 ])
 def test_extract_phrase(input_, output):
     assert extract_phrase(input_) == output
+
+
+@pytest.mark.parametrize('input_, output', [
+    ('Hello, World!', ['hello', 'world']),
+    ('... what ... now? https://t.co/abc', ['what', 'now']),
+    ("i've ''been'' here", ["i've", 'been', 'here']),
+    ('\U0001f48b', []),
+])
+def test_extract_words(input_, output):
+    assert extract_words(input_) == output
+    assert list(iter_words(input_)) == output
+    assert extract_phrase(input_) == ' '.join(output)
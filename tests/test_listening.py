@@ -3,7 +3,17 @@ from unittest.mock import Mock, patch
 import pytest
 from tweepy import API, Status, User
 
-from eleanorrigbot import RetweetListener
+from eleanorrigbot import (
+    BatchRetweetListener,
+    RetweetListener,
+    start_listening,
+)
+from eleanorrigbot.listen import (
+    LocationCounts,
+    bounding_boxes,
+    location_name,
+)
+from eleanorrigbot.reconnect import ReconnectScheduler
 
 
 @pytest.fixture
@@ -11,11 +21,14 @@ def api():
     return Mock(autospec=API)
 
 
-def create_tweet(id_, text, username, full_text=None):
+def create_tweet(id_, text, username, full_text=None, coordinates=None,
+                 place=None):
     tweet = Mock(autospec=Status)
     tweet.id = id_
     tweet.text = text
     tweet.extended_tweet = {'full_text': full_text or text}
+    tweet.coordinates = coordinates
+    tweet.place = place
     tweet.author = Mock(autospec=User)
     tweet.author.screen_name = username
     return tweet
@@ -54,7 +67,9 @@ def test_logging(mock_logger, api):
         'AliceAnderson',
         'foo',
     )
-    mock_logger.info.assert_called_once_with('retweeting %r %r', 456, 'foo')
+    mock_logger.info.assert_called_once_with(
+        '%s retweeting %r %r', 'stream', 456, 'foo',
+    )
 
 
 @patch('eleanorrigbot.listen.logger')
@@ -62,29 +77,31 @@ def test_error_logging(mock_logger, api):
     listener = RetweetListener(api)
 
     listener.on_error(404)
-    mock_logger.error.assert_called_once_with('streaming error %s', 404)
+    mock_logger.error.assert_called_once_with(
+        '%s streaming error %s', 'stream', 404,
+    )
 
 
-@patch('eleanorrigbot.listen.sleep')
 @patch('eleanorrigbot.listen.logger')
-def test_backoff(mock_logger, mock_sleep, api):
-    listener = RetweetListener(api)
-    listener.timeout = 4
-
-    listener.on_error(420)
-    mock_logger.info.assert_called_once_with('timing out for %s seconds', 240)
-    mock_sleep.assert_called_once_with(240)
-
-    assert listener.timeout == 8
+def test_backoff(mock_logger, api):
+    reconnects = Mock(autospec=ReconnectScheduler)
+    reconnects.failed.return_value = 60.0
+    listener = RetweetListener(api, reconnects=reconnects)
+
+    assert listener.on_error(420) is False
+    reconnects.failed.assert_called_once_with(420)
+    mock_logger.info.assert_called_once_with(
+        'reconnecting in %.1f seconds', 60.0,
+    )
 
 
-def test_timeout_reset(api):
-    listener = RetweetListener(api)
-    listener.timeout = 8
+def test_backoff_reset(api):
+    reconnects = Mock(autospec=ReconnectScheduler)
+    listener = RetweetListener(api, reconnects=reconnects)
 
     listener.on_connect()
 
-    assert listener.timeout == 1
+    reconnects.connected.assert_called_once_with()
 
 
 def test_extended_tweets(api):
@@ -108,3 +125,142 @@ def test_unextended_tweets(api):
     listener.on_status(tweet)
 
     mock_extractor.assert_called_once_with(short_text)
+
+
+def test_background_classification(api):
+    classifiers = Mock()
+    listener = RetweetListener(api, classifiers=classifiers)
+
+    listener.on_status(create_tweet(123, 'foo', 'EveEvans'))
+
+    classifiers.submit.assert_called_once_with(listener.classify, 123, 'foo',
+                                               ())
+    api.retweet.assert_not_called()
+
+
+def test_background_retweeting(api):
+    retweeter = Mock()
+    listener = RetweetListener(api, retweeter=retweeter)
+
+    listener.on_status(create_tweet(123, 'foo', 'EveEvans'))
+
+    retweeter.submit.assert_called_once_with(api.retweet, 123)
+    api.retweet.assert_not_called()
+
+
+def test_batch_classification(api):
+    classifier = Mock()
+    extractor = Mock(return_value='hello world')
+    listener = BatchRetweetListener(api, extractor, classifier)
+
+    listener.on_status(create_tweet(123, 'foo', 'EveEvans'))
+
+    classifier.submit.assert_called_once()
+    phrase, callback, *args = classifier.submit.call_args[0]
+    assert phrase == 'hello world'
+    api.retweet.assert_not_called()
+
+    callback(True, *args)
+    api.retweet.assert_called_once_with(123)
+
+
+def test_listener_counts(api):
+    listener = RetweetListener(api, filterer=lambda text: 'foo' in text)
+
+    listener.on_status(create_tweet(123, 'foo', 'DeweyDuck'))
+    listener.on_status(create_tweet(456, 'bar', 'DeweyDuck'))
+
+    stats = listener.stats()
+    assert (stats['statuses'], stats['matches']) == (2, 1)
+    assert stats['connected']
+
+
+@pytest.mark.parametrize('locations, boxes', [
+    ([1, 2, 3, 4], [[1, 2, 3, 4]]),
+    ([[1, 2, 3, 4], [5, 6, 7, 8]], [[1, 2, 3, 4], [5, 6, 7, 8]]),
+])
+def test_bounding_boxes(locations, boxes):
+    assert bounding_boxes(locations) == boxes
+
+
+LIVERPOOL = [-3.0087, 53.3270, -2.8180, 53.4751]
+
+NAPOLI = [13.8509, 40.5360, 14.6697, 41.0201]
+
+IN_LIVERPOOL, IN_NAPOLI = location_name(LIVERPOOL), location_name(NAPOLI)
+
+
+def _point(lon, lat):
+    return dict(type='Point', coordinates=[lon, lat])
+
+
+def _place(west, south, east, north):
+    place = Mock()
+    place.bounding_box.coordinates = [
+        [[west, south], [east, south], [east, north], [west, north]],
+    ]
+    return place
+
+
+@pytest.mark.parametrize('tweet, names', [
+    (dict(coordinates=_point(-2.98, 53.40)), (IN_LIVERPOOL,)),
+    (dict(coordinates=_point(14.25, 40.85)), (IN_NAPOLI,)),
+    (dict(coordinates=_point(0, 0)), ()),
+    (dict(place=_place(-3.1, 53.3, -2.9, 53.5)), (IN_LIVERPOOL,)),
+    (dict(place=_place(-10, 30, 20, 60)), (IN_LIVERPOOL, IN_NAPOLI)),
+    (dict(), ()),
+])
+def test_locate(tweet, names):
+    locations = LocationCounts([LIVERPOOL, NAPOLI])
+    assert locations.locate(create_tweet(123, 'foo', 'EveEvans', **tweet)) \
+        == names
+
+
+def test_listener_counts_locations(api):
+    locations = LocationCounts([LIVERPOOL, NAPOLI])
+    listener = RetweetListener(api, filterer=lambda text: 'foo' in text,
+                               locations=locations)
+
+    for id_, text, point in [(1, 'foo', _point(-2.98, 53.40)),
+                             (2, 'bar', _point(-2.98, 53.40)),
+                             (3, 'foo', _point(14.25, 40.85))]:
+        listener.on_status(create_tweet(id_, text, 'DeweyDuck',
+                                        coordinates=point))
+
+    assert [locations.stats(name) for name in locations.names] == [
+        dict(statuses=2, matches=1),
+        dict(statuses=1, matches=1),
+    ]
+    stats = listener.stats()
+    assert (stats['statuses'], stats['matches']) == (3, 2)
+
+
+@patch('eleanorrigbot.RetweetDispatcher')
+@patch('eleanorrigbot.get_authentication')
+@patch('eleanorrigbot.API')
+@patch('eleanorrigbot.Stream')
+def test_one_stream_for_all_locations(mock_stream, mock_api, _,
+                                      mock_dispatcher):
+    listener = start_listening([[1, 2, 3, 4], [5.5, 6, 7, 8]], workers=2)
+
+    assert listener.api is mock_api.return_value
+    assert listener.retweeter is mock_dispatcher.return_value.start()
+    assert listener.locations.names == ['1,2,3,4', '5.5,6,7,8']
+    mock_stream.assert_called_once()
+    mock_stream.return_value.filter.assert_called_once_with(
+        locations=[1, 2, 3, 4, 5.5, 6, 7, 8],
+    )
+
+
+@patch('eleanorrigbot.RetweetDispatcher')
+@patch('eleanorrigbot.get_authentication')
+@patch('eleanorrigbot.API')
+@patch('eleanorrigbot.Stream')
+def test_location_is_deprecated(mock_stream, *_):
+    with pytest.warns(DeprecationWarning):
+        listener = start_listening(location=[1, 2, 3, 4])
+
+    assert listener.locations.names == ['1,2,3,4']
+    mock_stream.return_value.filter.assert_called_once_with(
+        locations=[1, 2, 3, 4],
+    )
@@ -0,0 +1,114 @@
+from collections import Counter
+from unittest.mock import Mock
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from eleanorrigbot.listen import LocationCounts
+from eleanorrigbot.metrics import (
+    CONTENT_TYPE,
+    Registry,
+    StatsCollector,
+    register_pipeline,
+    serve,
+)
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+
+def test_counter(registry):
+    counter = registry.counter('things_total', 'Things seen')
+    counter.inc()
+    counter.inc(2)
+    assert registry.counter('things_total', 'Things seen') is counter
+    assert registry.render() == (
+        '# HELP things_total Things seen\n'
+        '# TYPE things_total counter\n'
+        'things_total 3\n'
+    )
+
+
+def test_histogram(registry):
+    histogram = registry.histogram('latency_seconds', 'Latency', (0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value)
+    assert registry.render().splitlines()[2:] == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        'latency_seconds_sum 2.65',
+        'latency_seconds_count 4',
+    ]
+
+
+def test_histogram_timer(registry):
+    histogram = registry.histogram('block_seconds', 'Block time')
+    with histogram.time():
+        pass
+    assert histogram.samples()[-1] == ('_count', {}, 1)
+
+
+def test_metric_kinds_clash(registry):
+    registry.counter('things', 'Things')
+    with pytest.raises(ValueError):
+        registry.histogram('things', 'Things')
+
+
+def test_stats_collector(registry):
+    collector = StatsCollector('pool', counters=('processed',), label='name')
+    collector.add(lambda: dict(processed=3, depth=1, policy='lru'), 'a')
+    collector.add(lambda: dict(processed=5, depth=0, policy='lru'), 'b')
+    registry.register(collector)
+    assert registry.render() == (
+        '# TYPE pool_processed_total counter\n'
+        'pool_processed_total{name="a"} 3.0\n'
+        'pool_processed_total{name="b"} 5.0\n'
+        '# TYPE pool_depth gauge\n'
+        'pool_depth{name="a"} 1.0\n'
+        'pool_depth{name="b"} 0.0\n'
+    )
+
+
+def test_failing_collector_is_skipped(registry):
+    registry.register(Mock(side_effect=ValueError))
+    registry.counter('things_total', 'Things')
+    assert 'things_total 0' in registry.render()
+
+
+def test_register_pipeline(registry):
+    stream = Mock()
+    stream.name = 'liverpool'
+    stream.stats.return_value = dict(statuses=10, matches=1, connected=True)
+    stream.locations = LocationCounts([[1, 2, 3, 4], [5, 6, 7, 8]])
+    stream.locations.count(['1,2,3,4'], 'statuses')
+    filterer = Mock(rejections=Counter(syllables=9, matched=1))
+    retweeter = Mock(**{'stats.return_value': dict(made=1, pending=0)})
+    register_pipeline(filterer, [stream], retweeter=retweeter,
+                      registry=registry)
+    lines = registry.render().splitlines()
+    assert 'rigbot_stream_statuses_total{stream="liverpool"} 10.0' in lines
+    assert 'rigbot_stream_connected{stream="liverpool"} 1.0' in lines
+    assert 'rigbot_location_statuses_total{location="1,2,3,4"} 1.0' in lines
+    assert 'rigbot_location_statuses_total{location="5,6,7,8"} 0.0' in lines
+    assert 'rigbot_retweets_made_total 1.0' in lines
+    assert 'rigbot_phrases_total{stage="syllables"} 9' in lines
+
+
+def test_serve(registry):
+    registry.counter('things_total', 'Things').inc()
+    server = serve(0, registry=registry)
+    url = 'http://{}:{}'.format(*server.server_address[:2])
+    try:
+        with urlopen(url + '/metrics') as response:
+            assert response.headers['Content-Type'] == CONTENT_TYPE
+            assert b'things_total 1\n' in response.read()
+        with pytest.raises(HTTPError) as exc:
+            urlopen(url + '/other')
+        assert exc.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,122 @@
+import os
+import pstats
+import signal
+from threading import Event, Thread
+from time import sleep
+
+import pytest
+
+from eleanorrigbot.profiling import (
+    PROFILE_DIR,
+    PROFILE_SECONDS,
+    ProfileTrigger,
+    SamplingProfiler,
+    configure,
+    write_collapsed,
+    write_pstats,
+)
+
+
+def busy_work(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_samples_other_threads():
+    stop = Event()
+    worker = Thread(target=busy_work, args=(stop,), name='busy')
+    worker.start()
+    profiler = SamplingProfiler(interval=0.001).start()
+    stop.wait(0.1)
+    samples = profiler.stop()
+    stop.set()
+    worker.join()
+    busy = [stack for (thread, stack) in samples if thread == 'busy']
+    assert busy
+    assert all('busy_work' in {function for _, _, function in stack}
+               for stack in busy)
+    assert 'profiler' not in {thread for thread, _ in samples}
+
+
+SAMPLES = {
+    ('main', (('a.py', 1, 'outer'), ('b.py', 5, 'inner'))): 3,
+    ('main', (('a.py', 1, 'outer'),)): 1,
+}
+
+
+def test_write_collapsed(tmpdir):
+    path = str(tmpdir.join('profile.collapsed'))
+    write_collapsed(SAMPLES, path)
+    with open(path) as collapsed:
+        assert collapsed.read().splitlines() == [
+            'main;outer (a.py:1) 1',
+            'main;outer (a.py:1);inner (b.py:5) 3',
+        ]
+
+
+def test_write_pstats(tmpdir):
+    path = str(tmpdir.join('profile.pstats'))
+    write_pstats(SAMPLES, path, interval=0.5)
+    stats = pstats.Stats(path).stats
+    assert stats[('a.py', 1, 'outer')][2:4] == (0.5, 2.0)
+    assert stats[('b.py', 5, 'inner')][:4] == (3, 3, 1.5, 1.5)
+    assert stats[('b.py', 5, 'inner')][4] == {
+        ('a.py', 1, 'outer'): (3, 3, 1.5, 1.5),
+    }
+
+
+def test_trigger_writes_profile(tmpdir):
+    trigger = ProfileTrigger(duration=0.05, directory=str(tmpdir))
+    thread = trigger()
+    assert trigger() is None  # already running
+    thread.join(5)
+    assert sorted(path.ext for path in tmpdir.listdir()) == [
+        '.collapsed', '.pstats',
+    ]
+    trigger().join(5)  # can be triggered again once finished
+
+
+@pytest.fixture
+def triggers():
+    started = []
+    yield started
+    for trigger in started:
+        trigger.stop(timeout=5)
+
+
+def test_configure_from_environment(tmpdir, triggers):
+    handler = signal.getsignal(signal.SIGUSR1)
+    try:
+        trigger = configure({PROFILE_SECONDS: '0.05', PROFILE_DIR: str(tmpdir)})
+        triggers.append(trigger)
+        assert signal.getsignal(signal.SIGUSR1) == trigger.request_profile
+    finally:
+        signal.signal(signal.SIGUSR1, handler)
+    assert trigger.duration == 0.05
+    assert trigger() is None  # started already
+
+
+def test_signal_starts_profile_in_background(tmpdir, triggers):
+    handler = signal.getsignal(signal.SIGUSR1)
+    try:
+        trigger = ProfileTrigger(duration=0.05, directory=str(tmpdir))
+        triggers.append(trigger.install())
+        with trigger._lock:  # the handler mustn't wait for it
+            os.kill(os.getpid(), signal.SIGUSR1)
+    finally:
+        signal.signal(signal.SIGUSR1, handler)
+    for _ in range(100):
+        if len(tmpdir.listdir()) == 2:
+            break
+        sleep(0.05)
+    assert sorted(path.ext for path in tmpdir.listdir()) == [
+        '.collapsed', '.pstats',
+    ]
+
+
+def test_stop_cuts_profile_short(tmpdir):
+    trigger = ProfileTrigger(duration=60, directory=str(tmpdir))
+    thread = trigger()
+    trigger.stop(timeout=5)
+    assert not thread.is_alive()
+    assert len(tmpdir.listdir()) == 2
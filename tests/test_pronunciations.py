@@ -0,0 +1,61 @@
+import pytest
+
+from eleanorrigbot.pronunciations import PronunciationIndex, StringTable, load_index
+
+
+@pytest.fixture(scope='module')
+def index():
+    return PronunciationIndex.from_cmudict()
+
+
+@pytest.mark.parametrize('word, syllables', [
+    ('eleanor', 3),
+    ('rigby', 2),
+    ('the', 1),
+    ('darning', None),
+])
+def test_syllables(index, word, syllables):
+    assert index.syllables(word) == syllables
+
+
+def test_rhyme_keys(index):
+    assert index.rhyme_key('door') == index.rhyme_key('for')
+    assert index.rhyme_key('saved') != index.rhyme_key('grave')
+    assert index.rhyme_key('darning') is None
+
+
+def test_multiple_pronunciations(index):
+    assert [syllables for syllables, _ in index.pronunciations('every')] == [3, 2]
+
+
+def test_round_trip(index, tmpdir):
+    path = str(tmpdir.join('test.idx'))
+    index.save(path)
+    loaded = PronunciationIndex.load(path)
+    assert list(loaded.items()) == list(index.items())
+    assert list(loaded.rhyming_parts) == list(index.rhyming_parts)
+
+
+@pytest.mark.parametrize('data', [b'', b'RIGB\x01', b'RIGB' + bytes(20)])
+def test_load_invalid_index(tmpdir, data):
+    path = tmpdir.join('invalid.idx')
+    path.write_binary(data)
+    with pytest.raises(ValueError):
+        PronunciationIndex.load(str(path))
+
+
+def test_string_table():
+    table = StringTable.from_strings(['a', 'bb', "can't", 'd'])
+    assert len(table) == 4
+    assert table[2] == "can't"
+    assert [table.find(word) for word in ['a', 'd', "can't", 'c', 'e']] == [
+        0, 3, 2, -1, -1,
+    ]
+    with pytest.raises(IndexError):
+        table[4]  # pylint: disable=pointless-statement
+
+
+def test_load_builds_missing_index(tmpdir):
+    path = tmpdir.join('missing.idx')
+    assert load_index(str(path)).syllables('rigby') == 2
+    assert path.check()
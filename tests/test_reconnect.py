@@ -0,0 +1,71 @@
+from threading import Timer
+from unittest.mock import patch
+
+import pytest
+
+from eleanorrigbot.reconnect import ReconnectScheduler
+
+
+@pytest.fixture
+def clock():
+    return [0.0]
+
+
+@pytest.fixture
+def scheduler(clock):
+    return ReconnectScheduler(jitter=0, clock=lambda: clock[0])
+
+
+@pytest.mark.parametrize('status_code, delays', [
+    (420, [60, 120, 240, 480, 900, 900]),
+    (503, [5, 10, 20, 40, 80, 160, 320, 320]),
+    (None, [0.25, 0.5, 0.75, 1.0]),
+])
+def test_delays(scheduler, status_code, delays):
+    assert [scheduler.failed(status_code) for _ in delays] == delays
+
+
+def test_connection_resets_backoff(scheduler):
+    scheduler.failed(420)
+    scheduler.failed(420)
+    scheduler.connected()
+    assert not scheduler.disconnected
+    assert scheduler.failed(420) == 60
+
+
+@patch('eleanorrigbot.reconnect.random.uniform', return_value=6.0)
+def test_jitter_lengthens_delay(mock_uniform):
+    scheduler = ReconnectScheduler(jitter=0.1)
+    assert scheduler.failed(420) == 66.0
+    mock_uniform.assert_called_once_with(0, pytest.approx(6.0))
+
+
+def test_time_disconnected(scheduler, clock):
+    scheduler.failed(420)
+    clock[0] = 30.0
+    scheduler.failed(420)
+    clock[0] = 100.0
+    stats = scheduler.stats()
+    assert stats['time_disconnected'] == 100.0
+    assert not stats['connected']
+    scheduler.connected()
+    clock[0] = 200.0
+    scheduler.failed()
+    clock[0] = 210.0
+    stats = scheduler.stats()
+    assert stats['time_disconnected'] == 110.0
+    assert stats['disconnections'] == 2
+
+
+def test_wait():
+    scheduler = ReconnectScheduler(jitter=0)
+    assert scheduler.wait()
+    scheduler.failed()
+    assert scheduler.wait()
+
+
+def test_stop_cancels_wait():
+    scheduler = ReconnectScheduler()
+    scheduler.failed(420)
+    Timer(0.05, scheduler.stop).start()
+    assert not scheduler.wait()
@@ -0,0 +1,75 @@
+from collections import Counter
+import gzip
+import json
+from unittest.mock import patch
+
+import pytest
+
+from eleanorrigbot.replay import main, read_statuses, replay, replay_report
+
+STATUSES = [
+    dict(
+        id=1,
+        text='eleanor rigby died in the church and was buried along with '
+             'her name nobody came',
+        timestamp_ms='1000',
+        user=dict(screen_name='EleanorRigby'),
+    ),
+    dict(delete=dict(status=dict(id=3))),
+    dict(
+        id=2,
+        text='hello world',
+        timestamp_ms='1100',
+        user=dict(screen_name='FatherMcKenzie'),
+    ),
+]
+
+
+@pytest.fixture(params=[open, gzip.open], ids=['plain', 'gzip'])
+def recording(request, tmpdir):
+    path = str(tmpdir.join('statuses.jsonl'))
+    with request.param(path, 'wt') as file_:
+        for status in STATUSES:
+            file_.write(json.dumps(status) + '\n')
+        file_.write('\n[]\n3\n{"id": 4, "te\n')
+    return path
+
+
+def test_read_statuses(recording):
+    statuses = list(read_statuses(recording))
+    assert [status.id for status in statuses] == [1, 2]
+    assert statuses[1].author.screen_name == 'FatherMcKenzie'
+
+
+def test_read_statuses_counts_invalid_lines(recording):
+    counts = Counter()
+    assert len(list(read_statuses(recording, counts))) == 2
+    assert counts == dict(invalid=3)
+
+
+def test_replay(recording):
+    report = replay(read_statuses(recording))
+    assert report['statuses'] == 2
+    assert report['matches'] == 1
+    assert report['statuses_per_second'] > 0
+    assert 0 < report['p50'] <= report['p99']
+
+
+@patch('eleanorrigbot.replay.sleep')
+def test_replay_rate(mock_sleep, recording):
+    replay(read_statuses(recording), rate=2)
+    mock_sleep.assert_called_once()
+    assert 0 < mock_sleep.call_args[0][0] <= 0.05
+
+
+def test_replay_report(recording, capsys):
+    report = replay_report([recording])
+    assert (report['matches'], report['invalid']) == (1, 3)
+    assert capsys.readouterr().out.startswith(
+        '2 statuses, 1 matches, 3 invalid lines',
+    )
+
+
+def test_main_exits_cleanly(recording, capsys):
+    assert main([recording]) == 0
+    assert capsys.readouterr().out.startswith('2 statuses, 1 matches')
@@ -0,0 +1,146 @@
+import gzip
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+
+from eleanorrigbot.scan import Checkpoint, chunk_ranges, main, scan, scan_chunk
+
+RIGBY = ('eleanor rigby died in the church and was buried along with her name '
+         'nobody came')
+
+STATUSES = [
+    dict(id=1, text=RIGBY),
+    dict(delete=dict(status=dict(id=3))),
+    dict(id=2, text='hello world'),
+    dict(id=4, text='abridged', extended_tweet=dict(full_text=RIGBY)),
+]
+
+MATCH = dict(
+    scheme='eleanor rigby',
+    lines=['eleanor rigby', 'died in the church',
+           'and was buried along with her name', 'nobody came'],
+)
+
+
+@pytest.fixture(params=[open, gzip.open], ids=['plain', 'gzip'])
+def archive(request, tmpdir):
+    path = str(tmpdir.join('statuses.jsonl'))
+    with request.param(path, 'wt') as file_:
+        for status in STATUSES:
+            file_.write(json.dumps(status) + '\n')
+        file_.write('\n{"truncated\n')
+    return path
+
+
+@pytest.fixture
+def output(tmpdir):
+    return str(tmpdir.join('matches.jsonl'))
+
+
+def _read(path):
+    with open(path) as file_:
+        return [json.loads(line) for line in file_]
+
+
+def test_chunk_ranges_end_at_line_breaks(tmpdir):
+    path = str(tmpdir.join('lines.txt'))
+    with open(path, 'wb') as file_:
+        file_.write(b'one\ntwo\nthree\n\nfour')
+    assert chunk_ranges(path, 5) == [(0, 8), (8, 14), (14, 19)]
+    assert chunk_ranges(path, 4) == [(0, 4), (4, 8), (8, 14), (14, 19)]
+    assert chunk_ranges(path, 100) == [(0, 19)]
+
+
+def test_scan_chunk(archive):
+    (start, end), = chunk_ranges(archive)
+    matches, counts = scan_chunk(archive, start, end)
+    assert matches == [dict(id=1, **MATCH), dict(id=4, **MATCH)]
+    assert counts == dict(statuses=3, matches=2, invalid=1)
+
+
+def test_scan_chunk_skips_values_that_are_not_objects(tmpdir):
+    path = str(tmpdir.join('statuses.jsonl'))
+    with open(path, 'w') as file_:
+        file_.write('null\n[1, 2]\n"text"\n{}\n'.format(
+            json.dumps(STATUSES[0]),
+        ))
+    matches, counts = scan_chunk(path, 0, os.path.getsize(path))
+    assert [match['id'] for match in matches] == [1]
+    assert counts == dict(statuses=1, matches=1, invalid=3)
+
+
+@pytest.mark.parametrize('processes', [0, 2])
+def test_scan(archive, output, processes):
+    report = scan([archive], output, processes=processes, chunk_size=64)
+    assert sorted(match['id'] for match in _read(output)) == [1, 4]
+    assert report['statuses'] == 3
+    assert report['matches'] == 2
+    with open(output + '.checkpoint') as file_:
+        checkpoint = json.load(file_)
+    assert checkpoint['output_size'] == len(open(output, 'rb').read())
+
+
+def test_scan_resumes_from_checkpoint(archive, output):
+    chunks = chunk_ranges(archive, 64)
+    complete = Checkpoint.complete
+    calls = []
+
+    def interrupt(self, *args):
+        complete(self, *args)
+        calls.append(args)
+        if len(calls) == 1:
+            with open(output, 'ab') as file_:
+                file_.write(b'{"half written')
+            raise KeyboardInterrupt
+
+    with patch.object(Checkpoint, 'complete', interrupt), \
+            pytest.raises(KeyboardInterrupt):
+        scan([archive], output, processes=0, chunk_size=64)
+    report = scan([archive], output, processes=0, chunk_size=64, resume=True)
+    assert report['chunks'] == len(chunks) - 1
+    assert report['statuses'] == 3
+    assert sorted(match['id'] for match in _read(output)) == [1, 4]
+
+
+def test_scan_starts_again_without_resume(archive, output):
+    scan([archive], output, processes=0)
+    report = scan([archive], output, processes=0)
+    assert report['chunks'] == 1
+    assert len(_read(output)) == 2
+    with open(output, 'w'):
+        pass
+    assert scan([archive], output, processes=0, resume=True)['chunks'] == 0
+
+
+def test_resume_rejects_changed_scan(archive, output):
+    scan([archive], output, processes=0)
+    with pytest.raises(ValueError):
+        scan([archive], output, processes=0, chunk_size=64, resume=True)
+    with open(archive, 'ab') as file_:
+        file_.write(b'\n')
+    with pytest.raises(ValueError):
+        scan([archive], output, processes=0, resume=True)
+
+
+def test_main(archive, output, capsys):
+    assert main([archive, '--output', output, '--processes', '0']) == 0
+    assert capsys.readouterr().out.startswith(
+        '1 chunks, 3 statuses, 2 matches, 1 invalid lines',
+    )
+
+
+def test_main_schemes(archive, output, tmpdir):
+    schemes = tmpdir.join('schemes.json')
+    schemes.write(json.dumps(dict(schemes={
+        'rigby': dict(syllable_pattern=[22]),
+    })))
+    main([archive, '-o', output, '-p', '0', '--schemes', str(schemes)])
+    assert {match['scheme'] for match in _read(output)} == {'rigby'}
+
+
+def test_main_invalid_schemes(archive, output, tmpdir):
+    with pytest.raises(SystemExit) as exc:
+        main([archive, '-o', output, '--schemes', str(tmpdir.join('no.json'))])
+    assert exc.value.code == 2
@@ -0,0 +1,172 @@
+import json
+import os
+import signal
+from time import monotonic, sleep
+
+import pytest
+
+from eleanorrigbot.dispatch import ProcessClassifier
+from eleanorrigbot.schemes import SchemeFile, read_schemes
+
+RIGBY = ('eleanor rigby died in the church and was buried along with her name '
+         'nobody came')
+
+SCHEMES = dict(
+    estimates='all',
+    schemes={
+        'eleanor rigby': dict(
+            syllable_pattern=[5, 4, 9, 4],
+            rhyming_scheme=[None, None, 0, 0],
+        ),
+        'couplet': dict(syllable_pattern=[2, 2], rhyming_scheme='aa'),
+    },
+)
+
+
+def _write(path, data):
+    with open(path, 'w') as file_:
+        json.dump(data, file_)
+    return path
+
+
+def _wait_for(condition, timeout=5):
+    deadline = monotonic() + timeout
+    while not condition():
+        assert monotonic() < deadline, 'timed out'
+        sleep(0.01)
+
+
+@pytest.fixture
+def path(tmpdir):
+    return _write(str(tmpdir.join('schemes.json')), SCHEMES)
+
+
+def test_read_schemes(path):
+    assert read_schemes(path) == dict(
+        estimates='all',
+        schemes={
+            'eleanor rigby': ((5, 4, 9, 4), (None, None, 0, 0)),
+            'couplet': ((2, 2), ('a', 'a')),
+        },
+    )
+
+
+def test_read_schemes_yaml(tmpdir):
+    pytest.importorskip('yaml')
+    path = tmpdir.join('schemes.yml')
+    path.write('schemes:\n'
+               '  eleanor rigby:\n'
+               '    syllable_pattern: [5, 4, 9, 4]\n'
+               '    rhyming_scheme: --aa\n')
+    assert read_schemes(str(path)) == dict(
+        estimates='confident',
+        schemes={'eleanor rigby': ((5, 4, 9, 4), (None, None, 'a', 'a'))},
+    )
+
+
+def test_read_schemes_toml(tmpdir):
+    pytest.importorskip('toml')
+    path = tmpdir.join('schemes.toml')
+    path.write('[schemes."eleanor rigby"]\n'
+               'syllable_pattern = [5, 4, 9, 4]\n')
+    assert read_schemes(str(path))['schemes'] == {
+        'eleanor rigby': ((5, 4, 9, 4), None),
+    }
+
+
+@pytest.mark.parametrize('data', [
+    [],
+    dict(schemes={}),
+    dict(schemes={'foo': dict(syllable_pattern=[1])}, extra=True),
+    dict(schemes={'foo': dict(syllable_pattern=[1])}, estimates='some'),
+    dict(schemes={'foo': [1, 2]}),
+    dict(schemes={'foo': dict(syllable_pattern=[1], stress_pattern=[1])}),
+    dict(schemes={'foo': dict(syllable_pattern=[])}),
+    dict(schemes={'foo': dict(syllable_pattern=[1, 0])}),
+    dict(schemes={'foo': dict(syllable_pattern=[1, True])}),
+    dict(schemes={'foo': dict(syllable_pattern=[1, 2], rhyming_scheme='a')}),
+    dict(schemes={'foo': dict(syllable_pattern=[1], rhyming_scheme=[[0]])}),
+])
+def test_invalid_schemes(tmpdir, data):
+    path = _write(str(tmpdir.join('schemes.json')), data)
+    with pytest.raises(ValueError):
+        read_schemes(path)
+
+
+def test_unknown_file_type(tmpdir):
+    path = tmpdir.join('schemes.ini')
+    path.write('')
+    with pytest.raises(ValueError):
+        read_schemes(str(path))
+
+
+def test_scheme_file(path):
+    schemes = SchemeFile(path)
+    assert schemes(RIGBY)
+    assert schemes.split_lines('nation station')['couplet'] == [
+        ['nation'], ['station'],
+    ]
+    assert schemes.matches(RIGBY) == ['eleanor rigby']
+    assert schemes.schemes.estimates == 'all'
+    assert schemes.rejections['matched'] == 3
+
+
+def test_reload(path):
+    schemes = SchemeFile(path)
+    rigby = schemes.schemes.schemes['eleanor rigby']
+    rejections = schemes.rejections
+    _write(path, dict(schemes={
+        'rigby': SCHEMES['schemes']['eleanor rigby'],
+        'haiku': dict(syllable_pattern=[5, 7, 5]),
+    }))
+    assert schemes.reload()
+    assert schemes.generation == 1
+    assert sorted(schemes.schemes.schemes) == ['haiku', 'rigby']
+    assert schemes.schemes.schemes['rigby'] is rigby
+    assert schemes.schemes.estimates == 'confident'
+    assert schemes(RIGBY)
+    assert schemes.rejections is rejections
+    assert rejections['matched'] == 1
+
+
+def test_invalid_reload_keeps_schemes(path):
+    schemes = SchemeFile(path)
+    current = schemes.schemes
+    _write(path, dict(schemes={}))
+    assert not schemes.reload()
+    os.remove(path)
+    assert not schemes.reload()
+    assert schemes.schemes is current
+    assert schemes.generation == 0
+
+
+def test_reload_on_signal(path):
+    schemes = SchemeFile(path)
+    previous = signal.getsignal(signal.SIGHUP)
+    try:
+        schemes.install()
+        _write(path, dict(schemes={'haiku': dict(syllable_pattern=[5, 7, 5])}))
+        with schemes._lock:
+            # a signal during a reload mustn't wait for it to finish
+            os.kill(os.getpid(), signal.SIGHUP)
+            os.kill(os.getpid(), signal.SIGHUP)
+        _wait_for(lambda: schemes.generation)
+    finally:
+        signal.signal(signal.SIGHUP, previous)
+    assert list(schemes.schemes.schemes) == ['haiku']
+
+
+def test_workers_reload(path):
+    schemes = SchemeFile(path)
+    classifier = ProcessClassifier(schemes, processes=1, batch_size=1).start()
+    results = []
+    try:
+        classifier.submit(RIGBY, results.append)
+        classifier.flush()
+        _write(path, dict(schemes={'haiku': dict(syllable_pattern=[5, 7, 5])}))
+        schemes.reload()
+        os.remove(path)
+        classifier.submit(RIGBY, results.append)
+    finally:
+        classifier.stop(timeout=5)
+    assert results == [True, False]
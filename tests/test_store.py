@@ -0,0 +1,135 @@
+import multiprocessing
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+
+from eleanorrigbot.cache import BoundedCache
+from eleanorrigbot.classify import (
+    get_pronunciations,
+    lookup_pronunciations,
+    warm_cache,
+)
+from eleanorrigbot.estimate import Estimate, Estimator
+from eleanorrigbot.store import WordStore
+
+
+@pytest.fixture
+def path(tmpdir):
+    return str(tmpdir.join('words.db'))
+
+
+def _record(store, *words):
+    index = get_pronunciations()
+    for word in words:
+        store.record(word, index.pronunciations(word))
+
+
+def test_words_written_behind(path):
+    store = WordStore(path, get_pronunciations, interval=60)
+    _record(store, 'eleanor', 'rigby', 'rigby', 'notaword')
+    assert store.stats()['pending'] == 2
+    assert WordStore(path, get_pronunciations).most_used(10) == []
+    store.close()
+    assert store.stats() == dict(pending=0, recorded=2, written=2, flushes=1,
+                                 errors=0)
+    assert sorted(WordStore(path, get_pronunciations).most_used(10)) == [
+        ('eleanor', ((3, 'EH1 L AH0 N AO0 R'), (3, 'EH1 L AH0 N ER0')), False,
+         True),
+        ('rigby', ((2, 'IH1 G B IY0'),), False, True),
+    ]
+
+
+def test_most_used_words_first(path):
+    words = ['eleanor', 'rigby', 'church']
+    store = WordStore(path, get_pronunciations, used=lambda: words)
+    _record(store, *words)
+    store.flush()
+    words.remove('church')
+    store.flush()
+    words.remove('eleanor')
+    store.flush()
+    store.close()
+    assert [word for word, *_ in store.most_used(2)] == ['rigby', 'eleanor']
+
+
+def test_only_words_looked_up_counted(path):
+    cache = BoundedCache(lookup_pronunciations).track_lookups()
+    store = WordStore(path, get_pronunciations, used=cache.take_lookups)
+    _record(store, 'eleanor', 'rigby')
+    store.flush()
+    cache('rigby')
+    store.flush()
+    flushes = store.stats()['flushes']
+    assert store.flush() == 0
+    assert store.stats()['flushes'] == flushes
+    with sqlite3.connect(path) as connection:
+        assert dict(connection.execute('SELECT word, uses FROM words')) == {
+            'eleanor': 1,
+            'rigby': 2,
+        }
+
+
+def test_estimates_stored(path):
+    store = WordStore(path, get_pronunciations)
+    key = get_pronunciations().rhyme_key('warning')
+    store.record('darning', Estimate(((2, key), (3, key)), False))
+    store.record('zzyzx', Estimate(((2, -1),), True))
+    store.close()
+    assert sorted(store.most_used(10)) == [
+        ('darning', ((2, 'AO1 R N IH0 NG'), (3, 'AO1 R N IH0 NG')), True,
+         False),
+        ('zzyzx', ((2, ''),), True, True),
+    ]
+
+
+def test_failed_writes_retried(path):
+    store = WordStore(path, get_pronunciations)
+    _record(store, 'rigby')
+    with patch.object(store, '_connect', side_effect=sqlite3.OperationalError):
+        assert store.flush() == 0
+    assert store.stats()['errors'] == 1
+    assert store.stats()['pending'] == 1
+    store.close()
+    assert store.stats()['written'] == 1
+
+
+def _record_in_child():
+    store = _record_in_child.store
+    _record(store, 'father')
+    store.close()
+
+
+def test_forked_processes_share_the_store(path):
+    store = WordStore(path, get_pronunciations)
+    _record(store, 'eleanor')
+    _record_in_child.store = store
+    context = multiprocessing.get_context('fork')
+    child = context.Process(target=_record_in_child)
+    child.start()
+    child.join()
+    store.close()
+    assert child.exitcode == 0
+    assert sorted(word for word, *_ in store.most_used(10)) == [
+        'eleanor', 'father',
+    ]
+
+
+def test_warm_cache(path):
+    store = WordStore(path, get_pronunciations)
+    _record(store, 'eleanor', 'rigby')
+    store.record('darning', Estimate(((2, 0),), False))
+    store.close()
+    cache = BoundedCache(lookup_pronunciations)
+    with patch('eleanorrigbot.classify.WORD_CACHE', cache), \
+            patch('eleanorrigbot.classify.ESTIMATOR', None):
+        assert warm_cache(store) == 2
+    assert cache('rigby') == get_pronunciations().pronunciations('rigby')
+    assert cache.stats()['hits'] == 1
+
+    estimator = Estimator(get_pronunciations)
+    with patch('eleanorrigbot.classify.WORD_CACHE', cache), \
+            patch('eleanorrigbot.classify.ESTIMATOR', estimator):
+        assert warm_cache(store) == 3
+    assert cache('darning') == ((2, 0),)
+    assert estimator.estimated == 0